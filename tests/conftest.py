@@ -1,17 +1,50 @@
 
+from collections import Counter
 from copy import deepcopy
+from dataclasses import asdict, replace
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import hashlib
 import json
 import logging
+import os
 from pathlib import Path
+import tempfile
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 import pytest
+import pytest_html
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.webdriver import WebDriver
-from setup_env import SECRETS
 
+from tests.utils.aemet_dates import to_utc
+from tests.utils.aemet_response import AemetResponse
+from tests.utils.aemet_stub_server import AemetStubServer, StubDataset, SyntheticDataset
 from tests.utils.api_key_handler import ApiKeyHandler
-from tests.utils.imap_handler import IMAP_handler
+from tests.utils.bulk_download import BulkDownloader
+from tests.utils.datapoint_validator import DatapointValidator
+from tests.utils.datos_cache import DatosCache
+from tests.utils.fast_navigation import (
+    DEFAULT_BLOCKED_TYPES,
+    DEFAULT_BLOCKED_URLS,
+    ELEMENT_TIMEOUT,
+    block_resources,
+    blocked_url_patterns,
+)
+from tests.utils.http_client import PooledHttpClient
+from tests.utils.page_timing import BUDGET_PERCENTILE, DEFAULT_PAGE_BUDGETS, parse_budgets
+from tests.utils.perf_baseline import PerfBaselineStore, TestRun, compare, current_commit, format_comparisons
+from tests.utils.rate_limiter import TokenBucketRateLimiter
+from tests.utils.recorder import RecordingClient, ReplayClient, ResponseStore
+from tests.utils.request_metrics import RequestMetrics, format_table, write_metrics
+from tests.utils.requests_functions import api_key_invalid, classify_response, request_limit_reached
+from tests.utils.retry_policy import DEFAULT_BACKOFFS, RATE_LIMITED, RetryPolicy
+from tests.utils.webdriver_pool import WebDriverPool
+from tests.utils.worker_affinity import XDIST_GROUP_MARKER, worker_group
+
+# Selenium, the IMAP client and the secrets setup are imported by the fixtures using them, so that runs not needing
+# them (e.g. the API tests) do not pay for them at startup. See tests/tool_validation/test_import_time.py.
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
 
 
 logger = logging.getLogger(__name__)
@@ -23,10 +56,47 @@ logger.setLevel(logging.INFO)
 REQUEST_EMAIL_KEY = "request"
 API_KEY_EMAIL_KEY = "key"
 
+# Local state shared by every pytest process, stored in pytest's cache folder.
+LOCAL_STATE_DIR = "aemet"
+RATE_LIMIT_STATE_FILE = "rate_limit.json"
+DATOS_CACHE_DIR = "datos_cache"
+DATOS_CACHE_STASH_KEY = pytest.StashKey[DatosCache]()
+WORKER_DATOS_CACHE_STATS = "datos_cache_stats"  # Key of the datos cache statistics on the output of xdist workers.
+WORKER_DATOS_CACHE_STATS_STASH_KEY = pytest.StashKey[Counter]()
+
+# Metrics of every HTTP request made by the tests.
+REQUEST_METRICS_STASH_KEY = pytest.StashKey[RequestMetrics]()
+WORKER_REQUEST_METRICS = "request_metrics"  # Key of the request metrics on the output of xdist workers.
+WORKER_REQUEST_METRICS_STASH_KEY = pytest.StashKey[list[dict]]()
+
+# Performance of every test, stored by each run to compare against the previous ones.
+PERF_BASELINE_FILE = "perf_baseline.sqlite"
+PERF_BASELINE_STASH_KEY = pytest.StashKey[PerfBaselineStore]()
+PERF_RUNS_STASH_KEY = pytest.StashKey[list[TestRun]]()
+WORKER_PERF_RUNS = "perf_runs"  # Key of the test performance on the output of xdist workers.
+PERF_REGRESSION_PROPERTY = "perf_regression"  # User property of the reports of tests that regressed.
+
+# Marker of the tests of the performance suite, which only run on request.
+PERFORMANCE_MARKER = "performance"
+DOWNLOAD_MARKER = "download"
+NEEDS_API_KEY_MARKER = "needs_api_key"
+
+# Text sections attached to the report of each test.
+REPORT_ATTACHMENTS_STASH_KEY = pytest.StashKey[list[tuple[str, str]]]()
+
+DEFAULT_BASE_API_URL = "https://opendata.aemet.es/opendata/api"
+
+# Paths of chromedriver and Chrome resolved by Selenium Manager, kept in pytest's cache between runs.
+CHROME_BINARIES_CACHE_KEY = f"{LOCAL_STATE_DIR}/chrome_binaries"
+
+# Key accepted by the local AEMET stub server when no real key is available.
+STUB_API_KEY = "stub.key"
+
 # Secrets dict keys
 EMAIL_FILE_NAME = "email_credentials"
 API_KEY_FILE_NAME = "api_key"
 API_KEY_JSON_KEY = "api_key"
+API_KEYS_JSON_KEY = "api_keys"  # Optional list of additional keys.
 
 # ============================================== Options ==============================================
 
@@ -37,12 +107,349 @@ def pytest_addoption(parser):
         default=5,
         help="Wait given minutes for the request cap to refresh.",
     )
+    parser.addoption(
+        "--test-deadline",
+        action="store",
+        default=900,
+        help="Seconds a test may spend before failed requests are no longer retried. 0 for no deadline.",
+    )
+    parser.addoption(
+        "--session-deadline",
+        action="store",
+        default=0,
+        help="Seconds the test session may spend before failed requests are no longer retried. 0 for no deadline.",
+    )
+    parser.addoption(
+        "--request-metrics",
+        action="store",
+        default=None,
+        help="JSON file to write the timing percentiles and every request of the run to. A CSV is written next to it.",
+    )
     parser.addoption(
         "--allow-missing-datapoints",
         action="store_true",
         default=False,
         help="Whether to pass a test in which the data series retrieved is not exhaustive.",
     )
+    parser.addoption(
+        "--fail-on-gaps",
+        action="store_true",
+        default=False,
+        help="Fail a data test whose gap analysis finds any missing, duplicated, out of order or off-grid timestamp.",
+    )
+    parser.addoption(
+        "--http-pool-size",
+        action="store",
+        default=4,
+        help="Maximum number of keep-alive connections per host shared by every request of the session.",
+    )
+    parser.addoption(
+        "--max-concurrency",
+        action="store",
+        default=4,
+        help="Maximum number of API requests in flight when a test issues a batch of requests.",
+    )
+    parser.addoption(
+        "--api-rate-limit",
+        action="store",
+        default=50,
+        help="Initial requests per minute allowed per API key. Lowered automatically on 429s. 0 disables the limiter.",
+    )
+    parser.addoption(
+        "--record",
+        action="store_true",
+        default=False,
+        help="Store every API response received in the recordings folder.",
+    )
+    parser.addoption(
+        "--replay",
+        action="store_true",
+        default=False,
+        help="Serve API responses from the recordings folder instead of the network.",
+    )
+    parser.addoption(
+        "--recordings-dir",
+        action="store",
+        default="recordings",
+        help="Folder where API responses are recorded to and replayed from.",
+    )
+    parser.addoption(
+        "--base-api-url",
+        action="store",
+        default=DEFAULT_BASE_API_URL,
+        help="Base url of the AEMET API, e.g. a local stand-in. Ignored with --stub-api.",
+    )
+    parser.addoption(
+        "--stub-api",
+        action="store_true",
+        default=False,
+        help="Send API requests to a local AEMET stub server instead of opendata.aemet.es.",
+    )
+    parser.addoption(
+        "--stub-dataset",
+        action="store",
+        default=None,
+        help="Folder with a <station>.json datapoint list per station for the stub server. Synthetic data if unset.",
+    )
+    parser.addoption(
+        "--stub-latency",
+        action="store",
+        default="constant:0",
+        help="Stub server latency distribution: constant:<s>, uniform:<min>,<max> or lognormal:<median>,<sigma>.",
+    )
+    parser.addoption(
+        "--stub-request-cap",
+        action="store",
+        default=0,
+        help="Queries per minute and key accepted by the stub server before answering 429. 0 disables the cap.",
+    )
+    parser.addoption(
+        "--stub-datos-fault-rate",
+        action="store",
+        default=0.0,
+        help="Probability of the stub server answering a datos request with 429 Too Many Requests.",
+    )
+    parser.addoption(
+        "--datos-cache-size",
+        action="store",
+        default=200,
+        help="Size cap in MB of the on-disk cache of historical datos payloads. 0 disables the cache.",
+    )
+    parser.addoption(
+        "--stream-datos",
+        action="store_true",
+        default=False,
+        help="Decode and validate datapoints while the datos payload is downloaded, instead of loading it whole.",
+    )
+    parser.addoption(
+        "--coalesce-ranges",
+        action="store_true",
+        default=False,
+        help="Fetch one covering window per station for overlapping data requests, and slice it for each test.",
+    )
+    parser.addoption(
+        "--run-performance",
+        action="store_true",
+        default=False,
+        help="Run the performance tests (marked with `performance`), which are skipped otherwise.",
+    )
+    parser.addoption(
+        "--benchmark-file",
+        action="store",
+        default="reports/performance/benchmark.json",
+        help="Path of the JSON file the results of the performance tests are written to.",
+    )
+    parser.addoption(
+        "--benchmark-samples",
+        action="store",
+        default=8,
+        help="Operations run by each concurrent client of a performance test.",
+    )
+    parser.addoption(
+        "--benchmark-concurrency",
+        action="store",
+        default="1,2,4,8",
+        help="Comma separated concurrency levels swept by the performance tests.",
+    )
+    parser.addoption(
+        "--download-start",
+        action="store",
+        default=None,
+        help="UTC start date (ISO format) of the bulk download. The download tests (marked with `download`) are "
+        "skipped unless given.",
+    )
+    parser.addoption(
+        "--download-end",
+        action="store",
+        default=None,
+        help="UTC end date (ISO format) of the bulk download. Defaults to the start of the current day.",
+    )
+    parser.addoption(
+        "--download-stations",
+        action="store",
+        default="89064,89070",
+        help="Comma separated stations whose history is downloaded.",
+    )
+    parser.addoption(
+        "--download-dir",
+        action="store",
+        default="downloads",
+        help="Folder the bulk downloads, and their checkpoints, are written to.",
+    )
+    parser.addoption(
+        "--download-window-days",
+        action="store",
+        default=30,
+        help="Days of data requested by each query of the bulk download.",
+    )
+    parser.addoption(
+        "--perf-store",
+        action="store",
+        default=None,
+        help="SQLite file every run appends the performance of its tests to. Defaults to pytest's cache folder.",
+    )
+    parser.addoption(
+        "--perf-baseline",
+        action="store",
+        choices=("warn", "fail"),
+        default=None,
+        help="Compare the duration and request count of each test against its rolling baseline, and flag (warn) or "
+        "fail (fail) the tests that regressed.",
+    )
+    parser.addoption(
+        "--perf-window",
+        action="store",
+        default=20,
+        help="Number of past passing runs of a test its baseline is computed from.",
+    )
+    parser.addoption(
+        "--perf-sigmas",
+        action="store",
+        default=3.0,
+        help="Standard deviations above the baseline mean a metric may be before it is a regression.",
+    )
+    parser.addoption(
+        "--webdriver-pool-size",
+        action="store",
+        default=1,
+        help="Idle browsers kept per mode (headless and headful) for reuse. 0 for a new browser on every use.",
+    )
+    parser.addoption(
+        "--webdriver-max-uses",
+        action="store",
+        default=20,
+        help="Tests a pooled browser is used for before it is replaced.",
+    )
+    parser.addoption(
+        "--fast-navigation",
+        action="store_true",
+        default=False,
+        help="Load pages eagerly, block the resources of --block-resources and --block-urls, and wait for elements "
+        "explicitly instead of implicitly.",
+    )
+    parser.addoption(
+        "--block-resources",
+        action="store",
+        default=DEFAULT_BLOCKED_TYPES,
+        help="Comma separated resource types blocked with --fast-navigation: image, font, media, stylesheet, script.",
+    )
+    parser.addoption(
+        "--block-urls",
+        action="store",
+        default=DEFAULT_BLOCKED_URLS,
+        help="Comma separated URL patterns (with * wildcards) blocked with --fast-navigation.",
+    )
+    parser.addoption(
+        "--page-loads",
+        action="store",
+        default=5,
+        help="Loads of each AEMET page measured by the page timing test.",
+    )
+    parser.addoption(
+        "--page-budgets",
+        action="store",
+        default=DEFAULT_PAGE_BUDGETS,
+        help=f"Comma separated <metric>=<value> budgets for the p{BUDGET_PERCENTILE} of the page timings (ms or "
+        "bytes). Metrics: ttfb, dom_content_loaded, load, fcp, lcp, transfer_size, resources, resource_transfer_size.",
+    )
+
+
+def pytest_configure(config):
+    if config.getoption("--record") and config.getoption("--replay"):
+        raise pytest.UsageError("--record and --replay are mutually exclusive.")
+    config.addinivalue_line(
+        "markers", f"{XDIST_GROUP_MARKER}(name): run every test of the group on the same pytest-xdist worker."
+    )
+    config.addinivalue_line("markers", f"{PERFORMANCE_MARKER}: performance test, only run with --run-performance.")
+    config.addinivalue_line("markers", f"{DOWNLOAD_MARKER}: bulk data download, only run with --download-start.")
+    config.addinivalue_line("markers", f"{NEEDS_API_KEY_MARKER}: queries the API, skipped if there is no API key.")
+    config.stash[REQUEST_METRICS_STASH_KEY] = RequestMetrics()
+    perf_store = Path(config.getoption("--perf-store") or local_state_path(config) / PERF_BASELINE_FILE)
+    config.stash[PERF_BASELINE_STASH_KEY] = PerfBaselineStore(perf_store, window=int(config.getoption("--perf-window")))
+    config.stash[PERF_RUNS_STASH_KEY] = []
+
+
+def pytest_runtest_setup(item):
+    item.config.stash[REQUEST_METRICS_STASH_KEY].current_test = item.nodeid
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if report.when != "call":
+        return
+    attachments = item.stash.get(REPORT_ATTACHMENTS_STASH_KEY, [])
+    requests_made = item.config.stash[REQUEST_METRICS_STASH_KEY].for_test(item.nodeid)
+    if requests_made:
+        attachments = attachments + [("HTTP requests", format_table(requests_made))]
+    comparisons = _compare_with_baseline(item, report, requests_made)
+    if comparisons:
+        attachments = attachments + [("Performance baseline", format_comparisons(comparisons))]
+    if not attachments:
+        return
+
+    extras = getattr(report, "extras", [])
+    for name, content in attachments:
+        report.sections.append((name, content))
+        extras.append(pytest_html.extras.text(content, name=name))
+    report.extras = extras
+
+
+def _compare_with_baseline(item, report, requests_made):
+    # Keep the performance of the test for the store, and compare it with the baseline if requested. A regression of a
+    # passed test fails it with --perf-baseline=fail.
+    records = [record.as_row() for record in requests_made]
+    callspec = getattr(item, "callspec", None)
+    params = callspec.params if callspec is not None else {}
+    starting_date, interval = params.get("starting_date"), params.get("interval")
+    run = TestRun(
+        nodeid=item.nodeid.removesuffix(f"@{worker_group(item)}"),
+        station=params.get("station"),
+        starting_date=starting_date.isoformat() if isinstance(starting_date, datetime) else None,
+        interval=str(interval) if interval is not None else None,
+        outcome=report.outcome,
+        duration=report.duration,
+        requests=len(records),
+        bytes=sum(record["bytes"] or 0 for record in records),
+        wait=sum(record["rate_limit_wait"] for record in records),
+    )
+    item.config.stash[PERF_RUNS_STASH_KEY].append(run)
+
+    mode = item.config.getoption("--perf-baseline")
+    if mode is None:
+        return []
+    store = item.config.stash[PERF_BASELINE_STASH_KEY]
+    comparisons = compare(run, store.history(run.nodeid), sigmas=float(item.config.getoption("--perf-sigmas")))
+    regressed = [c.metric for c in comparisons if c.regressed]
+    if regressed and report.passed:
+        report.user_properties.append((PERF_REGRESSION_PROPERTY, regressed))
+        if mode == "fail":
+            report.outcome = "failed"
+            summary = f"Performance regression against the baseline: {', '.join(regressed)}."
+            report.longrepr = f"{summary}\n{format_comparisons(comparisons)}"
+    return comparisons
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    regressions = [
+        (report.nodeid, dict(report.user_properties)[PERF_REGRESSION_PROPERTY])
+        for reports in terminalreporter.stats.values()
+        for report in reports
+        if dict(getattr(report, "user_properties", [])).get(PERF_REGRESSION_PROPERTY)
+    ]
+    if regressions:
+        terminalreporter.write_sep("-", "performance regressions")
+        for nodeid, metrics in regressions:
+            terminalreporter.write_line(f"{nodeid}: {', '.join(metrics)}")
+    datos_cache = config.stash.get(DATOS_CACHE_STASH_KEY, None)
+    stats = datos_cache.stats if datos_cache is not None else config.stash.get(WORKER_DATOS_CACHE_STATS_STASH_KEY, None)
+    if stats is not None:
+        terminalreporter.write_sep("-", "datos cache")
+        terminalreporter.write_line(
+            f"{stats['hits']} hits, {stats['misses']} misses, {stats['bytes_saved'] / 2**20:.1f} MB not downloaded, "
+            f"{stats['evictions']} evictions."
+        )
 
 
 @pytest.fixture(scope="session")
@@ -50,11 +457,184 @@ def request_cap_wait(request):
     return int(request.config.getoption("--wait-for-capacity"))
 
 
+@pytest.fixture(scope="session")
+def test_deadline(request):
+    return float(request.config.getoption("--test-deadline"))
+
+
+@pytest.fixture(scope="session")
+def session_deadline(request):
+    return float(request.config.getoption("--session-deadline"))
+
+
 @pytest.fixture(scope="session")
 def allow_missing_datapoints(request):
     return bool(request.config.getoption("--allow-missing-datapoints"))
 
 
+@pytest.fixture(scope="session")
+def fail_on_gaps(request):
+    return bool(request.config.getoption("--fail-on-gaps"))
+
+
+@pytest.fixture(scope="session")
+def http_pool_size(request):
+    return int(request.config.getoption("--http-pool-size"))
+
+
+@pytest.fixture(scope="session")
+def max_concurrency(request):
+    return int(request.config.getoption("--max-concurrency"))
+
+
+@pytest.fixture(scope="session")
+def api_rate_limit(request):
+    return float(request.config.getoption("--api-rate-limit"))
+
+
+@pytest.fixture(scope="session")
+def record_responses(request):
+    return bool(request.config.getoption("--record"))
+
+
+@pytest.fixture(scope="session")
+def replay_responses(request):
+    return bool(request.config.getoption("--replay"))
+
+
+@pytest.fixture(scope="session")
+def recordings_dir(request):
+    return Path(request.config.getoption("--recordings-dir"))
+
+
+@pytest.fixture(scope="session")
+def stream_datos(request):
+    return bool(request.config.getoption("--stream-datos"))
+
+
+@pytest.fixture(scope="session")
+def coalesce_ranges(request):
+    return bool(request.config.getoption("--coalesce-ranges"))
+
+
+@pytest.fixture(scope="session")
+def use_stub_api(request):
+    return bool(request.config.getoption("--stub-api"))
+
+
+@pytest.fixture(scope="session")
+def benchmark_file(request):
+    return Path(request.config.getoption("--benchmark-file"))
+
+
+@pytest.fixture(scope="session")
+def benchmark_samples(request):
+    return int(request.config.getoption("--benchmark-samples"))
+
+
+@pytest.fixture(scope="session")
+def download_range(request) -> tuple[datetime, datetime]:
+    """Naive UTC start and end of the bulk download."""
+    start, end = request.config.getoption("--download-start"), request.config.getoption("--download-end")
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    try:
+        return datetime.fromisoformat(start), datetime.fromisoformat(end) if end else today
+    except ValueError as e:
+        raise pytest.UsageError(f"Invalid download date: {str(e)}")
+
+
+@pytest.fixture(scope="session")
+def download_dir(request):
+    return Path(request.config.getoption("--download-dir"))
+
+
+@pytest.fixture()
+def attach_to_report(request):
+    """Attach a named text section to the report of the test. It is shown on the html report and on failures."""
+    attachments = request.node.stash.setdefault(REPORT_ATTACHMENTS_STASH_KEY, [])
+
+    def _attach(name, content):
+        attachments.append((name, content))
+
+    return _attach
+
+
+# ============================================== pytest-xdist ==============================================
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(config, items):
+    """
+    Group the data tests of each station and starting date on the same worker when running with pytest-xdist, so that
+    per-worker state (coalesced windows, connections, cached payloads) stays hot. Tests marked with `xdist_group` keep
+    their own group. Performance tests and downloads are skipped unless requested.
+    """
+    if not config.getoption("--run-performance"):
+        skip_performance = pytest.mark.skip(reason="Performance test. Run with --run-performance.")
+        for item in items:
+            if item.get_closest_marker(PERFORMANCE_MARKER):
+                item.add_marker(skip_performance)
+    if not config.getoption("--download-start"):
+        skip_download = pytest.mark.skip(reason="Bulk download. Run with --download-start.")
+        for item in items:
+            if item.get_closest_marker(DOWNLOAD_MARKER):
+                item.add_marker(skip_download)
+
+    # pytest-xdist only tags the node ids with the group name itself with `--dist loadgroup`.
+    tag_node_ids = hasattr(config, "workerinput") and not getattr(config.option, "loadgroup", False)
+    for item in items:
+        group = worker_group(item)
+        if group is None:
+            continue
+        if not item.get_closest_marker(XDIST_GROUP_MARKER):
+            item.add_marker(pytest.mark.xdist_group(group))
+        if tag_node_ids:
+            item._nodeid = f"{item.nodeid}@{group}"
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    """Schedule by worker group with the `load` distribution mode, the default of `-n`. Other modes are left alone."""
+    if config.getvalue("dist") != "load":
+        return None
+    from xdist.scheduler import LoadGroupScheduling
+
+    return LoadGroupScheduling(config, log)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # pytest-xdist workers hand their statistics over to the controller, which reports them.
+    config = session.config
+    datos_cache = config.stash.get(DATOS_CACHE_STASH_KEY, None)
+    if hasattr(config, "workeroutput"):
+        if datos_cache is not None:
+            config.workeroutput[WORKER_DATOS_CACHE_STATS] = dict(datos_cache.stats)
+        config.workeroutput[WORKER_REQUEST_METRICS] = config.stash[REQUEST_METRICS_STASH_KEY].rows()
+        config.workeroutput[WORKER_PERF_RUNS] = [asdict(run) for run in config.stash[PERF_RUNS_STASH_KEY]]
+        return
+
+    perf_runs = config.stash[PERF_RUNS_STASH_KEY]
+    if perf_runs:
+        run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}"
+        config.stash[PERF_BASELINE_STASH_KEY].append(run_id, current_commit(config.rootpath), perf_runs)
+
+    metrics_file = config.getoption("--request-metrics")
+    if metrics_file:
+        rows = config.stash[REQUEST_METRICS_STASH_KEY].rows() + config.stash.get(WORKER_REQUEST_METRICS_STASH_KEY, [])
+        write_metrics(Path(metrics_file), rows)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    workeroutput = getattr(node, "workeroutput", {})
+    stats = workeroutput.get(WORKER_DATOS_CACHE_STATS)
+    if stats:
+        node.config.stash.setdefault(WORKER_DATOS_CACHE_STATS_STASH_KEY, Counter()).update(stats)
+    rows = workeroutput.get(WORKER_REQUEST_METRICS, [])
+    node.config.stash.setdefault(WORKER_REQUEST_METRICS_STASH_KEY, []).extend(rows)
+    node.config.stash[PERF_RUNS_STASH_KEY].extend(TestRun(**run) for run in workeroutput.get(WORKER_PERF_RUNS, []))
+
+
 # ============================================== AEMET ==============================================
 
 
@@ -80,8 +660,30 @@ def email_headers():
     }
 
 @pytest.fixture(scope="session")
-def base_api_url():
-    return "https://opendata.aemet.es/opendata/api"
+def base_api_url(request, use_stub_api):
+    if use_stub_api:
+        return request.getfixturevalue("aemet_stub_server").base_api_url
+    return request.config.getoption("--base-api-url").rstrip("/")
+
+
+@pytest.fixture(scope="session")
+def aemet_stub_server(request, data_point_structure, api_key_handler):
+    """Local stand-in for the AEMET API. Accepts the keys of the key handler."""
+    dataset_dir = request.config.getoption("--stub-dataset")
+    dataset = StubDataset(Path(dataset_dir)) if dataset_dir else SyntheticDataset(data_point_structure)
+    server = AemetStubServer(
+        dataset,
+        valid_keys=set(api_key_handler.keys),
+        latency=request.config.getoption("--stub-latency"),
+        request_cap=int(request.config.getoption("--stub-request-cap")),
+        datos_fault_rate=float(request.config.getoption("--stub-datos-fault-rate")),
+    )
+    server.start()
+
+    yield server
+
+    logger.info(f"AEMET stub server requests: {server.request_counts}.")
+    server.stop()
 
 @pytest.fixture(scope="session")
 def antartida_api_endpoint():
@@ -143,25 +745,293 @@ def data_point_structure():
     }
 
 
+@pytest.fixture(scope="session")
+def data_point_string_fields():
+    """Datapoint fields holding strings. Every other field holds numbers."""
+    return {'nombre', 'identificacion', 'fhora'}
+
+
+@pytest.fixture(scope="session")
+def datapoint_validator(data_point_structure, data_point_string_fields):
+    return DatapointValidator(data_point_structure, data_point_string_fields)
+
+
 # ============================================== API Key =============================================
 
 
 @pytest.fixture(scope="session")
-def api_key_handler():
+def api_key_handler(use_stub_api):
+    from setup_env import SECRETS
+
+    handler = ApiKeyHandler(SECRETS[API_KEY_FILE_NAME], API_KEY_JSON_KEY, API_KEYS_JSON_KEY)
+    if use_stub_api and not handler.keys:
+        # No real key is needed against the stub server.
+        handler.add_key(STUB_API_KEY)
+    return handler
+
+
+@pytest.fixture(autouse=True, scope="module")
+def check_api_key_present(request):
+    """Skip the modules marked with `NEEDS_API_KEY_MARKER` if there is no API key, unless responses are replayed."""
+    if request.node.get_closest_marker(NEEDS_API_KEY_MARKER) is None:
+        return
+    if not request.getfixturevalue("api_key_handler").key and not request.getfixturevalue("replay_responses"):
+        pytest.skip("No API key found. Please run `pytest test_api_key_retrieval.py` first.")
+
+
+# ============================================== HTTP ==============================================
+
+
+@pytest.fixture(scope="session")
+def response_store(recordings_dir):
+    return ResponseStore(recordings_dir)
+
+
+@pytest.fixture(scope="session")
+def http_client(http_pool_size, record_responses, replay_responses, response_store):
+    """
+    Keep-alive HTTP client shared by every request of the session. When recording, every response is also stored.
+    When replaying, responses are served from the recordings and the network is never used.
+    """
+    if replay_responses:
+        logger.info(f"Replaying {len(response_store)} recorded responses.")
+        yield ReplayClient(response_store)
+        return
+
+    client = PooledHttpClient(pool_maxsize=http_pool_size)
+    if record_responses:
+        client = RecordingClient(client, response_store)
 
-    return ApiKeyHandler(SECRETS[API_KEY_FILE_NAME], API_KEY_JSON_KEY)
+    yield client
+
+    for host, host_stats in client.stats().items():
+        logger.info(
+            f"{host}: {host_stats['requests']} requests over {host_stats['connections']} connections "
+            f"({host_stats['reused']} reused)."
+        )
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def request_metrics(request) -> RequestMetrics:
+    """Collector of the metrics of every request of the session. Shown per test on the html report."""
+    return request.config.stash[REQUEST_METRICS_STASH_KEY]
+
+
+@pytest.fixture(scope="session")
+def retry_policy(request_cap_wait, test_deadline, session_deadline):
+    """
+    Retry policy of the API requests. The time spent waiting for the request cap to reset is bounded by
+    `--wait-for-capacity`, and every retry by the test and session deadlines.
+    """
+    backoffs = {
+        **DEFAULT_BACKOFFS,
+        RATE_LIMITED: replace(DEFAULT_BACKOFFS[RATE_LIMITED], max_wait=request_cap_wait * 60),
+    }
+    policy = RetryPolicy(backoffs, test_timeout=test_deadline, session_timeout=session_deadline)
+
+    yield policy
+
+    if policy.stats:
+        logger.info(f"Retries by error class: {dict(policy.stats)}.")
+
+
+@pytest.fixture(autouse=True)
+def retry_deadline(retry_policy):
+    """Start the deadline of each test for the retry policy."""
+    retry_policy.start_test()
+
+
+def local_state_path(config) -> Path:
+    """
+    Folder for state shared by every pytest process running from this root directory: in pytest's cache folder, or in
+    the temporary folder if the cache plugin is disabled (`-p no:cacheprovider`).
+    """
+    cache = getattr(config, "cache", None)
+    if cache is not None:
+        return Path(cache.mkdir(LOCAL_STATE_DIR))
+    root_id = hashlib.sha256(str(config.rootpath).encode()).hexdigest()[:16]
+    path = Path(tempfile.gettempdir()) / f"pytest-{LOCAL_STATE_DIR}-{root_id}"
+    path.mkdir(exist_ok=True)
+    return path
+
+
+@pytest.fixture(scope="session")
+def local_state_dir(request) -> Path:
+    return local_state_path(request.config)
+
+
+@pytest.fixture(scope="session")
+def rate_limiter(request, api_rate_limit, local_state_dir, replay_responses, use_stub_api):
+    """
+    Token bucket limiter shared through the local state folder. None if disabled. Against the stub server, the limit
+    is its request cap, and there is no limiter if it has none.
+    """
+    if use_stub_api:
+        api_rate_limit = min(api_rate_limit, int(request.config.getoption("--stub-request-cap")))
+    if api_rate_limit <= 0 or replay_responses:
+        return None
+    return TokenBucketRateLimiter(
+        local_state_dir / RATE_LIMIT_STATE_FILE,
+        capacity=api_rate_limit,
+        refill_rate=api_rate_limit / 60,
+    )
+
+
+@pytest.fixture(scope="session")
+def datos_cache(request, local_state_dir, record_responses, replay_responses, use_stub_api):
+    """
+    On-disk cache of historical datos payloads. None if disabled, when recording or replaying responses, since cached
+    payloads would bypass the recordings, or against the stub server, whose payloads depend on how it is configured.
+    """
+    max_megabytes = float(request.config.getoption("--datos-cache-size"))
+    if max_megabytes <= 0 or record_responses or replay_responses or use_stub_api:
+        return None
+    cache = DatosCache(local_state_dir / DATOS_CACHE_DIR, max_bytes=int(max_megabytes * 2**20))
+    request.config.stash[DATOS_CACHE_STASH_KEY] = cache
+    return cache
+
+
+# ============================================== AEMET requests ==============================================
+
+
+@pytest.fixture(scope="module")
+def request_get_retry(retry_policy, http_client, rate_limiter, api_key_handler, request_metrics):
+    def _request_get_retry(url, headers = None, querystring = None, stream = False, station = None):
+        # In order to focus on data validity, we will try to avoid failing tests due to non-functional issues.
+        keyed = "api_key" in (querystring or {})
+
+        def _get(record):
+            if not keyed:
+                return AemetResponse(http_client.get(url, headers=headers, stream=stream))
+
+            # Each attempt takes the least loaded key of the pool, so capped keys are not retried while others are free.
+            api_key = api_key_handler.next_key()
+            if rate_limiter is not None:
+                # Wait for the per-key request budget rather than running into the cap.
+                record.rate_limit_wait += rate_limiter.acquire(api_key)
+            # Decoded once, on the first of the checks below, and shared with the retry policy and the test.
+            response = AemetResponse(http_client.get(
+                url, headers=headers, params={**querystring, "api_key": api_key}, stream=stream
+            ))
+            if request_limit_reached(response):
+                api_key_handler.report_limit_reached(api_key)
+                if rate_limiter is not None:
+                    rate_limiter.report_limit_reached(api_key)
+            elif api_key_invalid(response):
+                api_key_handler.report_unauthorized(api_key)
+            elif response.ok:
+                api_key_handler.report_success(api_key)
+                if rate_limiter is not None:
+                    rate_limiter.report_success(api_key)
+            return response
+
+        with request_metrics.measure(url, station=station) as record:
+            # Query responses are JSON, and retried if malformed. Data downloads may be streamed, so they are not
+            # decoded.
+            response = retry_policy.run(
+                partial(_get, record),
+                classify=partial(classify_response, check_json=keyed),
+                wait_hint=api_key_handler.seconds_until_any_usable if keyed else None,
+                on_retry=record.add_retry,
+            )
+            record.set_response(response)
+        return response
+
+    return _request_get_retry
+
+
+@pytest.fixture(scope="module")
+def query_antartida(
+    base_api_url,
+    api_key_handler,
+    request_get_retry,
+    antartida_api_endpoint,
+    date_format,
+):
+    def _query(station, starting_date, end_date, time_zone="UTC"):
+
+        # Prepare request components
+        starting_date_string = starting_date.strftime(date_format(time_zone))
+        end_date_string = end_date.strftime(date_format(time_zone))
+        url = antartida_api_endpoint(base_api_url, starting_date_string, end_date_string, station)
+        querystring = {"api_key": api_key_handler.key}
+        headers = {'cache-control': "no-cache"}
+
+        # Request to target endpoint
+        response = request_get_retry(url, headers=headers, querystring=querystring)
+            
+        return response
+    
+    return _query
+
+
+@pytest.fixture()
+def make_request(query_antartida, station, starting_date, interval):
+    def _request_response(starting_date=starting_date, time_zone="UTC"):
+        return query_antartida(station, starting_date, starting_date + interval, time_zone)
+    
+    return _request_response
+
+
+@pytest.fixture(scope="module")
+def bulk_downloader(request, query_antartida, retrieve_data, max_concurrency):
+    """Downloader of date ranges of any length, querying one window at a time through the helpers of the tests."""
+    def _fetch_window(station, start, end):
+        query_response = query_antartida(station, start, end)
+        if query_response.estado == 404:
+            return []
+        if not query_response.ok or query_response.datos is None:
+            raise RuntimeError(f"Query for {station=} from {start} to {end} failed: {query_response.text}")
+        data_response = retrieve_data(query_response, station, start, end)
+        if not data_response.ok:
+            raise RuntimeError(f"Download for {station=} from {start} to {end} failed: {data_response.status_code}")
+        return data_response.json()
+
+    window = timedelta(days=float(request.config.getoption("--download-window-days")))
+    return BulkDownloader(_fetch_window, window=window, concurrency=max_concurrency)
+
+
+@pytest.fixture(scope="module")
+def retrieve_data(base_api_url, request_get_retry, datos_cache):
+    def _retrieve_data(request_response, station, starting_date, end_date, time_zone="UTC", stream=False):
+        """
+        Download the data a successful query points to. Historical windows are served from the local cache. If
+        streamed, the body is only downloaded as it is read (see `iter_datapoints`).
+        """
+        source = urlsplit(base_api_url).netloc
+        start_utc, end_utc = to_utc(starting_date, time_zone), to_utc(end_date, time_zone)
+        use_cache = datos_cache is not None and datos_cache.cacheable(end_utc)
+        if use_cache:
+            data_response = datos_cache.get(source, station, start_utc, end_utc)
+            if data_response is not None:
+                logger.info(f"Data for {station=} from {start_utc} to {end_utc} UTC served from the local cache.")
+                return AemetResponse(data_response)
+
+        logger.info(f"Retrieving data from {request_response.datos}.")
+        data_response = request_get_retry(request_response.datos, stream=stream, station=station)
+        if use_cache and data_response.ok:
+            if stream:
+                return datos_cache.tee(source, station, start_utc, end_utc, data_response)
+            datos_cache.put(source, station, start_utc, end_utc, data_response)
+        return data_response
+
+    return _retrieve_data
 
 
 # ============================================== Email ==============================================
 
 @pytest.fixture(scope="session")
 def email_credentials() -> dict[str, str]:
+    from setup_env import SECRETS
+
     email_credentials_file = SECRETS[EMAIL_FILE_NAME]
     return json.loads(email_credentials_file.read_text())
 
 
 @pytest.fixture(scope="session")
 def gmail_imap_object(email_credentials):
+    from tests.utils.imap_handler import IMAP_handler
 
     IMAP_object = IMAP_handler(email_credentials=email_credentials)         
     IMAP_object.start()
@@ -171,8 +1041,31 @@ def gmail_imap_object(email_credentials):
 # ============================================== Selenium ==============================================
 
 @pytest.fixture(scope="session")
-def webdriver_options():
+def fast_navigation(request):
+    return bool(request.config.getoption("--fast-navigation"))
+
+
+@pytest.fixture(scope="session")
+def blocked_urls(request, fast_navigation) -> list[str]:
+    """URL patterns the browsers do not load. Empty unless navigating fast."""
+    if not fast_navigation:
+        return []
+    resource_types = [t.strip() for t in request.config.getoption("--block-resources").split(",") if t.strip()]
+    url_patterns = [p.strip() for p in request.config.getoption("--block-urls").split(",") if p.strip()]
+    try:
+        return blocked_url_patterns(resource_types, url_patterns)
+    except ValueError as e:
+        raise pytest.UsageError(str(e))
+
+
+@pytest.fixture(scope="session")
+def webdriver_options(fast_navigation):
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
+    if fast_navigation:
+        # Hand the page over once the DOM is ready, without waiting for every resource.
+        chrome_options.page_load_strategy = "eager"
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
@@ -181,30 +1074,90 @@ def webdriver_options():
     return chrome_options
 
 
-@pytest.fixture()
-def webdriver_factory(webdriver_options):
-    
-    drivers = []
-    
-    def _get_selenium_webdriver(headless = True):
+@pytest.fixture(scope="session")
+def chrome_binaries(request, webdriver_options) -> dict[str, str]:
+    """
+    Paths of chromedriver and Chrome. Resolved by Selenium Manager once, rather than on every launch, and kept in
+    pytest's cache folder for later runs while the files exist.
+    """
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.driver_finder import DriverFinder
+
+    cache = getattr(request.config, "cache", None)
+    binaries = cache.get(CHROME_BINARIES_CACHE_KEY, None) if cache is not None else None
+    if binaries and all(Path(path).exists() for path in binaries.values()):
+        return binaries
+
+    finder = DriverFinder(Service(), webdriver_options)
+    binaries = {"driver_path": finder.get_driver_path(), "browser_path": finder.get_browser_path()}
+    binaries = {name: path for name, path in binaries.items() if path}
+    if cache is not None:
+        request.config.cache.set(CHROME_BINARIES_CACHE_KEY, binaries)
+    return binaries
+
+
+@pytest.fixture(scope="session")
+def webdriver_pool(request, webdriver_options, chrome_binaries, blocked_urls):
+    """Browsers reused across tests. One browser of each mode is launched in the background right away."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    def _launch(headless):
         options = deepcopy(webdriver_options)
         if headless:
             options.add_argument("--headless")
-        driver = webdriver.Chrome(options=options)
-        driver.implicitly_wait(10)
+        if "browser_path" in chrome_binaries:
+            options.binary_location = chrome_binaries["browser_path"]
+        driver = webdriver.Chrome(options=options, service=Service(executable_path=chrome_binaries["driver_path"]))
+        if blocked_urls:
+            block_resources(driver, blocked_urls)
+        return driver
+
+    pool = WebDriverPool(
+        _launch,
+        size=int(request.config.getoption("--webdriver-pool-size")),
+        max_uses=int(request.config.getoption("--webdriver-max-uses")),
+    )
+    pool.prewarm(headless=True)
+    pool.prewarm(headless=False)
+
+    yield pool
+
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def page_loads(request):
+    return int(request.config.getoption("--page-loads"))
+
+
+@pytest.fixture(scope="session")
+def page_budgets(request) -> dict[str, float]:
+    try:
+        return parse_budgets(request.config.getoption("--page-budgets"))
+    except ValueError as e:
+        raise pytest.UsageError(str(e))
+
+
+@pytest.fixture()
+def webdriver_factory(webdriver_pool, fast_navigation):
+
+    drivers = []
+
+    def _get_selenium_webdriver(headless = True):
+        driver = webdriver_pool.acquire(headless)
+        # With fast navigation, a missing element is waited for explicitly (see `wait_for_elements`), and only there.
+        driver.implicitly_wait(0 if fast_navigation else ELEMENT_TIMEOUT)
         drivers.append(driver)
         return driver
 
     yield _get_selenium_webdriver
 
     for driver in drivers:
-        try:
-            driver.close()
-        except:
-            pass
+        webdriver_pool.release(driver)
 
 
-def save_selenium_screenshot(driver: WebDriver, screenshot_name: str):
+def save_selenium_screenshot(driver: "WebDriver", screenshot_name: str):
     screenshot = (Path("debug") / screenshot_name).with_suffix(".png")
     driver.save_screenshot(screenshot)
     return screenshot.as_posix()
\ No newline at end of file
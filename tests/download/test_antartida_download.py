@@ -0,0 +1,29 @@
+import logging
+
+import pytest
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+pytestmark = [pytest.mark.download, pytest.mark.needs_api_key]
+
+
+def pytest_generate_tests(metafunc):
+    if "station" in metafunc.fixturenames:
+        stations = [s.strip() for s in metafunc.config.getoption("--download-stations").split(",") if s.strip()]
+        metafunc.parametrize("station", stations)
+
+
+def test_bulk_download(bulk_downloader, download_range, download_dir, station, attach_to_report):
+    """
+    Download the history of a station over the requested range, as JSON lines in timestamp order. Running it again
+    after an interruption resumes the download where it stopped.
+    """
+    start, end = download_range
+    output = download_dir / f"antartida_{station}_{start:%Y%m%dT%H%M}_{end:%Y%m%dT%H%M}.jsonl"
+
+    result = bulk_downloader.download(station, start, end, output)
+
+    logger.info(result.summary())
+    attach_to_report("Bulk download", result.summary())
+    assert output.stat().st_size == result.bytes
@@ -1,33 +1,30 @@
 
 import logging
 import re
-import time
-import tkinter as tk
-from tkinter import messagebox
 
 import pytest
 from selenium.webdriver.common.by import By
 
 from tests.conftest import API_KEY_EMAIL_KEY, REQUEST_EMAIL_KEY, save_selenium_screenshot
+from tests.utils.fast_navigation import wait_for_elements
+from tests.utils.page_timing import budget_violations, format_timings, measure_page, summarize_timings
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# The key request flow shares the inbox and the stored key: it must run on a single worker.
+pytestmark = pytest.mark.xdist_group("api_key_retrieval")
+
+# Seconds to wait for each email of the key request flow.
+NEW_EMAIL_TIMEOUT = 100
+
 
 @pytest.fixture()
 def wait_until_new_email(email_headers, gmail_imap_object, email_counts_before):
     def _wait_until_new_email(key: str) -> str:
         """Wait until a new email with the given header is found on the inbox."""
-        n = 0
-        N = 100
         target_header = email_headers[key]
-        target_count = email_counts_before[key] + 1
-        email_received = False
-        while (not email_received) and n<N:
-            email_received = gmail_imap_object.count_emails_by_subject(target_header) == target_count
-            n += 1
-            time.sleep(1)
-        
+        gmail_imap_object.wait_for_new_email(target_header, email_counts_before[key], timeout=NEW_EMAIL_TIMEOUT)
         return gmail_imap_object.get_last_email_by_subject(target_header)
 
     return _wait_until_new_email
@@ -49,9 +46,10 @@ def test_navigation_to_api_key_generation_page(landing_page, key_generation_page
     driver.get(landing_page['url'])
 
     ## WHEN: Clicking on API Key button.
-    cards = driver.find_elements(By.CLASS_NAME, "card-block")
     # Get the Menu card which leads to the API Key generation process.
-    filtered_card = [card for card in cards if "API Key" in card.text]
+    filtered_card = wait_for_elements(
+        driver, By.CLASS_NAME, "card-block", predicate=lambda card: "API Key" in card.text
+    )
 
     if len(filtered_card) != 1:
         logger.error(f"Found {len(filtered_card)} menu cards matching description.")
@@ -65,10 +63,33 @@ def test_navigation_to_api_key_generation_page(landing_page, key_generation_page
     api_key_menu_button.click()
     
     ## THEN: We land on the API Key generation page.
-    assert driver.find_element(By.ID, "intro-header-rec").text == key_generation_page["text"]
+    header = wait_for_elements(driver, By.ID, "intro-header-rec", predicate=lambda element: element.text)
+    assert header and header[0].text == key_generation_page["text"]
     assert driver.current_url == key_generation_page["url"]
 
 
+@pytest.mark.parametrize("page", ["landing_page", "key_generation_page"])
+def test_page_timing_within_budget(
+        request, page, webdriver_factory, fast_navigation, page_loads, page_budgets, attach_to_report
+    ):
+    """Test that the loads of the AEMET pages keep within the timing budgets, as seen by the browser."""
+    if fast_navigation:
+        pytest.skip("Page timings are not representative with resources blocked by --fast-navigation.")
+    url = request.getfixturevalue(page)["url"]
+
+    ## GIVEN: A webdriver.
+    driver = webdriver_factory(headless=True)
+
+    ## WHEN: Loading the page repeatedly.
+    logger.info(f"Selenium webdriver loading {url} {page_loads} times.")
+    timings = measure_page(driver, url, loads=page_loads)
+    attach_to_report("Page timing", format_timings(url, timings))
+
+    ## THEN: The percentiles of the timings are within budget.
+    violations = budget_violations(summarize_timings(timings), page_budgets)
+    assert not violations, f"{url} over budget: {'; '.join(violations)}"
+
+
 def test_API_key_request(
         key_generation_page,
         webdriver_factory,
@@ -88,7 +109,10 @@ def test_API_key_request(
     logger.info(f"Input email {email_credentials['address']} into the form.")
     headful_driver.find_element(By.ID, "email").send_keys(email_credentials["address"])
     
-    # Notify the tester that manual input is required
+    # Notify the tester that manual input is required. Only this test needs the GUI stack: import it here.
+    import tkinter as tk
+    from tkinter import messagebox
+
     root = tk.Tk()
     root.withdraw()
     logger.info(f"Awaiting user input for Captcha.")
@@ -115,11 +139,6 @@ def test_API_key_request(
         logger.warning(f"Exception message: {str(e)}")
         logger.warning(f"Inspect screenshot {screenshot_path} for more information.")
 
-
-    # Close the headful driver.
-    logger.info("Closing headful driver")
-    headful_driver.close()
-
     # Wait for first email to be received
     logger.info(f"Waiting for API Key request confirmation email.")
     key_request_confirmation_email = wait_until_new_email(REQUEST_EMAIL_KEY)
@@ -1,21 +1,27 @@
 
+from array import array
 from datetime import datetime, timedelta
 import logging
-import math
-import time
 from unittest.mock import patch
 
 import pytest
 
-from tests.utils.requests_functions import request_get_with_exception_handling, request_limit_reached
+from tests.utils.async_requests import AsyncRequestEngine
+from tests.utils.columnar import DatapointColumns
+from tests.utils.datapoint_validator import format_offending
+from tests.utils.gap_analysis import analyse_gaps, to_epoch
+from tests.utils.range_coalescing import RangeCoalescer
+from tests.utils.requests_functions import iter_datapoints
+from tests.utils.worker_affinity import worker_group
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+pytestmark = pytest.mark.needs_api_key
+
 
 ESTACION_RADIOMETRICA_JCI_ARCHIVE_DATE = datetime(2007,3,7)
 DATA_TIME_RESOLUTION = timedelta(minutes=10)
-API_REQUEST_CAP_SLEEP = 5  # Seconds between attempts after api request cap is reached.
 
 
 # Input parameters
@@ -28,85 +34,92 @@ STARTING_DATES = [
 VALID_INTERVALS = [timedelta(minutes=15), timedelta(minutes=25), timedelta(hours=6) , timedelta(days=29)]
 
 
-@pytest.fixture(autouse=True, scope="module")
-def check_api_key_present(api_key_handler):
-    if not api_key_handler.key:
-        pytest.skip("No API key found. Please run `pytest test_api_key_retrieval.py` first.")
+def _query_and_retrieve(query_antartida, retrieve_data, station, starting_date, end_date, stream=False):
+    request_response = query_antartida(station, starting_date, end_date)
+    if not request_response.ok or request_response.datos is None:
+        return request_response, None
+    return request_response, retrieve_data(request_response, station, starting_date, end_date, stream=stream)
 
-@pytest.fixture()
-def request_get_retry(request_cap_wait):
-    def _request_get_retry(url, headers = None, querystring = None):
-        # In order to focus on data validity, we will try to avoid failing tests due to non-functional issues.
-        n = 0
-        N = 5
-        response = request_get_with_exception_handling(url=url, headers=headers, params=querystring)
-        while not response.ok and n<N:
-            if request_limit_reached(response):
-                m = 0
-                M = request_cap_wait * 60 / API_REQUEST_CAP_SLEEP
-                while request_limit_reached(response) and m<M:
-                    # Loop to wait for api request limit to expire
-                    response = request_get_with_exception_handling(url=url, headers=headers, params=querystring)
-                    time.sleep(API_REQUEST_CAP_SLEEP)
-                    m+=1
-
-                if request_limit_reached(response):
-                    # Note that we may fail the test during the first iteration of the outer loop if this is the cause.
-                    return response
-
-            time.sleep(1)
-            response = request_get_with_exception_handling(url=url, headers=headers, params=querystring)
-            n+=1
-        return response
-
-    return _request_get_retry
+
+@pytest.fixture(scope="module")
+def range_coalescer(request, coalesce_ranges, query_antartida, retrieve_data):
+    """
+    Serve the windows of every collected test using `fetch_data` from one request per station and covering window.
+    The windows are planned by worker group, once the first test of the group runs: with pytest-xdist, a worker only
+    runs some of the groups. None if disabled.
+    """
+    if not coalesce_ranges:
+        yield None
+        return
+
+    groups = {}
+    for item in request.session.items:
+        if "fetch_data" in item.fixturenames and hasattr(item, "callspec"):
+            params = item.callspec.params
+            groups.setdefault(worker_group(item), []).append(
+                (params["station"], params["starting_date"], params["starting_date"] + params["interval"])
+            )
+
+    def _fetch_window(station, starting_date, end_date):
+        # Covers are decoded as they are downloaded.
+        return _query_and_retrieve(query_antartida, retrieve_data, station, starting_date, end_date, stream=True)
+
+    coalescer = RangeCoalescer(_fetch_window, groups=groups)
+
+    yield coalescer
+
+    stats = coalescer.stats
+    logger.info(
+        f"Range coalescing: {stats['windows']} windows served with {stats['requests']} requests "
+        f"({len(coalescer)} covers planned)."
+    )
 
 
 @pytest.fixture()
-def make_request(
-    base_api_url,
-    api_key_handler,
-    station,
-    starting_date,
-    interval,
-    request_get_retry,
-    antartida_api_endpoint,
-    date_format,
-):
-    def _request_response(starting_date=starting_date, time_zone="UTC"):
+def fetch_data(request, range_coalescer, query_antartida, retrieve_data, station, starting_date, interval):
+    """
+    Query the data of the test window and download it. Returns the query response, and the data response or None if
+    the query did not point to any data.
+    """
+    def _fetch_data(stream=False):
+        if range_coalescer is not None:
+            return range_coalescer.fetch(
+                station, starting_date, starting_date + interval, group=worker_group(request.node)
+            )
+        return _query_and_retrieve(
+            query_antartida, retrieve_data, station, starting_date, starting_date + interval, stream=stream
+        )
 
-        end_date = starting_date + interval
+    return _fetch_data
 
-        # Prepare request components
-        starting_date_string = starting_date.strftime(date_format(time_zone))
-        end_date_string = end_date.strftime(date_format(time_zone))
-        url = antartida_api_endpoint(base_api_url, starting_date_string, end_date_string, station)
-        querystring = {"api_key": api_key_handler.key}
-        headers = {'cache-control': "no-cache"}
 
-        # Request to target endpoint
-        response = request_get_retry(url, headers=headers, querystring=querystring)
-            
-        return response
-    
-    return _request_response
+@pytest.fixture()
+def make_batch_request(query_antartida, retrieve_data, max_concurrency):
+    """
+    Make several data requests concurrently. Takes a list of (station, start, end, time zone) tuples and returns a
+    (query response, data response) pair per tuple, in the same order.
+    """
+    engine = AsyncRequestEngine(query_antartida, retrieve_data, concurrency=max_concurrency)
+    return engine.fetch_batch
 
 
 @pytest.mark.parametrize("station", VALID_STATION_IDENTIFICATORS)
 @pytest.mark.parametrize("starting_date", STARTING_DATES)
 @pytest.mark.parametrize("interval", VALID_INTERVALS)
 def test_api_key_valid_request(
-    make_request,
+    fetch_data,
     interval,
-    data_point_structure,
+    datapoint_validator,
     allow_missing_datapoints,
-    request_get_retry,
+    fail_on_gaps,
+    attach_to_report,
+    stream_datos,
     station,
     starting_date
 ):
 
     logger.info(f"Making data request for {station=}, {starting_date=} and {interval=}.")
-    request_response = make_request()
+    request_response, data_response = fetch_data(stream=stream_datos)
     logger.info(f"Response text: {request_response.text}.")
 
     if (not request_response.ok):
@@ -125,26 +138,49 @@ def test_api_key_valid_request(
         }
 
     ## Data availability
-    if request_response.json()["estado"] == 404:
+    if request_response.estado == 404:
         # Whether this is a passed or failed test would depend on the specific business logic behind the API
         # consumption and the particular scope of these tests. I have finally opted for consider this a passing
         # behavior, since being able to properly inform about the lack of data for this query is expected behavior.
         logger.info("A 404 status was returned. Ensuring description matches status code.")
-        assert "No hay datos que satisfagan esos criterios" in request_response.json()["descripcion"]
+        assert "No hay datos que satisfagan esos criterios" in request_response.descripcion
         return
 
     ## Data retrieval
-    logger.info(f"Retrieving data from {request_response.json()['datos']}.")
-    data_response = request_get_retry(request_response.json()['datos'])
-    # We will not log this response directly, as it may contain a large amount of data.
-
-    if not data_response.ok:
+    # We will not log the data response directly, as it may contain a large amount of data.
+    if data_response is None or not data_response.ok:
         # We can log it for troubleshooting if there was an error, no data is expected.
         logger.error(f"Response text: {request_response.text}.")
         pytest.fail(f"Request failed. Inspect the logs for more information.")
 
-    data = data_response.json()
-    N = len(data)
+    if stream_datos:
+        # Validate each datapoint as soon as it is decoded, without holding the series in memory.
+        logger.info("Verifying datapoint structure while streaming the data.")
+        n_points_max = interval // DATA_TIME_RESOLUTION + 1
+        N = 0
+        times = array("q")  # Only the timestamps are kept, for the gap analysis.
+        for datapoint in iter_datapoints(data_response):
+            errors = datapoint_validator.errors(datapoint)
+            if errors:
+                pytest.fail(f"Datapoint {N} is invalid: {'; '.join(errors)}")
+            times.append(int(datetime.fromisoformat(datapoint["fhora"]).timestamp()))
+            N += 1
+            if not allow_missing_datapoints and N > n_points_max:
+                pytest.fail(f"Expected at most {n_points_max} datapoints, received more.")
+    else:
+        # Every datapoint is validated while the columns are built, in a single pass. The validator is cheap enough
+        # compared to the download not to sample.
+        columns = DatapointColumns()
+        offending = {}
+        for i, datapoint in enumerate(data_response.json()):
+            errors = datapoint_validator.errors(datapoint)
+            if errors:
+                offending[i] = errors
+            columns.append(datapoint)
+        # Only the columns are used from here on.
+        data_response.release()
+        N = len(columns)
+        times = columns.fhora
 
     if N == 0:
         # This is an odd scenario, but I've experienced it. Adding logging as a precaution.
@@ -152,6 +188,14 @@ def test_api_key_valid_request(
         pytest.fail("No data points were retrieved, but the status was not 404 either.")
 
     ## Data validity
+    logger.info("Analysing gaps in the data series.")
+    gaps = analyse_gaps(
+        times, to_epoch(starting_date), to_epoch(starting_date + interval), int(DATA_TIME_RESOLUTION.total_seconds())
+    )
+    attach_to_report("Gap analysis", gaps.summary())
+    if fail_on_gaps and not gaps.complete:
+        pytest.fail(f"The data series is not exhaustive.\n{gaps.summary()}")
+
     if not allow_missing_datapoints:
         logger.info("Checking data length.")
         # Check that number of data points is consistent with the time interval selected.
@@ -159,14 +203,15 @@ def test_api_key_valid_request(
         if not(n_points_estimated <= N <= (n_points_estimated + 1)):
             pytest.fail(f"Expected {n_points_estimated} or {n_points_estimated + 1} datapoints, received {N}")
 
-    # Verify consistency of data structure
-    for i in range(0, math.ceil(N/100), N):
-        logger.info("Verifying datapoint structure.")
-        # Since the data series is a list of dictionaries, I do not see another way to ensure check the structure is
-        # consistent other than checking each element. Beinh thorough may be an unnecessary consumption of testing
-        # resources. To mitigate the issue, we will only verify roughly 100 equispaced datapoints for each query.
-        logger.info(f"Data point fields retrieved: {', '.join(data[i].keys())}")
-        assert set(data[i].keys()) == data_point_structure
+    # Verify consistency of data structure: every datapoint holds every field, and no other, with values of the
+    # expected type. Already done datapoint by datapoint if streamed.
+    if stream_datos:
+        return
+    logger.info("Verifying datapoint structure.")
+    logger.info(f"Data point fields retrieved: {', '.join(sorted(columns.fields))}")
+    if offending:
+        logger.error(format_offending(offending, limit=len(offending)))
+        pytest.fail(format_offending(offending))
 
 
 @pytest.mark.parametrize(
@@ -175,8 +220,8 @@ def test_api_key_valid_request(
 )
 def test_unauthorized_request(api_key_handler, make_request):
     """Test that a request made with an invalid key returns a 401 status code."""
-    # Mock the key attribute stored at the key handler, leaving every other system untouched.
-    with patch.object(api_key_handler, "_key", "fake.key"):
+    # Mock the key pool stored at the key handler, leaving every other system untouched.
+    with patch.object(api_key_handler, "_keys", ["fake.key"]):
         response = make_request()
         assert response.json() == {'descripcion': 'API key invalido', 'estado': 401}
         
@@ -199,7 +244,7 @@ def test_negative_interval(make_request, station, starting_date, interval):
     [datetime(year=2000, month=1, day=1) + i*timedelta(weeks=26) for i in range(12)]
 )
 @pytest.mark.parametrize("interval", [timedelta(hours=1)])
-def test_time_zone_consistency(make_request, starting_date, request_get_retry, station, interval):
+def test_time_zone_consistency(make_batch_request, starting_date, station, interval):
     """
     Test time zone consistency in the output. We observe that the data provided is always UTC+0000.
 
@@ -213,36 +258,44 @@ def test_time_zone_consistency(make_request, starting_date, request_get_retry, s
     - We want to validate this behavior for every database, so we will check the for stations.
     
     So one interval and two dates per year will suffice. To avoid making the exercise slower, we will test a few.
+    The three time zone requests are issued concurrently.
     """
 
-    def _get_data_for_timezone(time_zone, starting_time):
+    time_zone_queries = [
+        ("UTC", starting_date-timedelta(hours=1)),
+        ("CET", starting_date),
+        ("CEST", starting_date+timedelta(hours=1)),
+    ]
+    logger.info(f"Making data requests for {station=}, {starting_date=} and {interval=} in UTC, CET and CEST.")
+    responses = make_batch_request([
+        (station, starting_time, starting_time + interval, time_zone)
+        for time_zone, starting_time in time_zone_queries
+    ])
+
+    def _get_data_for_timezone(time_zone, request_response, data_response):
 
-        logger.info(f"Making data request for {station=}, {starting_time=} and {interval=} with CET time zone.")
-        request_response = make_request(starting_date=starting_time, time_zone=time_zone)
-        logger.info(f"Response text: {request_response.text}.")
+        logger.info(f"Response text for {time_zone} time zone: {request_response.text}.")
 
         if (not request_response.ok):
         # Even if no data is retrieved, we still expect a 200 code for the API request itself.
             pytest.fail(f"Request failed. Inspect the logs for more information.")
 
-        if request_response.json()["estado"] == 404:
+        if request_response.estado == 404:
             # This test serves no purpose in this case. Parametrization should probably be reviewed.
             pytest.skip("Parametrization not relevant.")
 
         # Data retrieval
-        logger.info(f"Retrieving data from {request_response.json()['datos']}.")
-        data_response = request_get_retry(request_response.json()["datos"])
-        if not data_response.ok:
-            pytest.fail(f"Data access failed: {data_response.text}")
-
-        return data_response.json()
-
-    utc_data = _get_data_for_timezone("UTC", starting_date-timedelta(hours=1))
-    cet_data = _get_data_for_timezone("CET", starting_date)
-    cest_data = _get_data_for_timezone("CEST", starting_date+timedelta(hours=1))
-
-    # Verify times match
-    utc_times = [datapoint["fhora"] for datapoint in utc_data]
-    cet_times = [datapoint["fhora"] for datapoint in cet_data]
-    cest_times = [datapoint["fhora"] for datapoint in cest_data]
-    assert utc_times == cet_times == cest_times
+        if data_response is None or not data_response.ok:
+            pytest.fail(f"Data access failed: {getattr(data_response, 'text', None)}")
+
+        return DatapointColumns.from_datapoints(data_response.json())
+
+    utc_data, cet_data, cest_data = (
+        _get_data_for_timezone(time_zone, *response)
+        for (time_zone, _), response in zip(time_zone_queries, responses)
+    )
+
+    # Verify times match, and are written in UTC whatever the time zone of the query.
+    assert utc_data.fhora == cet_data.fhora == cest_data.fhora
+    for data in (utc_data, cet_data, cest_data):
+        assert data.offsets == {"+0000": len(data)}
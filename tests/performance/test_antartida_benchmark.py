@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import logging
+
+import pytest
+
+from tests.utils.benchmark import format_result, run_benchmark, write_benchmark
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+pytestmark = [pytest.mark.performance, pytest.mark.needs_api_key]
+
+
+# Input parameters
+BENCHMARK_STATIONS = ["89064", "89070"]
+BENCHMARK_INTERVALS = [timedelta(hours=1), timedelta(days=1), timedelta(days=29)]
+# Each operation requests a different day, so that no layer between the client and the API can serve a repeated query.
+BENCHMARK_START = datetime(2020, 1, 1)
+BENCHMARK_STEP = timedelta(days=1)
+
+
+def pytest_generate_tests(metafunc):
+    if "concurrency" in metafunc.fixturenames:
+        levels = [int(level) for level in metafunc.config.getoption("--benchmark-concurrency").split(",")]
+        metafunc.parametrize("concurrency", levels)
+
+
+@pytest.fixture(scope="module")
+def benchmark_results(benchmark_file, base_api_url):
+    """Results of every benchmark of the module, written to the benchmark file once they have all run."""
+    results = []
+
+    yield results
+
+    if results:
+        write_benchmark(benchmark_file, results, base_api_url)
+        logger.info(f"Benchmark results written to {benchmark_file}.")
+
+
+@pytest.mark.parametrize("station", BENCHMARK_STATIONS)
+@pytest.mark.parametrize("starting_date", [BENCHMARK_START])
+@pytest.mark.parametrize("interval", BENCHMARK_INTERVALS)
+def test_antartida_throughput(
+    make_request,
+    request_get_retry,
+    benchmark_samples,
+    benchmark_results,
+    attach_to_report,
+    station,
+    starting_date,
+    interval,
+    concurrency,
+):
+    """
+    Latency and throughput of querying a window of data and downloading it, with `concurrency` clients making requests
+    back to back. The local datos cache is not used, so every operation reaches the API.
+    """
+    def _operation(i):
+        query_response = make_request(starting_date=starting_date + i * BENCHMARK_STEP)
+        if not query_response.ok or query_response.datos is None:
+            logger.error(f"Query failed with status {query_response.status_code}: {query_response.text}")
+            return None
+        data_response = request_get_retry(query_response.datos, station=station)
+        return len(data_response.content) if data_response.ok else None
+
+    result = run_benchmark(
+        _operation,
+        operations=benchmark_samples * concurrency,
+        concurrency=concurrency,
+        station=station,
+        interval=interval.total_seconds(),
+    )
+    benchmark_results.append(result)
+    attach_to_report("Benchmark", format_result(result))
+
+    assert not result.errors, f"{result.errors} operations failed. Inspect logged ERRORs for details."
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from tests.utils import aemet_response as aemet_response_module
+from tests.utils.aemet_response import NO_DATA, OK, UNAUTHORIZED, AemetResponse, as_aemet_response
+from tests.utils.recorder import RecordedResponse
+from tests.utils.requests_functions import api_key_invalid, classify_response, request_limit_reached
+from tests.utils.retry_policy import MALFORMED_JSON, RATE_LIMITED, SERVER_ERROR
+
+
+def _response(status_code=200, body=None, content=None, charset="utf-8"):
+    content = content if content is not None else json.dumps(body).encode(charset)
+    headers = {"Content-Type": f"application/json;charset={charset}"}
+    return RecordedResponse("https://opendata.aemet.es", status_code, "", headers, content=content)
+
+
+@pytest.fixture()
+def decodes(monkeypatch):
+    """Count the bodies decoded."""
+    counter = []
+    decode_json = aemet_response_module.decode_json
+
+    def _decode_json(*args):
+        counter.append(args)
+        return decode_json(*args)
+
+    monkeypatch.setattr(aemet_response_module, "decode_json", _decode_json)
+    return counter
+
+
+def test_body_is_decoded_once(decodes):
+    response = AemetResponse(_response(body={"estado": 200, "descripcion": "exito", "datos": "https://datos/1"}))
+
+    assert not request_limit_reached(response)
+    assert not api_key_invalid(response)
+    assert classify_response(response, check_json=True) is None
+    assert response.json() is response.json()
+    assert (response.estado, response.descripcion, response.datos) == (200, "exito", "https://datos/1")
+    assert response.kind == OK and response.status_code == 200
+    assert as_aemet_response(response) is response
+    assert len(decodes) == 1
+
+
+def test_released_body_is_decoded_again(decodes):
+    response = AemetResponse(_response(body=[{"fhora": "2024-06-15T00:00:00+0000"}]))
+    response.json()
+    response.release()
+
+    assert "_decoded" not in vars(response)
+    assert response.json() == [{"fhora": "2024-06-15T00:00:00+0000"}]
+    assert len(decodes) == 2
+
+
+@pytest.mark.parametrize(
+    "response,kind",
+    [
+        (_response(body={"descripcion": "No hay datos que satisfagan esos criterios", "estado": 404}), NO_DATA),
+        (_response(body={"descripcion": "API key invalido", "estado": 401}), UNAUTHORIZED),
+        (_response(401, content=b"Unauthorized"), UNAUTHORIZED),
+        (_response(body={"descripcion": "Limite de peticiones", "estado": 429}), RATE_LIMITED),
+        (_response(429, content=b"<html>429 Too Many Requests</html>"), RATE_LIMITED),
+        (_response(503, content=b"Service Unavailable"), SERVER_ERROR),
+        (_response(content=b'{"estado": 2'), MALFORMED_JSON),
+        (_response(body=[{"fhora": "2024-06-15T00:00:00+0000"}]), OK),
+    ],
+)
+def test_kind(response, kind):
+    assert AemetResponse(response).kind == kind
+
+
+def test_fields_of_downloads_and_error_pages():
+    download = AemetResponse(_response(body=[{"fhora": "2024-06-15T00:00:00+0000"}]))
+    error_page = AemetResponse(_response(500, content=b"<html></html>"))
+
+    assert download.estado is None and download.datos is None
+    assert error_page.estado is None
+    with pytest.raises(ValueError):
+        error_page.json()
+
+
+@pytest.mark.parametrize("fast_decoder", [True, False])
+def test_bodies_in_other_encodings(monkeypatch, fast_decoder):
+    if not fast_decoder:
+        monkeypatch.setattr(aemet_response_module, "orjson", None)
+    body = {"estado": 200, "descripcion": "Año, estación"}
+
+    assert AemetResponse(_response(body=body, charset="ISO-8859-15")).json() == body
+    assert AemetResponse(_response(body=body)).json() == body
+
+
+def test_streamed_downloads_are_not_read_by_the_retry_classification():
+    class _Streamed(RecordedResponse):
+        @property
+        def content(self):
+            raise AssertionError("The body was read.")
+
+    response = AemetResponse(_Streamed("https://datos/1", 200, "", {}))
+
+    assert classify_response(response) is None
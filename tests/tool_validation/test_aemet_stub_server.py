@@ -0,0 +1,56 @@
+import pytest
+import requests
+
+from tests.utils.aemet_response import RATE_LIMITED, AemetResponse
+from tests.utils.aemet_stub_server import TOO_MANY_REQUESTS_HTML, AemetStubServer, SyntheticDataset
+
+
+@pytest.fixture()
+def stub_server():
+    server = AemetStubServer(
+        SyntheticDataset({"fhora", "identificacion", "temp"}), valid_keys={"key"}, request_cap=2
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+def _query_url(server, start, end, station="89064"):
+    return f"{server.base_api_url}/antartida/datos/fechaini/{start}/fechafin/{end}/estacion/{station}"
+
+
+def test_two_step_retrieval(stub_server):
+    """The query points to a datos url serving the datapoints of the window, time zone included."""
+    url = _query_url(stub_server, "2020-06-15T01:00:00CET", "2020-06-15T01:30:00CET")
+    response = requests.get(url, params={"api_key": "key"})
+    assert response.json()["estado"] == 200
+
+    data = requests.get(response.json()["datos"]).json()
+    assert [d["fhora"] for d in data] == [f"2020-06-15T00:{m}:00+0000" for m in ("00", "10", "20", "30")]
+
+
+def test_error_shapes(stub_server):
+    """401, 404 and 429 bodies match the ones of the real API."""
+    url = _query_url(stub_server, "2020-06-15T00:00:00UTC", "2020-06-14T00:00:00UTC")
+    assert requests.get(url, params={"api_key": "fake.key"}).json() == {
+        "descripcion": "API key invalido", "estado": 401
+    }
+    assert requests.get(url, params={"api_key": "key"}).json() == {
+        "descripcion": "No hay datos que satisfagan esos criterios", "estado": 404
+    }
+    requests.get(url, params={"api_key": "key"})
+    assert requests.get(url, params={"api_key": "key"}).json()["estado"] == 429
+    assert stub_server.request_counts["429"] == 1
+
+
+def test_datos_rate_limit_shape(stub_server):
+    """A `datos` download over the limit is answered with an html page, not JSON, as by the real API."""
+    url = _query_url(stub_server, "2020-06-15T00:00:00UTC", "2020-06-15T01:00:00UTC")
+    datos_url = requests.get(url, params={"api_key": "key"}).json()["datos"]
+    stub_server.datos_fault_rate = 1.0
+
+    response = requests.get(datos_url)
+    assert response.status_code == 429
+    assert response.headers["Content-Type"] == "text/html"
+    assert response.text == TOO_MANY_REQUESTS_HTML
+    assert AemetResponse(response).kind == RATE_LIMITED
@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+
+from tests.utils.api_key_handler import ApiKeyHandler
+
+
+def _handler(tmp_path, keys):
+    key_file = tmp_path / "keys.json"
+    key_file.write_text(json.dumps({"api_key": keys[0], "api_keys": keys[1:]}))
+    return ApiKeyHandler(key_file, "api_key", "api_keys")
+
+
+def test_keys_take_turns(tmp_path):
+    """Equally loaded keys are handed out in turns."""
+    handler = _handler(tmp_path, ["a", "b", "c"])
+    assert handler.keys == ["a", "b", "c"]
+    assert sorted(handler.next_key() for _ in range(6)) == ["a", "a", "b", "b", "c", "c"]
+
+
+def test_capped_and_invalid_keys_are_parked(tmp_path):
+    """Keys that reached the cap or are invalid are not handed out while a usable key remains."""
+    handler = _handler(tmp_path, ["a", "b", "c"])
+    handler.report_limit_reached("a")
+    handler.report_unauthorized("b")
+    assert {handler.next_key() for _ in range(4)} == {"c"}
+    assert handler.seconds_until_usable("a") > 0
+
+    handler.report_limit_reached("c")
+    # Every valid key is capped: the one expected to reset first is returned.
+    assert handler.next_key() == "a"
+
+
+def test_concurrent_key_selection_is_balanced(tmp_path):
+    """Keys handed out from several threads at once are all recorded, and the load stays balanced."""
+    handler = _handler(tmp_path, ["a", "b", "c", "d"])
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        keys = list(executor.map(lambda _: handler.next_key(), range(400)))
+    assert sorted(len(handler.health(key).recent_requests) for key in handler.keys) == [100] * 4
+    assert sorted(keys.count(key) for key in handler.keys) == [100] * 4
+
+
+def test_update_key_keeps_the_pool(tmp_path):
+    """The main key is replaced on file and in the pool, additional keys are kept."""
+    handler = _handler(tmp_path, ["a", "b"])
+    handler.update_key("z")
+    assert handler.key == "z"
+    assert handler.keys == ["z", "a", "b"]
+    assert json.loads((tmp_path / "keys.json").read_text())["api_key"] == "z"
+
+
+def _update_key(key_file, field, key):
+    ApiKeyHandler(key_file, field).update_key(key)
+
+
+def test_concurrent_key_updates_are_not_lost(tmp_path):
+    """Processes updating different fields of the same key file do not overwrite each other's changes."""
+    key_file = tmp_path / "keys.json"
+    key_file.write_text("{}")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_update_key, [key_file] * 40, [f"key_{i}" for i in range(40)], [f"k{i}" for i in range(40)]))
+    assert json.loads(key_file.read_text()) == {f"key_{i}": f"k{i}" for i in range(40)}
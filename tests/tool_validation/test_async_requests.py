@@ -0,0 +1,49 @@
+from datetime import datetime
+import threading
+import time
+from types import SimpleNamespace
+
+from tests.utils.async_requests import AsyncRequestEngine
+
+
+def _response(payload):
+    return SimpleNamespace(ok=True, json=lambda: payload)
+
+
+def test_batch_preserves_order_and_runs_concurrently():
+    """Responses are returned in input order, and the items are requested concurrently."""
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def _query(station, start, end, time_zone):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return _response({"estado": 200, "datos": f"https://datos/{station}/{time_zone}"})
+
+    def _data(query_response, *_):
+        return _response([{"url": query_response.json()["datos"]}])
+
+    items = [(str(i), datetime(2020, 1, 1), datetime(2020, 1, 2), "UTC") for i in range(6)]
+    results = AsyncRequestEngine(_query, _data, concurrency=3).fetch_batch(items)
+
+    assert [data.json()[0]["url"] for _, data in results] == [f"https://datos/{i}/UTC" for i in range(6)]
+    assert max_in_flight == 3
+
+
+def test_batch_skips_data_request_without_datos():
+    """No data request is made when the query does not point to any data."""
+    def _query(*_):
+        return _response({"estado": 404, "descripcion": "No hay datos que satisfagan esos criterios"})
+
+    def _data(*_):
+        raise AssertionError("Unexpected data request.")
+
+    item = ("89064", datetime(2020, 1, 1), datetime(2020, 1, 2), "UTC")
+    results = AsyncRequestEngine(_query, _data).fetch_batch([item])
+    assert results[0][1] is None
@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+
+from tests.utils.benchmark import BenchmarkResult, run_benchmark, throughput_curves, write_benchmark
+
+
+def test_run_benchmark_keeps_concurrency_and_counts_errors():
+    in_flight, peak = 0, 0
+    lock = threading.Lock()
+
+    def _operation(i):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        if i == 3:
+            raise ConnectionError("refused")
+        return None if i == 5 else 100
+
+    result = run_benchmark(_operation, operations=12, concurrency=3, station="89064", interval=3600)
+
+    assert peak == 3
+    assert (len(result.latencies), result.errors, result.bytes) == (10, 2, 1000)
+    assert 0 < result.throughput <= 12 / result.wall_time
+    assert result.as_dict()["operations"] == 12
+
+
+def test_throughput_curves_find_the_scaling_limit(tmp_path):
+    results = [
+        BenchmarkResult("89064", 3600, concurrency, wall_time=1.0, latencies=[0.1] * operations)
+        for concurrency, operations in [(4, 38), (1, 10), (2, 20), (8, 40)]
+    ]
+    results.append(BenchmarkResult("89070", 3600, 1, wall_time=1.0, latencies=[0.1] * 10))
+
+    curves = throughput_curves(results)
+
+    assert curves["89064/3600"]["concurrency"] == [1, 2, 4, 8]
+    assert curves["89064/3600"]["throughput"] == [10, 20, 38, 40]
+    assert curves["89064/3600"]["scaling_limit"] == 4
+    assert curves["89070/3600"]["scaling_limit"] is None
+
+    path = tmp_path / "benchmark.json"
+    write_benchmark(path, results, "http://127.0.0.1")
+    written = json.loads(path.read_text())
+    assert len(written["results"]) == 5
+    assert written["results"][0]["latency"] == {"p50": 0.1, "p95": 0.1, "p99": 0.1}
+    assert set(written["curves"]) == {"89064/3600", "89070/3600"}
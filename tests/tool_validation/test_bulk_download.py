@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from tests.utils.aemet_dates import format_fhora
+from tests.utils.bulk_download import CHECKPOINT_SUFFIX, BulkDownloader, split_windows
+
+START = datetime(2020, 1, 1)
+END = datetime(2020, 1, 3)
+WINDOW = timedelta(hours=6)
+RESOLUTION = timedelta(minutes=10)
+
+
+class _FakeApi:
+    # Datapoints every 10 minutes, window ends included, returned out of order and after a random delay. Fails once
+    # on the windows starting at `fail_at`.
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.fetched = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def fetch_window(self, station, start, end):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(random.uniform(0, 0.01))
+        with self._lock:
+            self.in_flight -= 1
+            self.fetched.append(start)
+        if start == self.fail_at:
+            self.fail_at = None
+            raise RuntimeError("Retries exhausted.")
+        datapoints = [
+            {"fhora": format_fhora(start + i * RESOLUTION), "identificacion": station}
+            for i in range((end - start) // RESOLUTION + 1)
+        ]
+        random.shuffle(datapoints)
+        return datapoints
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_split_windows():
+    assert split_windows(START, START + timedelta(days=65), timedelta(days=30)) == [
+        (START, START + timedelta(days=30)),
+        (START + timedelta(days=30), START + timedelta(days=60)),
+        (START + timedelta(days=60), START + timedelta(days=65)),
+    ]
+    assert split_windows(START, START) == []
+
+
+def test_windows_are_fetched_concurrently_and_written_in_order(tmp_path):
+    api = _FakeApi()
+    output = tmp_path / "89064.jsonl"
+
+    result = BulkDownloader(api.fetch_window, window=WINDOW, concurrency=4).download("89064", START, END, output)
+
+    fhoras = [datapoint["fhora"] for datapoint in _lines(output)]
+    expected = [format_fhora(START + i * RESOLUTION) for i in range((END - START) // RESOLUTION + 1)]
+    assert fhoras == expected
+    assert (result.windows, result.windows_resumed, result.datapoints) == (8, 0, len(expected))
+    assert result.bytes == output.stat().st_size
+    assert 1 < api.max_in_flight <= 4
+
+
+def test_interrupted_download_resumes_where_it_stopped(tmp_path):
+    output = tmp_path / "89064.jsonl"
+    api = _FakeApi(fail_at=START + 5 * WINDOW)
+    downloader = BulkDownloader(api.fetch_window, window=WINDOW, concurrency=2)
+
+    with pytest.raises(RuntimeError):
+        downloader.download("89064", START, END, output)
+    # A partial write past the checkpoint, e.g. the process was killed while writing.
+    with open(output, "a") as file:
+        file.write('{"fhora": "2020-01-02T06:')
+    api.fetched.clear()
+    result = downloader.download("89064", START, END, output)
+
+    reference = tmp_path / "reference.jsonl"
+    BulkDownloader(_FakeApi().fetch_window, window=WINDOW).download("89064", START, END, reference)
+    assert output.read_text() == reference.read_text()
+    assert result.windows_resumed == 5
+    assert min(api.fetched) == START + 5 * WINDOW
+
+
+def test_checkpoint_of_another_download_is_not_resumed(tmp_path):
+    output = tmp_path / "89064.jsonl"
+    BulkDownloader(_FakeApi().fetch_window, window=WINDOW).download("89064", START, END, output)
+
+    with pytest.raises(ValueError, match="different download"):
+        BulkDownloader(_FakeApi().fetch_window, window=WINDOW).download("89070", START, END, output)
+    assert output.with_suffix(output.suffix + CHECKPOINT_SUFFIX).exists()
+
+
+def test_output_without_checkpoint_is_not_overwritten(tmp_path):
+    output = tmp_path / "89064.jsonl"
+    BulkDownloader(_FakeApi().fetch_window, window=WINDOW).download("89064", START, END, output)
+    output.with_suffix(output.suffix + CHECKPOINT_SUFFIX).unlink()
+    content = output.read_text()
+
+    with pytest.raises(ValueError, match="no checkpoint"):
+        BulkDownloader(_FakeApi().fetch_window, window=WINDOW).download("89064", START, END, output)
+    assert output.read_text() == content
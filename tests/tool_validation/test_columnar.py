@@ -0,0 +1,24 @@
+import math
+
+from tests.utils.columnar import DatapointColumns
+
+
+def test_columns_from_datapoints():
+    datapoints = [
+        {"fhora": "2020-06-15T00:00:00+0000", "nombre": "JCI", "temp": -1.5, "hr": 80},
+        {"fhora": "2020-06-15T00:10:00+0000", "nombre": "JCI", "temp": None, "hr": "80"},
+        {"fhora": "2020-06-15T00:20:00+0000", "nombre": "GdC", "temp": 2, "pres": 990.1},
+    ]
+    columns = DatapointColumns.from_datapoints(iter(datapoints))
+
+    assert len(columns) == 3
+    assert columns.fields == {"fhora", "nombre", "temp", "hr", "pres"}
+    assert list(columns.fhora) == [1592179200, 1592179800, 1592180400]
+    assert columns.offsets == {"+0000": 3}
+    assert DatapointColumns.from_datapoints([{"fhora": "2020-06-15T02:00:00+0200"}]).offsets == {"+0200": 1}
+    assert columns.strings("nombre") == ["JCI", "JCI", "GdC"]
+    assert columns.numeric["temp"][0] == -1.5 and math.isnan(columns.numeric["temp"][1])
+    assert math.isnan(columns.numeric["pres"][0]) and columns.numeric["pres"][2] == 990.1
+    assert columns.present == {"fhora": 3, "nombre": 3, "temp": 3, "hr": 2, "pres": 1}
+    # Only the string on a numeric column is a type mismatch. Missing entries are not.
+    assert columns.invalid == {"fhora": 0, "nombre": 0, "temp": 0, "hr": 1, "pres": 0}
@@ -0,0 +1,65 @@
+from datetime import datetime
+import json
+import logging
+import time
+
+from tests.utils.aemet_stub_server import SyntheticDataset
+from tests.utils.datapoint_validator import DatapointValidator
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FIELDS = {"fhora", "nombre", "identificacion", "temp", "pres", "hr"}
+STRING_FIELDS = {"fhora", "nombre", "identificacion"}
+
+# Full validation of a payload must cost less than decoding it with the standard library, which every test pays
+# anyway. It costs about a third.
+VALIDATION_BUDGET = 1.0  # Fraction of the decoding time.
+RUNS = 3  # The best of several runs is compared, so that a single slow run does not fail the test.
+
+
+def test_every_offending_datapoint_reported():
+    validator = DatapointValidator(FIELDS, STRING_FIELDS)
+    valid = {"fhora": "2020-06-15T00:00:00+0000", "nombre": "JCI", "identificacion": "89064", "temp": -1.5,
+             "pres": 990, "hr": None}
+    datapoints = [
+        valid,
+        {**valid, "temp": "-1.5"},
+        valid,
+        {k: v for k, v in valid.items() if k != "pres"},
+        {**valid, "extra": 1, "hr": True},
+    ]
+    offending = validator.validate(datapoints)
+
+    assert list(offending) == [1, 3, 4]
+    assert offending[1] == ["temp='-1.5' is str"]
+    assert offending[3] == ["missing fields ['pres']"]
+    assert offending[4] == ["unexpected fields ['extra']", "hr=True is bool"]
+
+
+def test_full_validation_of_29_day_payload_within_budget(data_point_structure, data_point_string_fields):
+    """
+    Benchmark: validating every datapoint of a 29-day payload (about 4200 datapoints) is cheaper than decoding it.
+    """
+    data = SyntheticDataset(data_point_structure).query("89064", datetime(2020, 6, 15), datetime(2020, 7, 14))
+    payload = json.dumps(data).encode()
+    validator = DatapointValidator(data_point_structure, data_point_string_fields)
+
+    assert not validator.validate(data)
+    elapsed = _best_time(lambda: validator.validate(data))
+    decoding = _best_time(lambda: json.loads(payload))
+
+    logger.info(
+        f"Validated {len(data)} datapoints ({len(payload) / 2**20:.1f} MB) in {elapsed * 1000:.1f} ms, decoded in "
+        f"{decoding * 1000:.1f} ms."
+    )
+    assert elapsed < VALIDATION_BUDGET * decoding
+
+
+def _best_time(function) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -0,0 +1,54 @@
+from datetime import datetime
+import random
+from types import SimpleNamespace
+
+from tests.utils.datos_cache import DatosCache
+
+
+def _response(content):
+    return SimpleNamespace(url="https://datos", headers={"Content-Type": "application/json"}, content=content)
+
+
+def _window(day):
+    return datetime(1990, 6, day), datetime(1990, 6, day + 1)
+
+
+def test_hit_after_put(tmp_path):
+    cache = DatosCache(tmp_path, max_bytes=2**20)
+    assert cache.get("host", "89064", *_window(1)) is None
+    cache.put("host", "89064", *_window(1), _response(b'[{"fhora": "1990-06-01T00:00:00+0000"}]'))
+
+    response = DatosCache(tmp_path, max_bytes=2**20).get("host", "89064", *_window(1))
+    assert response.json() == [{"fhora": "1990-06-01T00:00:00+0000"}]
+    assert cache.get("other host", "89064", *_window(1)) is None
+    assert cache.stats["misses"] == 2
+
+
+def test_least_recently_used_payload_evicted(tmp_path):
+    """Once the size cap is exceeded, the payload accessed longest ago is evicted."""
+    payloads = [random.Random(i).randbytes(1000) for i in range(3)]  # Incompressible.
+    cache = DatosCache(tmp_path, max_bytes=2500)
+    cache.put("host", "89064", *_window(1), _response(payloads[0]))
+    cache.put("host", "89064", *_window(2), _response(payloads[1]))
+    cache.get("host", "89064", *_window(1))
+    cache.put("host", "89064", *_window(3), _response(payloads[2]))
+
+    assert cache.get("host", "89064", *_window(1)) is not None
+    assert cache.get("host", "89064", *_window(2)) is None
+    assert cache.stats["evictions"] == 1
+
+
+def test_missing_payload_is_a_miss(tmp_path):
+    """A payload removed while still on the index, e.g. evicted by another process, is a miss."""
+    cache = DatosCache(tmp_path, max_bytes=2**20)
+    cache.put("host", "89064", *_window(1), _response(b"[]"))
+    next(tmp_path.glob("*.z")).unlink()
+
+    assert cache.get("host", "89064", *_window(1)) is None
+    assert cache.stats["misses"] == 1
+
+
+def test_only_historical_windows_are_cacheable(tmp_path):
+    cache = DatosCache(tmp_path, max_bytes=2**20)
+    assert cache.cacheable(datetime(2000, 1, 1))
+    assert not cache.cacheable(datetime.now())
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from tests.utils.fast_navigation import (
+    RESOURCE_TYPE_PATTERNS,
+    block_resources,
+    blocked_url_patterns,
+    wait_for_elements,
+)
+
+
+class _FakeElement:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeDriver:
+    # Page whose elements show up `delay` seconds after it is created.
+
+    def __init__(self, elements, delay=0.0):
+        self._elements = elements
+        self._ready_at = time.monotonic() + delay
+        self.cdp_commands = []
+        self.lookups = 0
+
+    def find_elements(self, by, value):
+        self.lookups += 1
+        return self._elements.get((by, value), []) if time.monotonic() >= self._ready_at else []
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+
+def test_blocked_url_patterns():
+    patterns = blocked_url_patterns(["image", "font", "image"], ["*google-analytics.com*"])
+
+    assert patterns == RESOURCE_TYPE_PATTERNS["image"] + RESOURCE_TYPE_PATTERNS["font"] + ["*google-analytics.com*"]
+    with pytest.raises(ValueError, match="Unknown resource type"):
+        blocked_url_patterns(["xhr"], [])
+
+
+def test_block_resources_through_cdp():
+    driver = _FakeDriver({})
+    block_resources(driver, ["*.png*"])
+
+    assert driver.cdp_commands == [("Network.enable", {}), ("Network.setBlockedURLs", {"urls": ["*.png*"]})]
+
+
+def test_wait_for_elements_returns_as_soon_as_they_match():
+    from selenium.webdriver.common.by import By
+
+    cards = [_FakeElement("Datos"), _FakeElement("Obtención de API Key")]
+    driver = _FakeDriver({(By.CLASS_NAME, "card-block"): cards}, delay=0.3)
+
+    start = time.monotonic()
+    found = wait_for_elements(driver, By.CLASS_NAME, "card-block", predicate=lambda card: "API Key" in card.text)
+
+    assert found == cards[1:]
+    assert time.monotonic() - start < 1
+    assert driver.lookups > 1
+
+
+def test_wait_for_elements_gives_up_after_the_timeout():
+    from selenium.webdriver.common.by import By
+
+    driver = _FakeDriver({(By.ID, "intro-header-rec"): [_FakeElement("")]})
+
+    start = time.monotonic()
+    assert wait_for_elements(driver, By.ID, "intro-header-rec", predicate=lambda e: e.text, timeout=0.3) == []
+    assert time.monotonic() - start < 1
@@ -0,0 +1,78 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import time
+
+from tests.utils.gap_analysis import analyse_gaps, to_epoch
+
+START = to_epoch(datetime(2020, 6, 15))
+SLOT = 600
+# Time the analysis may take, as a fraction of a naive check of the same series that goes through every slot as a
+# datetime. It takes about a tenth.
+ANALYSIS_BUDGET = 0.5
+RUNS = 3  # The best of several runs is compared, so that a single slow run does not fail the test.
+
+
+def test_complete_series():
+    report = analyse_gaps([START + i * SLOT for i in range(7)], START, START + 6 * SLOT)
+    assert report.complete
+    assert report.expected_slots == 7
+
+
+def test_shuffled_series_is_not_complete():
+    times = [START + i * SLOT for i in range(7)]
+    times[2], times[4] = times[4], times[2]
+    report = analyse_gaps(times, START, START + 6 * SLOT)
+
+    assert not report.missing_ranges and not report.duplicates and not report.off_grid
+    assert report.out_of_order == [3, 4]
+    assert not report.complete
+
+
+def test_missing_duplicated_and_out_of_order():
+    times = [START, START + SLOT, START + 4 * SLOT, START + 3 * SLOT, START + 4 * SLOT, START + 5 * SLOT + 1]
+    report = analyse_gaps(times, START, START + 8 * SLOT)
+
+    assert not report.complete
+    # Slot 2, and slots 5 to 8.
+    assert report.missing_ranges == [(START + 2 * SLOT, 1), (START + 5 * SLOT, 4)]
+    assert report.missing_count == 5
+    assert report.duplicates == [(START + 4 * SLOT, 2)]
+    assert report.out_of_order == [3]
+    assert report.off_grid == [START + 5 * SLOT + 1]
+    assert "Missing slots: 5 in 2 ranges." in report.summary()
+
+
+def test_multi_month_series_is_fast():
+    """Four stations, three months each, with a gap every 1000 slots."""
+    n_slots = 92 * 144
+    series = [[START + i * SLOT for i in range(n_slots) if i % 1000] for _ in range(4)]
+
+    end = START + (n_slots - 1) * SLOT
+
+    reports = [analyse_gaps(times, START, end) for times in series]
+    assert all(report.missing_count == 14 for report in reports)
+    assert all(len(_naive_missing_slots(times, START, end)) == 14 for times in series)
+
+    elapsed = _best_time(lambda: [analyse_gaps(times, START, end) for times in series])
+    naive = _best_time(lambda: [_naive_missing_slots(times, START, end) for times in series])
+    assert elapsed < ANALYSIS_BUDGET * naive
+
+
+def _naive_missing_slots(times, start, end):
+    seen = Counter(datetime.fromtimestamp(t, timezone.utc) for t in times)
+    slot, last = datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc)
+    missing = []
+    while slot <= last:
+        if slot not in seen:
+            missing.append(slot)
+        slot += timedelta(seconds=SLOT)
+    return missing
+
+
+def _best_time(function) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
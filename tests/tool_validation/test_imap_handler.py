@@ -0,0 +1,274 @@
+import base64
+from collections import Counter
+import quopri
+import re
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from tests.utils.imap_handler import IMAP_handler, fetch_item, parse_imap_data, text_parts
+
+CREDENTIALS = {"address": "user@example.com", "pswd": "secret"}
+PARTIAL_FETCH = re.compile(r"BODY\.PEEK\[(\d+)\]<(\d+)\.(\d+)>")
+
+
+def _message(subject, html):
+    # Parts of a multipart/alternative email: (subtype, encoding, encoded content).
+    plain = quopri.encodestring(f"Plain version of {subject}".encode())
+    html = base64.b64encode(html.encode())
+    return {"subject": subject, "parts": [("PLAIN", "QUOTED-PRINTABLE", plain), ("HTML", "BASE64", html)]}
+
+
+class _FakeImapHandler(socketserver.StreamRequestHandler):
+    # Just enough IMAP for IMAP_handler: login, examine, UID search and fetch, noop, idle and logout.
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections.append(self)
+        self.send_line(b"* OK fake IMAP ready")
+        for line in self.rfile:
+            tag, command, *args = line.decode().strip().split(" ", 2)
+            command = command.upper()
+            if command == "UID":
+                uid_command, *args = args[0].split(" ", 1)
+                command = f"UID {uid_command.upper()}"
+            server.commands[command] += 1
+            if command == "CAPABILITY":
+                self.send_line(b"* CAPABILITY " + " ".join(server.capabilities).encode())
+            elif command == "EXAMINE":
+                self.send_line(f"* {len(server.messages)} EXISTS".encode())
+                self.send_line(f"* OK [UIDVALIDITY {server.uid_validity}] UIDs valid".encode())
+                self.send_line(f"* OK [UIDNEXT {server.first_uid + len(server.messages)}] Predicted next UID".encode())
+                self.send_line(f"{tag} OK [READ-ONLY] done".encode())
+                continue
+            elif command == "UID SEARCH":
+                self.search(args[0])
+            elif command == "UID FETCH":
+                self.fetch(args[0])
+            elif command == "IDLE":
+                with server.lock:
+                    server.idling.add(self)
+                    continuation = b"+ idling\r\n"
+                    if server.deliver_on_idle:
+                        # Announced in the same write as the continuation, as real servers may do.
+                        server.messages.append(_message(server.deliver_on_idle, "<p>new</p>"))
+                        server.deliver_on_idle = None
+                        continuation += f"* {len(server.messages)} EXISTS\r\n".encode()
+                    self.wfile.write(continuation)
+                self.rfile.readline()  # DONE
+                with server.lock:
+                    server.idling.discard(self)
+            elif command == "LOGOUT":
+                self.send_line(b"* BYE")
+                self.send_line(f"{tag} OK done".encode())
+                return
+            self.send_line(f"{tag} OK done".encode())
+
+    def search(self, args):
+        first, last = args.split(" ")[1].split(":")
+        subject = args.split('"')[1]
+        uids = self.server.uids()
+        # As on real servers, n:* covers the last message even if n is above every UID.
+        in_range = [uid for uid in uids if uid >= int(first)] or uids[-1:]
+        self.server.searched += len(in_range)
+        matches = [str(uid) for uid in in_range if subject in self.server.message(uid)["subject"]]
+        self.send_line(" ".join(["* SEARCH", *matches]).encode())
+
+    def fetch(self, args):
+        uid, items = args.split(" ", 1)
+        message = self.server.message(int(uid))
+        seq = self.server.uids().index(int(uid)) + 1
+        if "BODYSTRUCTURE" in items:
+            parts = "".join(
+                f'("TEXT" "{subtype}" ("CHARSET" "utf-8") NIL NIL "{encoding}" {len(content)} 1)'
+                for subtype, encoding, content in message["parts"]
+            )
+            structure = f'({parts} "ALTERNATIVE" ("BOUNDARY" "b1"))'
+            self.send_line(f"* {seq} FETCH (UID {uid} BODYSTRUCTURE {structure})".encode())
+            return
+        section, offset, length = map(int, PARTIAL_FETCH.search(items).groups())
+        chunk = message["parts"][section - 1][2][offset:offset + length]
+        self.server.body_bytes += len(chunk)
+        with self.server.lock:
+            self.wfile.write(f"* {seq} FETCH (UID {uid} BODY[{section}]<{offset}> {{{len(chunk)}}}\r\n".encode())
+            self.wfile.write(chunk + b")\r\n")
+
+    def send_line(self, line):
+        with self.server.lock:
+            self.wfile.write(line + b"\r\n")
+
+
+class _FakeImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, capabilities):
+        super().__init__(("127.0.0.1", 0), _FakeImapHandler)
+        self.capabilities = capabilities
+        self.uid_validity = 1
+        self.first_uid = 10
+        self.messages = [_message("Other", "<p>other</p>"), _message("Welcome", "<p>welcome</p>")]
+        self.commands = Counter()
+        self.searched = 0  # Messages covered by the UID ranges searched.
+        self.body_bytes = 0  # Bytes of body parts sent.
+        self.connections = []
+        self.idling = set()
+        self.deliver_on_idle = None  # Subject of a message delivered when the next IDLE starts.
+        self.lock = threading.RLock()
+
+    def uids(self):
+        return list(range(self.first_uid, self.first_uid + len(self.messages)))
+
+    def message(self, uid):
+        return self.messages[uid - self.first_uid]
+
+    def deliver(self, subject, html="<p>new</p>"):
+        with self.lock:
+            self.messages.append(_message(subject, html))
+            for handler in self.idling:
+                handler.wfile.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+
+    def drop_connections(self):
+        with self.lock:
+            for handler in self.connections:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            self.connections = []
+            self.idling = set()
+
+
+@pytest.fixture(params=[("IMAP4rev1", "IDLE"), ("IMAP4rev1",)], ids=["idle", "polling"])
+def imap_server(request):
+    server = _FakeImapServer(request.param)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def imap_handler(imap_server):
+    handler = IMAP_handler(CREDENTIALS, imap_url="127.0.0.1", port=imap_server.server_address[1], use_ssl=False)
+    handler.POLL_INTERVAL = 0.05
+    handler.start()
+    yield handler
+    handler.close()
+
+
+def _deliver_later(server, subject, delay):
+    timer = threading.Timer(delay, server.deliver, args=(subject,))
+    timer.start()
+    return timer
+
+
+def test_new_email_is_noticed_as_it_arrives(imap_server, imap_handler):
+    count_before = imap_handler.count_emails_by_subject("API Key")
+    _deliver_later(imap_server, "Your API Key", 0.3)
+
+    timeout = 10
+    start = time.monotonic()
+    assert imap_handler.wait_for_new_email("API Key", count_before, timeout=timeout)
+    elapsed = time.monotonic() - start
+
+    # Noticed shortly after it arrives, not at the timeout. The bound is loose so that a loaded machine does not fail.
+    assert elapsed < timeout / 2
+    if "IDLE" in imap_server.capabilities:
+        assert imap_handler.idle_supported
+        # Pushed by the server: no polling in the meantime.
+        assert imap_server.commands["UID SEARCH"] == 3
+        assert imap_server.commands["NOOP"] == 0
+
+
+@pytest.mark.parametrize("imap_server", [("IMAP4rev1", "IDLE")], indirect=True)
+def test_new_email_announced_with_the_idle_continuation_is_noticed(imap_server, imap_handler):
+    count_before = imap_handler.count_emails_by_subject("API Key")
+    imap_server.deliver_on_idle = "Your API Key"
+
+    timeout = 10
+    start = time.monotonic()
+    assert imap_handler.wait_for_new_email("API Key", count_before, timeout=timeout)
+    # Already buffered when the continuation is read: it must not wait for the timeout.
+    assert time.monotonic() - start < timeout / 2
+
+
+def test_wait_times_out_without_new_email(imap_handler):
+    assert not imap_handler.wait_for_new_email("API Key", 0, timeout=0.3)
+
+
+def test_dropped_connection_is_reopened(imap_server, imap_handler):
+    count_before = imap_handler.count_emails_by_subject("API Key")
+    threading.Timer(0.1, imap_server.drop_connections).start()
+    _deliver_later(imap_server, "Your API Key", 0.4)
+
+    assert imap_handler.wait_for_new_email("API Key", count_before, timeout=5)
+    assert imap_server.commands["LOGIN"] == 2
+
+
+def test_keepalive_reconnects_before_use(imap_server, imap_handler):
+    imap_server.drop_connections()
+    imap_handler.KEEPALIVE_INTERVAL = 0
+
+    assert imap_handler.count_emails_by_subject("Welcome") == 1
+    assert imap_server.commands["LOGIN"] == 2
+
+
+@pytest.mark.parametrize("imap_server", [("IMAP4rev1",)], indirect=True)
+def test_only_new_messages_are_searched(imap_server, imap_handler):
+    for i in range(50):
+        imap_server.deliver(f"Newsletter {i}")
+    assert imap_handler.count_emails_by_subject("API Key") == 0
+    searched = imap_server.searched
+
+    imap_server.deliver("Your API Key")
+    imap_server.deliver("Another newsletter")
+    assert imap_handler.count_emails_by_subject("API Key") == 1
+    assert imap_handler.count_emails_by_subject("API Key") == 1
+
+    # The second search covers the two new messages, the third only the last one (n:* always matches it).
+    assert imap_server.searched - searched == 3
+
+
+@pytest.mark.parametrize("imap_server", [("IMAP4rev1",)], indirect=True)
+def test_uid_validity_change_resets_the_search(imap_server, imap_handler):
+    imap_server.deliver("Your API Key")
+    assert imap_handler.count_emails_by_subject("API Key") == 1
+
+    imap_server.uid_validity, imap_server.first_uid = 2, 1
+    imap_server.deliver("Your API Key")
+
+    assert imap_handler.count_emails_by_subject("API Key") == 2
+
+
+@pytest.mark.parametrize("imap_server", [("IMAP4rev1",)], indirect=True)
+def test_text_parts_are_fetched_in_chunks(imap_server, imap_handler):
+    html = "<textarea>" + "k" * 500 + "</textarea>"
+    imap_server.deliver("Your API Key", html=html)
+    imap_handler.PARTIAL_FETCH_SIZE = 256
+
+    assert imap_handler.get_last_email_by_subject("API Key") == "Plain version of Your API Key" + html
+    plain_bytes = len(quopri.encodestring(b"Plain version of Your API Key"))
+    assert imap_server.body_bytes == plain_bytes + len(base64.b64encode(html.encode()))
+    # The structure, then one chunk of the plain part and three of the html part.
+    assert imap_server.commands["UID FETCH"] == 1 + 1 + 3
+
+
+def test_text_parts_of_nested_multipart():
+    structure = fetch_item([
+        b'1 (UID 5 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "iso-8859-1") NIL NIL "7BIT" 12 1)'
+        b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 40 2) "ALTERNATIVE" ("BOUNDARY" "a"))'
+        b'("APPLICATION" "PDF" ("NAME" "key.pdf") NIL NIL "BASE64" 3000) "MIXED" ("BOUNDARY" "b")))'
+    ], "BODYSTRUCTURE")
+    plain, html = text_parts(structure)
+
+    assert (plain.section, plain.subtype, plain.charset, plain.encoding, plain.size) == (
+        "1.1", "plain", "iso-8859-1", "7bit", 12
+    )
+    assert (html.section, html.subtype, html.charset, html.encoding, html.size) == (
+        "1.2", "html", "utf-8", "quoted-printable", 40
+    )
+    plain_only = parse_imap_data([b'("TEXT" "PLAIN" NIL NIL NIL "8BIT" 5 1)'])[0]
+    assert [part.section for part in text_parts(plain_only)] == ["1"]
+    assert text_parts(parse_imap_data([b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 5)'])[0]) == []
@@ -0,0 +1,59 @@
+import pytest
+
+from tests.utils.import_time import ROOT, parse_import_times, profile_imports
+
+# What a run of the API tests imports on startup, on top of pytest.
+API_RUN_MODULES = ["tests.conftest", "tests.end_to_end.test_api_key_validation"]
+# What collecting the tool tests imports on top of an API run.
+TOOL_VALIDATION_MODULES = sorted(
+    f"tests.tool_validation.{path.stem}" for path in (ROOT / "tests" / "tool_validation").glob("test_*.py")
+)
+PRELOADED_MODULES = ["pytest", "pytest_html"]
+# Only loaded by the fixtures and tests driving a browser, reading the inbox or asking the tester for input.
+LAZY_MODULES = ["selenium", "tkinter", "imaplib", "setup_env", "tests.utils.imap_handler"]
+# Not even loaded by the tool tests, which test the IMAP client itself but only fake the browser.
+BROWSER_MODULES = ["selenium", "tkinter", "setup_env"]
+# Seconds. About twice the import time on a CI container, well below the ~0.3 s of loading Selenium on startup.
+IMPORT_TIME_BUDGET = 0.25
+
+
+@pytest.fixture(scope="module")
+def api_run_profile():
+    return profile_imports(API_RUN_MODULES, PRELOADED_MODULES)
+
+
+@pytest.fixture(scope="module")
+def tool_validation_profile():
+    return profile_imports(API_RUN_MODULES + TOOL_VALIDATION_MODULES, PRELOADED_MODULES)
+
+
+def test_parse_import_times():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     _json",
+        "import time:       900 |       1020 |   json.decoder",
+        "import time:       300 |       1320 | json",
+        "import time:      1500 |       1500 | tests.conftest",
+    ])
+
+    assert parse_import_times(stderr) == {"json": 0.00132, "tests.conftest": 0.0015}
+
+
+@pytest.mark.parametrize("module", LAZY_MODULES)
+def test_api_runs_do_not_import(api_run_profile, module):
+    assert module not in api_run_profile.loaded
+
+
+def test_api_run_import_time_within_budget(api_run_profile):
+    breakdown = ", ".join(f"{module} {seconds:.3f} s" for module, seconds in api_run_profile.times.items())
+    assert api_run_profile.total <= IMPORT_TIME_BUDGET, f"Imports over budget: {breakdown}."
+
+
+@pytest.mark.parametrize("module", BROWSER_MODULES)
+def test_tool_validation_collection_does_not_import(tool_validation_profile, module):
+    assert module not in tool_validation_profile.loaded
+
+
+def test_tool_validation_import_time_within_budget(tool_validation_profile):
+    breakdown = ", ".join(f"{module} {seconds:.3f} s" for module, seconds in tool_validation_profile.times.items())
+    assert tool_validation_profile.total <= IMPORT_TIME_BUDGET, f"Imports over budget: {breakdown}."
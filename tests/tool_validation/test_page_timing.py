@@ -0,0 +1,67 @@
+import pytest
+
+from tests.utils.page_timing import (
+    PageTiming,
+    budget_violations,
+    format_timings,
+    measure_page,
+    parse_budgets,
+    summarize_timings,
+)
+
+
+def _timing(load, lcp=None):
+    return PageTiming(
+        ttfb=100, dom_content_loaded=load / 2, load=load, fcp=300, lcp=lcp,
+        transfer_size=5000, resources=12, resource_transfer_size=250000,
+    )
+
+
+class _FakeDriver:
+    # Records the page loads and hands out the timing of each in turn.
+
+    def __init__(self, timings):
+        self._timings = iter(timings)
+        self.cdp_commands = []
+        self.loaded = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+    def get(self, url):
+        self.loaded.append(url)
+
+    def execute_script(self, script):
+        return True  # Load event fired.
+
+    def execute_async_script(self, script):
+        return vars(next(self._timings))
+
+
+def test_measure_page_loads_with_the_cache_disabled():
+    driver = _FakeDriver([_timing(1000), _timing(2000)])
+    timings = measure_page(driver, "https://opendata.aemet.es/centrodedescargas/inicio", loads=2)
+
+    assert [timing.load for timing in timings] == [1000, 2000]
+    assert len(driver.loaded) == 2
+    assert driver.cdp_commands[1] == ("Network.setCacheDisabled", {"cacheDisabled": True})
+    assert driver.cdp_commands[-1] == ("Network.setCacheDisabled", {"cacheDisabled": False})
+
+
+def test_summary_and_budgets():
+    timings = [_timing(load, lcp=load) for load in range(1000, 11000, 1000)] + [_timing(500)]
+    summary = summarize_timings(timings)
+
+    assert summary["load"] == {"p50": 5000, "p95": 10000, "p99": 10000}
+    assert summary["lcp"]["p50"] == 5000  # The load without LCP is left out.
+    assert budget_violations(summary, {"ttfb": 200, "load": 8000}) == ["load p95 10000 > 8000"]
+    assert budget_violations(summarize_timings([_timing(1000)]), {"lcp": 1}) == []
+    assert "resource_transfer_size" in format_timings("https://opendata.aemet.es", timings)
+
+
+def test_parse_budgets():
+    assert parse_budgets("ttfb=1500, lcp=4000,") == {"ttfb": 1500.0, "lcp": 4000.0}
+    with pytest.raises(ValueError, match="Invalid page budget"):
+        parse_budgets("cls=0.1")
+    with pytest.raises(ValueError, match="Invalid page budget"):
+        parse_budgets("load")
@@ -0,0 +1,55 @@
+from tests.utils.perf_baseline import PerfBaselineStore, TestRun, compare, format_comparisons
+
+
+def _run(duration, requests=4, outcome="passed", nodeid="test_a[89064]"):
+    return TestRun(
+        nodeid=nodeid,
+        station="89064",
+        starting_date="2020-06-15T00:00:00",
+        interval="6:00:00",
+        outcome=outcome,
+        duration=duration,
+        requests=requests,
+        bytes=1000,
+        wait=0.0,
+    )
+
+
+def test_history_is_a_rolling_window_of_passing_runs(tmp_path):
+    store = PerfBaselineStore(tmp_path / "perf.sqlite", window=3)
+    store.append("run1", "abc", [_run(1.0), _run(9.0, nodeid="test_b")])
+    store.append("run2", "abc", [_run(2.0), _run(50.0, outcome="failed")])
+    store.append("run3", "def", [_run(3.0)])
+    store.append("run4", "def", [_run(4.0)])
+
+    history = PerfBaselineStore(tmp_path / "perf.sqlite", window=3).history("test_a[89064]")
+
+    assert [row["duration"] for row in history] == [4.0, 3.0, 2.0]
+    assert [row["commit_id"] for row in history] == ["def", "def", "abc"]
+    assert history[0]["station"] == "89064" and history[0]["interval"] == "6:00:00"
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    history = [{"duration": d, "requests": 4} for d in (10.0, 10.5, 9.5, 10.2, 9.8)]
+
+    ok = compare(_run(10.6), history)
+    slow = compare(_run(13.0), history)
+    more_requests = compare(_run(10.0, requests=5), history)
+
+    assert not any(c.regressed for c in ok)
+    assert [c.metric for c in slow if c.regressed] == ["duration"]
+    assert [c.metric for c in more_requests if c.regressed] == ["requests"]
+    assert "REGRESSION" in format_comparisons(slow)
+
+
+def test_compare_needs_a_baseline():
+    comparisons = compare(_run(100.0), [{"duration": 1.0, "requests": 4}] * 4)
+
+    assert all(c.limit is None and not c.regressed for c in comparisons)
+    assert "no baseline" in format_comparisons(comparisons)
+
+
+def test_quick_tests_are_not_flagged_on_noise():
+    history = [{"duration": 0.001, "requests": 0}] * 5
+
+    assert not any(c.regressed for c in compare(_run(0.05, requests=0), history))
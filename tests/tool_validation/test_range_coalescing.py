@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import json
+
+from tests.utils.range_coalescing import RangeCoalescer
+from tests.utils.recorder import RecordedResponse
+
+START = datetime(2020, 6, 15)
+INTERVALS = [timedelta(minutes=15), timedelta(minutes=25), timedelta(hours=6), timedelta(days=29)]
+
+
+def _response(body):
+    return RecordedResponse("http://aemet/query", 200, "OK", {}, content=json.dumps(body).encode())
+
+
+class FakeApi:
+    """Every 10 minutes of a datapoint, from START on, except on the first day of July."""
+
+    def __init__(self):
+        self.requests = []
+
+    def fetch_window(self, station, start, end):
+        self.requests.append((station, start, end))
+        datapoints = []
+        t = max(start, START)
+        while t <= end:
+            if t.month != 7 or t.day != 1:
+                datapoints.append({"fhora": f"{t.isoformat()}+0000", "identificacion": station})
+            t += timedelta(minutes=10)
+        if not datapoints:
+            return _response({"estado": 404}), None
+        return _response({"estado": 200, "datos": "http://aemet/datos"}), _response(datapoints)
+
+
+def test_one_request_per_cover_and_exact_slices():
+    api = FakeApi()
+    windows = [(station, START, START + interval) for station in ["a", "b"] for interval in INTERVALS]
+    coalescer = RangeCoalescer(api.fetch_window, windows)
+    assert len(coalescer) == 2
+
+    for station, start, end in windows:
+        query_response, data_response = coalescer.fetch(station, start, end)
+        _, expected_data = FakeApi().fetch_window(station, start, end)
+        assert query_response.json()["estado"] == 200
+        assert data_response.json() == expected_data.json()
+    assert api.requests == [("a", START, START + INTERVALS[-1]), ("b", START, START + INTERVALS[-1])]
+
+
+def test_windows_without_data_and_unplanned_windows():
+    api = FakeApi()
+    gap = (datetime(2020, 7, 1, 1), datetime(2020, 7, 1, 2))
+    coalescer = RangeCoalescer(api.fetch_window, [("a", START, START + INTERVALS[-1]), ("a", *gap)])
+
+    query_response, data_response = coalescer.fetch("a", *gap)
+    assert query_response.json()["estado"] == 404
+    assert data_response is None
+
+    # Not planned, and before any data.
+    query_response, data_response = coalescer.fetch("a", START - timedelta(days=1), START - timedelta(hours=1))
+    assert query_response.json()["estado"] == 404
+    assert len(api.requests) == 2
+
+
+def test_covers_do_not_exceed_max_span():
+    api = FakeApi()
+    windows = [("a", START + timedelta(days=10 * i), START + timedelta(days=10 * i + 15)) for i in range(4)]
+    coalescer = RangeCoalescer(api.fetch_window, windows, max_span=timedelta(days=31))
+    assert len(coalescer) == 2
+    for window in windows:
+        coalescer.fetch(*window)
+    assert all(end - start <= timedelta(days=31) for _, start, end in api.requests)
+
+
+def test_groups_are_planned_when_first_requested():
+    """Only the groups a worker runs are planned, and their covers released once served."""
+    api = FakeApi()
+    groups = {
+        station: [(station, START, START + interval) for interval in INTERVALS] for station in ["a", "b", "c"]
+    }
+    coalescer = RangeCoalescer(api.fetch_window, groups=groups)
+    assert len(coalescer) == 0
+
+    for window in groups["b"]:
+        coalescer.fetch(*window, group="b")
+    assert len(coalescer) == 1
+    assert api.requests == [("b", START, START + INTERVALS[-1])]
+    # Released once every window was served: requested again, the cover is fetched again.
+    coalescer.fetch(*groups["b"][0], group="b")
+    assert len(api.requests) == 2
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from tests.utils.file_lock import FileLock
+from tests.utils.rate_limiter import TokenBucketRateLimiter
+
+
+def test_burst_then_paced(tmp_path):
+    """A full bucket allows a burst, then requests are paced at the refill rate."""
+    limiter = TokenBucketRateLimiter(tmp_path / "buckets.json", capacity=3, refill_rate=20)
+    waits = [limiter.acquire("key") for _ in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] > 0
+
+
+def test_buckets_are_shared_through_the_state_file(tmp_path):
+    """Two limiters on the same file (e.g. two pytest processes) share the budget of each key."""
+    state_file = tmp_path / "buckets.json"
+    TokenBucketRateLimiter(state_file, capacity=1, refill_rate=20).acquire("key")
+    assert TokenBucketRateLimiter(state_file, capacity=1, refill_rate=20).acquire("key") > 0
+    assert TokenBucketRateLimiter(state_file, capacity=1, refill_rate=20).acquire("other key") == 0
+    assert "key" not in state_file.read_text()
+
+
+def test_refill_rate_learnt_from_429(tmp_path):
+    """After a 429, the refill rate drops below the rate observed since the previous one."""
+    limiter = TokenBucketRateLimiter(tmp_path / "buckets.json", capacity=10, refill_rate=100)
+    for _ in range(5):
+        limiter.acquire("key")
+    time.sleep(0.5)
+    limiter.report_limit_reached("key")
+    assert limiter.refill_rate("key") < 5 / 0.5
+
+
+def test_file_lock_shared_between_threads(tmp_path):
+    """A single lock instance serializes the threads using it."""
+    lock = FileLock(tmp_path / "state.lock")
+    counter = tmp_path / "counter"
+    counter.write_text("0")
+
+    def _increment(_):
+        with lock:
+            counter.write_text(str(int(counter.read_text()) + 1))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(_increment, range(200)))
+    assert counter.read_text() == "200"
+
+
+def test_idle_time_does_not_lower_the_learnt_rate(tmp_path, monkeypatch):
+    """A bucket left over by an earlier run starts full, and the rate is only measured over the last window."""
+    state_file = tmp_path / "buckets.json"
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    TokenBucketRateLimiter(state_file, capacity=10, refill_rate=1).acquire("key")
+
+    clock[0] += 86400  # A day later, a new run reaches the cap after 5 requests in 1 s.
+    limiter = TokenBucketRateLimiter(state_file, capacity=10, refill_rate=1)
+    for _ in range(5):
+        limiter.acquire("key")
+    clock[0] += 1
+    limiter.report_limit_reached("key")
+
+    assert limiter.refill_rate("key") == 0.9
+
+
+def test_learnt_rate_is_kept_across_runs(tmp_path, monkeypatch):
+    state_file = tmp_path / "buckets.json"
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    limiter = TokenBucketRateLimiter(state_file, capacity=10, refill_rate=1)
+    for _ in range(5):
+        limiter.acquire("key")
+    clock[0] += 10
+    limiter.report_limit_reached("key")
+    learnt = limiter.refill_rate("key")
+    assert learnt == 0.45
+
+    clock[0] += 86400  # A new run, a day later: the bucket is full again, but paced at the learnt rate.
+    limiter = TokenBucketRateLimiter(state_file, capacity=10, refill_rate=1)
+    assert limiter.refill_rate("key") == learnt
+    assert sum(limiter.acquire("key") for _ in range(10)) == 0
+
+
+def test_refill_rate_recovers_after_successes(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    limiter = TokenBucketRateLimiter(tmp_path / "buckets.json", capacity=100, refill_rate=100, min_refill_rate=1)
+    limiter.acquire("key")
+    clock[0] += 0.5
+    limiter.report_limit_reached("key")
+    lowered = limiter.refill_rate("key")
+    assert lowered == 1.8
+
+    for _ in range(TokenBucketRateLimiter.RECOVERY_STREAK):
+        limiter.report_success("key")
+    assert limiter.refill_rate("key") == lowered * TokenBucketRateLimiter.RECOVERY_FACTOR
+
+    for _ in range(TokenBucketRateLimiter.RECOVERY_STREAK * 30):
+        limiter.report_success("key")
+    assert limiter.refill_rate("key") == 100
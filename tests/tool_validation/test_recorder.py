@@ -0,0 +1,31 @@
+import json
+from types import SimpleNamespace
+
+from tests.utils.recorder import ReplayClient, ResponseStore, request_key
+
+
+def _response(payload, status_code=200):
+    return SimpleNamespace(
+        status_code=status_code,
+        reason="OK",
+        headers={"Content-Type": "application/json;charset=ISO-8859-15", "Date": "today"},
+        content=json.dumps(payload).encode("ISO-8859-15"),
+    )
+
+
+def test_request_key_ignores_api_key_and_parameter_order():
+    url = "https://opendata.aemet.es/opendata/api/antartida/datos"
+    assert request_key(url, {"api_key": "a", "x": 1, "y": 2}) == request_key(url + "?y=2", {"x": "1", "api_key": "b"})
+    assert request_key(url, {"x": 1}) != request_key(url, {"x": 2})
+
+
+def test_replay_serves_recorded_responses(tmp_path):
+    """Recorded responses are served by a new store on the same folder, body and status included."""
+    url = "https://opendata.aemet.es/opendata/api/antartida/datos/estacion/89064"
+    ResponseStore(tmp_path).save(url, {"api_key": "secret"}, _response({"estado": 200, "descripcion": "ÑÑ"}))
+    assert "secret" not in "".join(f.read_text(errors="ignore") for f in tmp_path.iterdir() if f.is_file())
+
+    client = ReplayClient(ResponseStore(tmp_path))
+    response = client.get(url, params={"api_key": "other"})
+    assert response.ok
+    assert response.json() == {"estado": 200, "descripcion": "ÑÑ"}
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from tests.utils.aemet_stub_server import AemetStubServer, SyntheticDataset
+from tests.utils.http_client import PooledHttpClient
+from tests.utils.request_metrics import RequestMetrics, describe_url, format_table, percentile, write_metrics
+from tests.utils.requests_functions import iter_datapoints, request_get_with_exception_handling
+
+
+@pytest.fixture()
+def stub_server():
+    server = AemetStubServer(SyntheticDataset({"fhora", "identificacion", "temp"}), valid_keys={"key"})
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [percentile(values, q) for q in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_describe_url():
+    base = "https://opendata.aemet.es/opendata"
+    assert describe_url(f"{base}/api/antartida/datos/fechaini/a/fechafin/b/estacion/89064") == ("query", "89064")
+    assert describe_url(f"{base}/sh/0a1b2c") == ("datos", None)
+
+
+def test_requests_are_timed_and_summarized(stub_server, tmp_path):
+    client = PooledHttpClient()
+    metrics = RequestMetrics()
+    metrics.current_test = "test_a"
+    url = (
+        f"{stub_server.base_api_url}/antartida/datos/fechaini/2020-06-15T00:00:00UTC/fechafin/2020-06-15T06:00:00UTC"
+        "/estacion/89064"
+    )
+
+    responses = [
+        request_get_with_exception_handling(url, client=client, metrics=metrics, params={"api_key": "key"})
+        for _ in range(3)
+    ]
+    datos = request_get_with_exception_handling(
+        responses[0].json()["datos"], client=client, metrics=metrics, stream=True
+    )
+    n_datapoints = sum(1 for _ in iter_datapoints(datos))
+    client.close()
+
+    records = metrics.for_test("test_a")
+    assert [record.endpoint for record in records] == ["query"] * 3 + ["datos"]
+    assert records[0].timing.connect > 0
+    assert [record.timing.connect for record in records[1:]] == [0, 0, 0]  # Kept alive.
+    assert all(record.status == 200 and record.timing.ttfb > 0 for record in records)
+    # The streamed body is accounted for as it is read.
+    assert n_datapoints == 37
+    assert records[-1].timing.bytes == int(datos.headers["Content-Length"])
+    assert "query" in format_table(records)
+
+    write_metrics(tmp_path / "metrics.json", metrics.rows())
+    summary = json.loads((tmp_path / "metrics.json").read_text())["summary"]
+    assert summary["by_endpoint"]["query"]["requests"] == 3
+    assert summary["by_station"]["89064"]["requests"] == 3
+    assert summary["all"]["elapsed"]["p99"] >= summary["all"]["elapsed"]["p50"] > 0
+    assert len((tmp_path / "metrics.csv").read_text().splitlines()) == 5
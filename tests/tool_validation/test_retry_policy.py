@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+import random
+
+import pytest
+import requests
+
+from tests.utils import retry_policy as retry_policy_module
+from tests.utils.recorder import RecordedResponse
+from tests.utils.requests_functions import classify_response
+from tests.utils.retry_policy import (
+    CONNECT, RATE_LIMITED, READ, SERVER_ERROR, Backoff, RetryPolicy, classify_error, retry_after
+)
+
+
+@pytest.fixture()
+def sleeps(monkeypatch):
+    """Record the delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(retry_policy_module.time, "sleep", delays.append)
+    return delays
+
+
+def _response(status_code, body=b"{}", headers=None):
+    return RecordedResponse("http://aemet", status_code, "", headers or {}, content=body)
+
+
+def _send(responses):
+    responses = iter(responses)
+
+    def _next():
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return _next
+
+
+def test_backoff_is_exponential_with_jitter_and_capped():
+    backoff = Backoff(base=1, cap=8, max_attempts=0)
+    rng = random.Random(0)
+    for attempt in range(6):
+        delays = [backoff.delay(attempt, rng) for _ in range(100)]
+        assert 1 <= min(delays) and max(delays) <= min(2**attempt, 8)
+    assert len(set(delays)) > 1
+
+
+def test_error_classes(sleeps):
+    policy = RetryPolicy(seed=0)
+    responses = [
+        requests.ConnectionError("refused"),
+        _response(503),
+        _response(200, b"not json"),
+        _response(429, b'{"estado": 429}'),
+        _response(200, b'{"estado": 200}'),
+    ]
+    response = policy.run(_send(responses), classify=lambda r: classify_response(r, check_json=True))
+
+    assert response.json() == {"estado": 200}
+    assert dict(policy.stats) == {"connect": 1, "5xx": 1, "malformed json": 1, "429": 1}
+    assert len(sleeps) == 4
+
+
+def test_network_errors_are_transient():
+    assert classify_error(requests.ReadTimeout()) == READ
+    assert classify_error(requests.ConnectTimeout()) == CONNECT
+    assert classify_error(requests.exceptions.TooManyRedirects()) == CONNECT
+    assert classify_error(ConnectionResetError()) == CONNECT
+    assert classify_error(requests.exceptions.MissingSchema()) is None
+    assert classify_error(ValueError()) is None
+
+
+def test_stats_of_concurrent_requests_add_up(sleeps):
+    policy = RetryPolicy({SERVER_ERROR: Backoff(base=0, cap=0, max_attempts=0)}, seed=0)
+
+    def _request(_):
+        return policy.run(_send([_response(503)] * 50 + [_response(200)]), classify=classify_response)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(response.status_code == 200 for response in executor.map(_request, range(40)))
+    assert policy.stats[SERVER_ERROR] == 40 * 50
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    policy = RetryPolicy({SERVER_ERROR: Backoff(base=1, cap=1, max_attempts=2)})
+    response = policy.run(_send([_response(500)] * 5), classify=classify_response)
+    assert response.status_code == 500
+    assert sleeps == [1, 1]
+
+    # Exceptions that are not network errors are bugs: raised as they are, without retrying.
+    with pytest.raises(KeyError, match="estado"):
+        policy.run(_send([KeyError("estado"), _response(200)]))
+    # Network errors that are never resolved fail the test.
+    with pytest.raises(pytest.fail.Exception):
+        policy.run(_send([requests.ConnectionError("refused")] * 6))
+
+
+def test_retry_after_and_wait_hint(sleeps):
+    assert retry_after(_response(429, headers={"Retry-After": "7"})) == 7
+    assert retry_after(_response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+    assert retry_after(_response(429)) is None
+
+    policy = RetryPolicy({RATE_LIMITED: Backoff(base=5, cap=60, max_attempts=0)})
+    responses = [_response(429, headers={"Retry-After": "7"}), _response(429), _response(200)]
+    policy.run(_send(responses), classify=classify_response, wait_hint=lambda: 0.5)
+    assert sleeps == [7, 0.5]
+
+
+def test_deadline(sleeps):
+    policy = RetryPolicy({RATE_LIMITED: Backoff(base=5, cap=60, max_attempts=0)}, test_timeout=2)
+    response = policy.run(_send([_response(429), _response(200)]), classify=classify_response)
+    assert response.status_code == 429
+    assert sleeps == []
+    assert policy.stats["given up"] == 1
+
+    # Once the deadline has passed, not even an immediate retry is attempted.
+    policy = RetryPolicy({RATE_LIMITED: Backoff(base=5, cap=60, max_attempts=0)}, test_timeout=1e-9)
+    responses = [_response(429, headers={"Retry-After": "0"}), _response(200)]
+    assert policy.run(_send(responses), classify=classify_response).status_code == 429
+    assert sleeps == []
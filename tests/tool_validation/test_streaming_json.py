@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from tests.utils.streaming_json import iter_json_array
+
+
+def _chunks(payload: bytes, size: int):
+    return (payload[i:i + size] for i in range(0, len(payload), size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_elements_split_across_chunks(chunk_size):
+    """Elements, numbers and multi-byte characters split between chunks are decoded correctly."""
+    data = [{"nombre": "JUAN CARLOS I ÑÁ", "temp": -12.345, "hr": 100}, {"temp": 1e-3}, 12345, []]
+    payload = json.dumps(data, ensure_ascii=False).encode("ISO-8859-15")
+    assert list(iter_json_array(_chunks(payload, chunk_size), "ISO-8859-15")) == data
+
+
+def test_elements_yielded_before_the_end_of_the_body():
+    chunks = iter([b'[{"a": 1}, ', b'{"a": 2}'])
+    elements = iter_json_array(chunks)
+    assert next(elements) == {"a": 1}
+    with pytest.raises(ValueError, match="truncated"):
+        list(elements)
+
+
+@pytest.mark.parametrize("payload", [b"<html>429 Too Many Requests</html>", b'{"estado": 429}'])
+def test_not_an_array(payload):
+    with pytest.raises(ValueError):
+        list(iter_json_array([payload]))
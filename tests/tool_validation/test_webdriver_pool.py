@@ -0,0 +1,135 @@
+import threading
+import time
+
+from tests.utils.webdriver_pool import BLANK_PAGE, WebDriverPool
+
+
+class _FakeDriver:
+    # Records the calls the pool makes to a webdriver.
+
+    def __init__(self, headless):
+        self.headless = headless
+        self.current_url = "https://opendata.aemet.es/centrodedescargas/inicio"
+        self.window_handles = ["main", "popup"]
+        self.cdp_commands = []
+        self.alive = True
+        self.quit_called = False
+        self.switch_to = self
+
+    def window(self, handle):
+        self.current = handle
+
+    def close(self):
+        self.window_handles.remove(self.current)
+        if not self.window_handles:
+            self.alive = False
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise _invalid_session()
+        return 1
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+    def get(self, url):
+        if not self.alive:
+            raise _invalid_session()
+        self.current_url = url
+
+    def quit(self):
+        self.quit_called = True
+
+
+def _invalid_session():
+    # Selenium is only imported when needed, so that collecting the tool tests does not load it.
+    from selenium.common.exceptions import WebDriverException
+
+    return WebDriverException("invalid session id")
+
+
+def _pool(**kwargs):
+    launched = []
+
+    def _launch(headless):
+        time.sleep(0.05)
+        launched.append(_FakeDriver(headless))
+        return launched[-1]
+
+    return WebDriverPool(_launch, **kwargs), launched
+
+
+def test_browsers_are_prewarmed_and_reused_after_a_reset():
+    pool, launched = _pool()
+    pool.prewarm(headless=True)
+    pool.prewarm(headless=False)
+
+    driver = pool.acquire(headless=True)
+    assert driver.headless and len(launched) == 2
+
+    pool.release(driver)
+    assert pool.acquire(headless=True) is driver
+    assert driver.window_handles == ["main"]
+    assert driver.current_url == BLANK_PAGE
+    assert [command for command, _ in driver.cdp_commands] == [
+        "Storage.clearDataForOrigin", "Network.clearBrowserCookies", "Network.clearBrowserCache"
+    ]
+    assert driver.cdp_commands[0][1]["origin"] == "https://opendata.aemet.es"
+    assert not pool.acquire(headless=False).headless
+    assert len(launched) == 2
+    assert pool.stats == {"launched": 2, "prewarmed": 2, "reused": 1}
+
+
+def test_browsers_are_recycled_after_max_uses():
+    pool, launched = _pool(max_uses=2)
+
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+
+    assert first.quit_called
+    assert pool.acquire() is not first
+    assert pool.stats["recycled"] == 1
+
+
+def test_broken_browsers_are_replaced():
+    pool, launched = _pool()
+    driver = pool.acquire()
+    # E.g. the test closed the only window.
+    driver.window_handles = ["main"]
+    driver.window("main")
+    driver.close()
+
+    pool.release(driver)
+    replacement = pool.acquire()
+
+    assert driver.quit_called
+    assert replacement is not driver and replacement.alive
+    assert len(launched) == 2
+
+
+def test_close_quits_browsers_still_launching():
+    pool, launched = _pool(size=2)
+    pool.prewarm(headless=True)
+    pool.close()
+
+    assert len(launched) == 2 and all(driver.quit_called for driver in launched)
+    pool.prewarm(headless=True)
+    assert len(launched) == 2
+
+
+def test_pool_without_idle_browsers():
+    pool, launched = _pool(size=0)
+    pool.prewarm(headless=True)
+    drivers = []
+    threads = [threading.Thread(target=lambda: drivers.append(pool.acquire())) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for driver in drivers:
+        pool.release(driver)
+
+    assert len(launched) == 3
+    assert all(driver.quit_called for driver in drivers)
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.utils.worker_affinity import affinity_group, worker_group
+
+
+def test_affinity_group():
+    start = datetime(2020, 6, 15)
+    groups = {
+        affinity_group({"station": "89064", "starting_date": start, "interval": interval})
+        for interval in [timedelta(minutes=15), timedelta(days=29)]
+    }
+    assert groups == {"89064_20200615T0000"}
+    assert affinity_group({"station": "89070", "starting_date": start}) != groups.pop()
+    assert affinity_group({"station": "89064"}) is None
+
+
+@pytest.mark.xdist_group("explicit")
+@pytest.mark.parametrize("station,starting_date", [("89064", datetime(2020, 6, 15))])
+def test_explicit_group_wins(request, station, starting_date):
+    assert worker_group(request.node) == "explicit"
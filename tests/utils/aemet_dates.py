@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
+# Offsets applied by the API to the time zone suffix of the requested dates. CET and CEST are fixed offsets, as
+# observed in the time zone consistency tests.
+TIME_ZONE_OFFSETS = {
+    "UTC": timedelta(hours=0),
+    "CET": timedelta(hours=1),
+    "CEST": timedelta(hours=2),
+}
+API_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"  # Followed by the time zone suffix.
+FHORA_FORMAT = "%Y-%m-%dT%H:%M:%S%z"  # Timestamps of the datapoints, always UTC.
+
+
+def to_utc(date: datetime, time_zone: str = "UTC") -> datetime:
+    """Convert a naive date expressed in one of the API time zones to a naive UTC date."""
+    return date - TIME_ZONE_OFFSETS[time_zone]
+
+
+def parse_api_date(date_string: str) -> datetime:
+    """Parse a date as written on the API urls (e.g. `2024-06-15T00:00:00CEST`) into a naive UTC date."""
+    for time_zone in sorted(TIME_ZONE_OFFSETS, key=len, reverse=True):
+        if date_string.endswith(time_zone):
+            return to_utc(datetime.strptime(date_string[:-len(time_zone)], API_DATE_FORMAT), time_zone)
+    raise ValueError(f"Unknown time zone on date {date_string}.")
+
+
+def parse_fhora(fhora: str) -> datetime:
+    """Parse the timestamp of a datapoint into a naive UTC date."""
+    return datetime.strptime(fhora, FHORA_FORMAT).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def format_fhora(date: datetime) -> str:
+    """Format a naive UTC date as a datapoint timestamp."""
+    return date.replace(tzinfo=timezone.utc).strftime(FHORA_FORMAT)
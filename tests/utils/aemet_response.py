@@ -0,0 +1,125 @@
+from functools import cached_property
+import json
+import logging
+from typing import Any, Optional
+
+from tests.utils.retry_policy import MALFORMED_JSON, RATE_LIMITED, SERVER_ERROR
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library decoder is used instead.
+    orjson = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Response classes, on top of the error classes of the retry policy.
+OK = "ok"
+NO_DATA = "no data"
+UNAUTHORIZED = "401"
+
+NO_DATA_DESCRIPTION = "No hay datos que satisfagan esos criterios"
+NO_DATA_BODY = {"descripcion": NO_DATA_DESCRIPTION, "estado": 404}  # Body of a query with no data.
+UTF8_ENCODINGS = {"utf-8", "utf8", "ascii", "us-ascii"}
+
+
+def decode_json(content: bytes, encoding: Optional[str] = None) -> Any:
+    """
+    Decode a JSON body with orjson if installed, or the standard library otherwise. Bodies in an encoding other than
+    UTF-8 (AEMET serves some in ISO-8859-15) are decoded to text first.
+
+    Raises:
+        ValueError: If the body is not valid JSON in the encoding.
+    """
+    if encoding is not None and encoding.lower() not in UTF8_ENCODINGS:
+        try:
+            content = content.decode(encoding)
+        except LookupError as e:
+            raise ValueError(f"Unknown encoding {encoding!r}.") from e
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class AemetResponse:
+    """
+    Response of the AEMET API, or of a `datos` download, whose body is decoded once, on first use.
+
+    Every attribute of the wrapped response is available. `json()` returns the same decoded object on every call, so
+    it must not be modified. The fields of query responses (`estado`, `descripcion`, `datos`) and the class of the
+    response (`kind`) are derived from it without decoding again.
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    @cached_property
+    def _decoded(self) -> tuple[Any, Optional[ValueError]]:
+        try:
+            return decode_json(self._response.content, self._response.encoding), None
+        except ValueError as e:
+            return None, e
+
+    def json(self, **kwargs) -> Any:
+        """
+        The decoded body.
+
+        Raises:
+            ValueError: If the body is not valid JSON.
+        """
+        body, error = self._decoded
+        if error is not None:
+            raise error
+        return body
+
+    def release(self) -> None:
+        """Drop the decoded body, e.g. once a large payload has been converted. It is decoded again if read."""
+        self.__dict__.pop("_decoded", None)
+        self.__dict__.pop("_fields", None)
+
+    @cached_property
+    def _fields(self) -> dict:
+        # Query responses are JSON objects. Downloads are arrays, and error pages are not JSON: they have no fields.
+        body, _ = self._decoded
+        return body if isinstance(body, dict) else {}
+
+    @property
+    def estado(self) -> Optional[int]:
+        return self._fields.get("estado")
+
+    @property
+    def descripcion(self) -> Optional[str]:
+        return self._fields.get("descripcion")
+
+    @property
+    def datos(self) -> Optional[str]:
+        """URL of the data of a successful query."""
+        return self._fields.get("datos")
+
+    @cached_property
+    def kind(self) -> str:
+        """
+        Class of the response: `RATE_LIMITED`, `SERVER_ERROR`, `UNAUTHORIZED`, `MALFORMED_JSON`, `NO_DATA` or `OK`.
+        """
+        _, error = self._decoded
+        if self._response.status_code == 429 or self.estado == 429 or (
+            error is not None and "429 Too Many Requests" in self._response.text
+        ):
+            return RATE_LIMITED
+        if self._response.status_code >= 500:
+            return SERVER_ERROR
+        if self._response.status_code == 401 or self.estado == 401:
+            return UNAUTHORIZED
+        if error is not None:
+            return MALFORMED_JSON
+        if self.estado == 404:
+            return NO_DATA
+        return OK
+
+
+def as_aemet_response(response) -> AemetResponse:
+    """Wrap a response, unless already wrapped, so that its body is only decoded once however often it is read."""
+    return response if isinstance(response, AemetResponse) else AemetResponse(response)
@@ -0,0 +1,283 @@
+"""
+Local stand-in for the AEMET antartida endpoint. It serves the two-step data retrieval (query, then `datos` url) from a
+dataset on disk, with configurable latency and a per-key request cap, so that the request helpers can be exercised and
+tuned without network access or spending real quota.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import math
+from pathlib import Path
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+import uuid
+
+from tests.utils.aemet_dates import format_fhora, parse_api_date, parse_fhora
+from tests.utils.aemet_response import NO_DATA_BODY
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+QUERY_PATH = re.compile(r"^/opendata/api/antartida/datos/fechaini/([^/]+)/fechafin/([^/]+)/estacion/([^/]+)$")
+DATOS_PATH = re.compile(r"^/opendata/sh/([0-9a-f]+)$")
+
+INVALID_KEY_BODY = {"descripcion": "API key invalido", "estado": 401}
+LIMIT_REACHED_BODY = {
+    "descripcion": "Límite de peticiones o caudal por minuto excedido para este usuario. Espere al siguiente minuto.",
+    "estado": 429,
+}
+TOO_MANY_REQUESTS_HTML = "<html><body><h1>429 Too Many Requests</h1>You have sent too many requests.</body></html>"
+
+DATA_TIME_RESOLUTION = timedelta(minutes=10)
+STRING_FIELDS = {"nombre", "identificacion", "fhora"}
+
+# Periods covered by each station on the synthetic dataset, following the station documentation.
+SYNTHETIC_COVERAGE = {
+    "89064": (datetime(1988, 1, 1), datetime(2025, 1, 1)),
+    "89064R": (datetime(2007, 3, 7), datetime(2025, 1, 1)),
+    "89064RA": (datetime(1988, 1, 1), datetime(2007, 3, 7)),
+    "89070": (datetime(1988, 1, 1), datetime(2025, 1, 1)),
+}
+
+
+def latency_sampler(spec: str) -> Callable[[], float]:
+    """
+    Build a function returning latencies in seconds from a distribution spec:
+    `constant:<s>`, `uniform:<min s>,<max s>` or `lognormal:<median s>,<sigma>`.
+    """
+    distribution, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if distribution == "constant":
+        return lambda: values[0] if values else 0.0
+    if distribution == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if distribution == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution {spec}.")
+
+
+class StubDataset:
+    """
+    Datapoints per station, read from `<station>.json` files (lists of datapoints, as served by the API). Each file is
+    loaded on first use and indexed by timestamp.
+    """
+
+    def __init__(self, root: Path):
+        self._root: Path = root
+        self._series: dict[str, tuple[list[datetime], list[dict]]] = {}
+        self._lock = threading.Lock()
+
+    def query(self, station: str, start: datetime, end: datetime) -> list[dict]:
+        with self._lock:
+            if station not in self._series:
+                self._series[station] = self._load(station)
+        times, datapoints = self._series[station]
+        return datapoints[bisect_left(times, start):bisect_right(times, end)]
+
+    def _load(self, station: str) -> tuple[list[datetime], list[dict]]:
+        station_file = self._root / f"{station}.json"
+        if not station_file.is_file():
+            return [], []
+        datapoints = sorted(json.loads(station_file.read_text()), key=lambda d: d["fhora"])
+        return [parse_fhora(d["fhora"]) for d in datapoints], datapoints
+
+
+class SyntheticDataset:
+    """Deterministic 10-minute datapoints with the given fields, generated on the fly for the covered periods."""
+
+    def __init__(self, fields: set[str], coverage: dict[str, tuple[datetime, datetime]] = SYNTHETIC_COVERAGE):
+        self._fields: list[str] = sorted(fields)
+        self._coverage = coverage
+
+    def query(self, station: str, start: datetime, end: datetime) -> list[dict]:
+        if station not in self._coverage:
+            return []
+        first, last = self._coverage[station]
+        start, end = max(start, first), min(end, last)
+        # Align to the 10-minute grid.
+        t = datetime.min + math.ceil((start - datetime.min) / DATA_TIME_RESOLUTION) * DATA_TIME_RESOLUTION
+        datapoints = []
+        while t <= end:
+            datapoints.append(self._datapoint(station, t))
+            t += DATA_TIME_RESOLUTION
+        return datapoints
+
+    def _datapoint(self, station: str, t: datetime) -> dict:
+        seed = t.timestamp() / 600
+        datapoint = {}
+        for i, field in enumerate(self._fields):
+            if field == "fhora":
+                datapoint[field] = format_fhora(t)
+            elif field == "identificacion":
+                datapoint[field] = station
+            elif field in STRING_FIELDS:
+                datapoint[field] = f"ANTARTIDA {station}"
+            else:
+                datapoint[field] = round(math.sin(seed / 144 + i) * 10, 1)
+        return datapoint
+
+
+class AemetStubServer:
+    """
+    HTTP server implementing the antartida endpoint and the `datos` urls it points to.
+
+    Usage:
+        server = AemetStubServer(dataset, valid_keys={"key"}, request_cap=50)
+        server.start()
+        ...  # Requests to server.base_api_url
+        server.stop()
+    """
+
+    def __init__(
+        self,
+        dataset,
+        valid_keys: Optional[set[str]] = None,
+        latency: str = "constant:0",
+        request_cap: int = 0,
+        cap_window: float = 60,
+        datos_fault_rate: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Initialize the AemetStubServer.
+
+        Args:
+            dataset: `StubDataset` or `SyntheticDataset` the data is served from.
+            valid_keys (Optional[set[str]]): API keys accepted. Any key is accepted if None.
+            latency (str): Latency distribution spec added to every response (see `latency_sampler`).
+            request_cap (int): Queries allowed per key and window before answering 429. 0 disables the cap.
+            cap_window (float): Seconds after which the request count of every key resets.
+            datos_fault_rate (float): Probability of answering a `datos` request with `429 Too Many Requests`.
+            host (str): Interface to listen on.
+            port (int): Port to listen on. A free one is picked if 0.
+        """
+        self.dataset = dataset
+        self.valid_keys: Optional[set[str]] = valid_keys
+        self.latency: Callable[[], float] = latency_sampler(latency)
+        self.request_cap: int = request_cap
+        self.cap_window: float = cap_window
+        self.datos_fault_rate: float = datos_fault_rate
+        self.request_counts: dict[str, int] = {"query": 0, "datos": 0, "429": 0}
+        self._windows: dict[str, tuple[float, int]] = {}
+        self._datos: dict[str, tuple[str, datetime, datetime]] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler_class(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_api_url(self) -> str:
+        return f"{self.base_url}/opendata/api"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"AEMET stub server listening at {self.base_url}.")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def limit_reached(self, key: str) -> bool:
+        """Count a query for the key and check whether it exceeds the request cap of the current window."""
+        if not self.request_cap:
+            return False
+        now = time.time()
+        with self._lock:
+            window_start, count = self._windows.get(key, (now, 0))
+            if now - window_start >= self.cap_window:
+                window_start, count = now, 0
+            self._windows[key] = (window_start, count + 1)
+            return count >= self.request_cap
+
+    def register_datos(self, station: str, start: datetime, end: datetime) -> str:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._datos[token] = (station, start, end)
+        return f"{self.base_url}/opendata/sh/{token}"
+
+    def datos(self, token: str) -> Optional[tuple[str, datetime, datetime]]:
+        with self._lock:
+            return self._datos.get(token)
+
+    def count(self, request_type: str) -> None:
+        with self._lock:
+            self.request_counts[request_type] += 1
+
+
+def _handler_class(stub: AemetStubServer):
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, as the real server.
+        # Headers and body are written separately. Without this, delayed ACKs add ~40 ms to every response.
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(max(stub.latency(), 0))
+            parts = urlsplit(self.path)
+            query_match = QUERY_PATH.match(parts.path)
+            datos_match = DATOS_PATH.match(parts.path)
+            if query_match:
+                self._query(*(unquote(g) for g in query_match.groups()), parse_qs(parts.query))
+            elif datos_match:
+                self._datos(datos_match.group(1))
+            else:
+                self._send_json(404, {"descripcion": "Not found", "estado": 404})
+
+        def _query(self, start_string, end_string, station, params):
+            stub.count("query")
+            api_key = params.get("api_key", [""])[0]
+            if stub.valid_keys is not None and api_key not in stub.valid_keys:
+                return self._send_json(401, INVALID_KEY_BODY)
+            if stub.limit_reached(api_key):
+                stub.count("429")
+                return self._send_json(429, LIMIT_REACHED_BODY)
+
+            try:
+                start, end = parse_api_date(start_string), parse_api_date(end_string)
+            except ValueError:
+                return self._send_json(200, NO_DATA_BODY)
+            if start > end or not stub.dataset.query(station, start, end):
+                return self._send_json(200, NO_DATA_BODY)
+
+            datos_url = stub.register_datos(station, start, end)
+            self._send_json(200, {"descripcion": "exito", "estado": 200, "datos": datos_url, "metadatos": datos_url})
+
+        def _datos(self, token):
+            stub.count("datos")
+            if random.random() < stub.datos_fault_rate:
+                stub.count("429")
+                return self._send_json(429, None)
+            query = stub.datos(token)
+            if query is None:
+                return self._send_json(404, NO_DATA_BODY)
+            self._send_json(200, stub.dataset.query(*query))
+
+        def _send_json(self, status, payload):
+            if status == 429 and self.path.startswith("/opendata/sh/"):
+                body, content_type = TOO_MANY_REQUESTS_HTML.encode(), "text/html"
+            else:
+                body, content_type = json.dumps(payload).encode(), "application/json;charset=UTF-8"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return _Handler
@@ -1,19 +1,59 @@
+from collections import deque
+from dataclasses import dataclass, field
 import json
+import os
 from pathlib import Path
+import threading
+import time
 from typing import Optional
 
+from tests.utils.file_lock import FileLock
+
+
+@dataclass
+class KeyHealth:
+    """Health record of a single API key."""
+
+    recent_requests: deque = field(default_factory=deque)  # Timestamps of the requests in the load window.
+    recent_limit_reached: deque = field(default_factory=deque)  # Timestamps of the 429s in the load window.
+    unauthorized_count: int = 0
+    invalid: bool = False
+    parked_until: float = 0.0  # Estimated time at which the request cap resets.
+    cap_reset_estimate: float = 0.0  # Seconds the key is parked for after a 429.
+
+
 class ApiKeyHandler:
-    def __init__(self, key_file: Path, api_key_key: str):
+    """
+    Store the API key(s) used for the data requests.
+
+    A single key is stored under `api_key_key`. Additional keys may be listed under `api_keys_key` to increase the
+    throughput: `next_key` hands out the least loaded usable key, and keys that reach the request cap or turn out to be
+    invalid are parked until they are usable again.
+
+    Thread safe: key selection and the health updates may come from the worker threads of `AsyncRequestEngine`.
+    """
+
+    LOAD_WINDOW = 60  # Seconds over which the load of each key is measured.
+    CAP_RESET_ESTIMATE = 60  # Initial estimate of the seconds until the request cap of a key resets.
+    MAX_CAP_RESET_ESTIMATE = 600
+
+    def __init__(self, key_file: Path, api_key_key: str, api_keys_key: Optional[str] = None):
         """
         Initialize the ApiKeyHandler.
 
         Args:
             key_file (Path): Path to the JSON file containing the API key.
             api_key_key (str): Key in the JSON file that holds the API key.
+            api_keys_key (Optional[str]): Key in the JSON file that holds a list of additional API keys.
         """
         self._key_file: Path = key_file
         self._api_key_key: str = api_key_key
+        self._api_keys_key: Optional[str] = api_keys_key
         self._key: str = self._load_key()
+        self._keys: list[str] = self._load_keys()
+        self._health: dict[str, KeyHealth] = {}
+        self._turn: int = 0
+        self._lock: threading.Lock = threading.Lock()
 
     @property
     def key(self) -> str:
@@ -25,6 +65,16 @@ class ApiKeyHandler:
         """
         return self._key
 
+    @property
+    def keys(self) -> list[str]:
+        """
+        Get every API key in the pool.
+
+        Returns:
+            list[str]: The API keys, main key first.
+        """
+        return list(self._keys)
+
     def read_key(self) -> str:
         """
         Read the API key from the file.
@@ -42,7 +92,142 @@ class ApiKeyHandler:
             key (str): The new API key to store.
         """
         self._save_key(key)
-        self._key: str = key
+        with self._lock:
+            self._key: str = key
+            self._keys = [key] + [k for k in self._keys if k != key]
+            self._health.pop(key, None)
+
+    def add_key(self, key: str) -> None:
+        """
+        Add a key to the pool for this session only. It is not stored on the file.
+
+        Args:
+            key (str): The API key to add.
+        """
+        with self._lock:
+            if key not in self._keys:
+                self._keys.append(key)
+            if not self._key:
+                self._key = key
+
+    def next_key(self) -> Optional[str]:
+        """
+        Pick the key for the next request: the usable key with fewest requests in the load window, taking turns
+        between equally loaded keys. If every key is parked, the one whose cap is expected to reset first is returned.
+
+        Returns:
+            Optional[str]: The API key, or None if there are no keys.
+        """
+        with self._lock:
+            if not self._keys:
+                return None
+
+            now = time.time()
+            candidates = [k for k in self._keys if not self._health_of(k).invalid]
+            if not candidates:
+                # Every key is invalid. Keep using the main one so that the API reports it.
+                return self._keys[0]
+
+            usable = [k for k in candidates if self._health_of(k).parked_until <= now]
+            if not usable:
+                key = min(candidates, key=lambda k: self._health_of(k).parked_until)
+            else:
+                self._turn = (self._turn + 1) % len(usable)
+                rotated = usable[self._turn:] + usable[:self._turn]
+                key = min(rotated, key=lambda k: len(self._trim(self._health_of(k).recent_requests, now)))
+
+            self._health_of(key).recent_requests.append(now)
+            return key
+
+    def health(self, key: str) -> KeyHealth:
+        """
+        Get the health record of a key.
+
+        Args:
+            key (str): The API key.
+
+        Returns:
+            KeyHealth: The health record.
+        """
+        with self._lock:
+            return self._health_of(key)
+
+    def seconds_until_usable(self, key: str) -> float:
+        """
+        Estimated time until the request cap of the key resets.
+
+        Args:
+            key (str): The API key.
+
+        Returns:
+            float: Seconds until the key is expected to accept requests again. 0 if usable now.
+        """
+        with self._lock:
+            return max(self._health_of(key).parked_until - time.time(), 0.0)
+
+    def seconds_until_any_usable(self) -> float:
+        """
+        Estimated time until any valid key of the pool accepts requests.
+
+        Returns:
+            float: Seconds until a key is expected to accept requests again. 0 if one is usable now.
+        """
+        now = time.time()
+        with self._lock:
+            return min(
+                (max(h.parked_until - now, 0.0) for h in map(self._health_of, self._keys) if not h.invalid),
+                default=0.0,
+            )
+
+    def report_success(self, key: str) -> None:
+        """
+        Record a request accepted by the API.
+
+        Args:
+            key (str): The API key used.
+        """
+        with self._lock:
+            health = self._health_of(key)
+            health.cap_reset_estimate = 0.0
+            health.parked_until = 0.0
+
+    def report_limit_reached(self, key: str) -> None:
+        """
+        Park a key that reached the request cap. Consecutive 429s double the estimated time until the cap resets.
+
+        Args:
+            key (str): The API key used.
+        """
+        now = time.time()
+        with self._lock:
+            health = self._health_of(key)
+            health.recent_limit_reached.append(now)
+            self._trim(health.recent_limit_reached, now)
+            health.cap_reset_estimate = min(
+                max(health.cap_reset_estimate * 2, self.CAP_RESET_ESTIMATE), self.MAX_CAP_RESET_ESTIMATE
+            )
+            health.parked_until = now + health.cap_reset_estimate
+
+    def report_unauthorized(self, key: str) -> None:
+        """
+        Park a key rejected as invalid by the API for the rest of the session.
+
+        Args:
+            key (str): The API key used.
+        """
+        with self._lock:
+            health = self._health_of(key)
+            health.unauthorized_count += 1
+            health.invalid = True
+
+    def _health_of(self, key: str) -> KeyHealth:
+        # Callers hold the lock.
+        return self._health.setdefault(key, KeyHealth())
+
+    def _trim(self, timestamps: deque, now: float) -> deque:
+        while timestamps and timestamps[0] < now - self.LOAD_WINDOW:
+            timestamps.popleft()
+        return timestamps
 
     def _load_key(self) -> Optional[str]:
         """
@@ -53,11 +238,29 @@ class ApiKeyHandler:
         """
         if not self._key_file.is_file():
             return None
-        
+
         with open(self._key_file, "r") as file:
             data = json.load(file)
             return data.get(self._api_key_key)
 
+    def _load_keys(self) -> list[str]:
+        """
+        Load the main API key and the additional ones from the file.
+
+        Returns:
+            list[str]: The API keys, main key first and without duplicates.
+        """
+        keys = [self._key] if self._key else []
+        if self._api_keys_key is None or not self._key_file.is_file():
+            return keys
+
+        with open(self._key_file, "r") as file:
+            data = json.load(file)
+        for key in data.get(self._api_keys_key, []):
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
     def _save_key(self, key: str) -> None:
         """
         Save the API key to the file.
@@ -65,14 +268,18 @@ class ApiKeyHandler:
         Args:
             key (str): The API key to save.
         """
-        data = {}
-        if self._key_file.exists():
-            try:
-                with open(self._key_file, "r") as file:
-                    data = json.load(file)
-            except json.JSONDecodeError:
-                pass  # If the file is corrupted, overwrite it
-
-        data[self._api_key_key] = key
-        with open(self._key_file, "w") as file:
-            json.dump(data, file, indent=4)
\ No newline at end of file
+        # Other processes (e.g. pytest-xdist workers) may be reading or updating the file at the same time.
+        with FileLock(self._key_file.with_suffix(".lock")):
+            data = {}
+            if self._key_file.exists():
+                try:
+                    with open(self._key_file, "r") as file:
+                        data = json.load(file)
+                except json.JSONDecodeError:
+                    pass  # If the file is corrupted, overwrite it
+
+            data[self._api_key_key] = key
+            temporary_file = self._key_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(temporary_file, "w") as file:
+                json.dump(data, file, indent=4)
+            os.replace(temporary_file, self._key_file)
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# (station, start date, end date, time zone)
+BatchItem = tuple[str, datetime, datetime, str]
+
+
+class AsyncRequestEngine:
+    """
+    Issue the two-step AEMET data retrieval (query, then `datos` download) for several requests concurrently.
+
+    The request functions themselves are the blocking helpers used by the tests (retries and rate limit handling
+    included). Each of them is run on a worker thread, so the waits of one item do not block the others.
+    """
+
+    def __init__(
+        self,
+        query_function: Callable[[str, datetime, datetime, str], Any],
+        data_function: Callable[[Any, str, datetime, datetime, str], Any],
+        concurrency: int = 4,
+    ):
+        """
+        Initialize the AsyncRequestEngine.
+
+        Args:
+            query_function (Callable): Blocking function taking (station, start, end, time zone) that returns the
+                response to the data query.
+            data_function (Callable): Blocking function taking the query response and (station, start, end, time
+                zone) that downloads the data the query points to.
+            concurrency (int): Maximum number of requests in flight at any time.
+        """
+        self._query_function = query_function
+        self._data_function = data_function
+        self._concurrency: int = max(concurrency, 1)
+
+    def fetch_batch(self, items: list[BatchItem]) -> list[tuple[Any, Optional[Any]]]:
+        """
+        Retrieve the data for every item.
+
+        Args:
+            items (list[BatchItem]): Requests to make, as (station, start, end, time zone) tuples.
+
+        Returns:
+            list[tuple[Any, Optional[Any]]]: A (query response, data response) pair per item, in the same order as
+                the input. The data response is None when the query did not point to any data.
+        """
+        return asyncio.run(self._fetch_all(items))
+
+    async def _fetch_all(self, items: list[BatchItem]) -> list[tuple[Any, Optional[Any]]]:
+        semaphore = asyncio.Semaphore(self._concurrency)
+        return await asyncio.gather(*(self._fetch_one(semaphore, item) for item in items))
+
+    async def _fetch_one(self, semaphore: asyncio.Semaphore, item: BatchItem) -> tuple[Any, Optional[Any]]:
+        async with semaphore:
+            query_response = await asyncio.to_thread(self._query_function, *item)
+        if _datos_url(query_response) is None:
+            return query_response, None
+
+        async with semaphore:
+            data_response = await asyncio.to_thread(self._data_function, query_response, *item)
+        return query_response, data_response
+
+
+def _datos_url(query_response) -> Optional[str]:
+    if not query_response.ok:
+        return None
+    try:
+        return query_response.json().get("datos")
+    except Exception:
+        return None
@@ -0,0 +1,151 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import json
+import logging
+from pathlib import Path
+import time
+from typing import Any, Callable, Optional
+
+import pytest
+
+from tests.utils.request_metrics import PERCENTILES, percentile
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Throughput gain below which adding concurrency is considered not to pay off any more.
+SCALING_GAIN_THRESHOLD = 0.10
+
+
+@dataclass
+class BenchmarkResult:
+    """Latency and throughput of one benchmark run: a station, an interval length and a concurrency level."""
+
+    station: str
+    interval: float  # Seconds of data requested per operation.
+    concurrency: int
+    wall_time: float = 0.0  # Seconds from the first operation started to the last one finished.
+    errors: int = 0  # Operations that failed or did not return data.
+    bytes: int = 0  # Bytes of data downloaded by the successful operations.
+    latencies: list[float] = field(default_factory=list)  # Seconds of each successful operation.
+
+    @property
+    def throughput(self) -> float:
+        """Successful operations per second."""
+        return len(self.latencies) / self.wall_time if self.wall_time else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "station": self.station,
+            "interval": self.interval,
+            "concurrency": self.concurrency,
+            "operations": len(self.latencies) + self.errors,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "wall_time": self.wall_time,
+            "throughput": self.throughput,
+            "latency": {f"p{q}": percentile(self.latencies, q) for q in PERCENTILES},
+        }
+
+
+def run_benchmark(
+    operation: Callable[[int], Optional[int]],
+    operations: int,
+    concurrency: int,
+    station: str,
+    interval: float,
+) -> BenchmarkResult:
+    """
+    Closed-loop benchmark: `concurrency` clients run operations back to back until `operations` have been run.
+
+    Args:
+        operation (Callable): Blocking function taking the index of the operation and returning the bytes downloaded,
+            or None if it failed. Exceptions are counted as failures.
+        operations (int): Total number of operations.
+        concurrency (int): Operations in flight at any time.
+        station (str): Station benchmarked, for the result.
+        interval (float): Seconds of data requested per operation, for the result.
+
+    Returns:
+        BenchmarkResult: Latencies of the successful operations, errors, bytes and wall time.
+    """
+    result = BenchmarkResult(station=station, interval=interval, concurrency=concurrency)
+
+    def _timed(i):
+        start = time.perf_counter()
+        try:
+            downloaded = operation(i)
+        except (Exception, pytest.fail.Exception) as e:
+            logger.error(f"Benchmark operation {i} failed: {str(e)}")
+            downloaded = None
+        return time.perf_counter() - start, downloaded
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(_timed, range(operations)))
+    result.wall_time = time.perf_counter() - start
+
+    for latency, downloaded in outcomes:
+        if downloaded is None:
+            result.errors += 1
+        else:
+            result.latencies.append(latency)
+            result.bytes += downloaded
+    return result
+
+
+def throughput_curves(results: list[BenchmarkResult]) -> dict[str, dict[str, Any]]:
+    """
+    Throughput and latency against concurrency, for each station and interval length.
+
+    The scaling limit of a curve is the lowest concurrency from which the next level measured adds less than
+    `SCALING_GAIN_THRESHOLD` throughput, or None if throughput keeps growing over the levels measured.
+
+    Returns:
+        dict[str, dict[str, Any]]: Curves, by "<station>/<interval seconds>".
+    """
+    by_series: dict[tuple[str, float], list[BenchmarkResult]] = {}
+    for result in results:
+        by_series.setdefault((result.station, result.interval), []).append(result)
+
+    curves = {}
+    for (station, interval), series in sorted(by_series.items()):
+        series = sorted(series, key=lambda r: r.concurrency)
+        scaling_limit = None
+        for previous, current in zip(series, series[1:]):
+            if current.throughput < previous.throughput * (1 + SCALING_GAIN_THRESHOLD):
+                scaling_limit = previous.concurrency
+                break
+        curves[f"{station}/{interval:g}"] = {
+            "station": station,
+            "interval": interval,
+            "concurrency": [r.concurrency for r in series],
+            "throughput": [r.throughput for r in series],
+            **{f"latency_p{q}": [percentile(r.latencies, q) for r in series] for q in PERCENTILES},
+            "scaling_limit": scaling_limit,
+        }
+    return curves
+
+
+def write_benchmark(path: Path, results: list[BenchmarkResult], base_url: str) -> None:
+    """Write every result and the throughput curves to `path` as JSON."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(
+        {
+            "base_url": base_url,
+            "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "results": [result.as_dict() for result in results],
+            "curves": throughput_curves(results),
+        },
+        indent=2,
+    ))
+
+
+def format_result(result: BenchmarkResult) -> str:
+    """One-line summary of a result, for the test report. Times in seconds."""
+    latency = ", ".join(f"p{q} {percentile(result.latencies, q) or 0:.3f}" for q in PERCENTILES)
+    return (
+        f"{len(result.latencies)} operations in {result.wall_time:.2f} s at concurrency {result.concurrency}: "
+        f"{result.throughput:.2f} op/s, latency {latency}, {result.errors} errors, {result.bytes / 2**20:.2f} MB."
+    )
@@ -0,0 +1,164 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+import json
+import logging
+from operator import itemgetter
+import os
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from tests.utils.aemet_dates import parse_fhora
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Longest window a single query of the antartida endpoint answers.
+MAX_WINDOW = timedelta(days=30)
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+def split_windows(start: datetime, end: datetime, window: timedelta = MAX_WINDOW) -> list[tuple[datetime, datetime]]:
+    """Split a date range into consecutive windows of at most `window`. Each window starts where the previous ends."""
+    windows = []
+    while start < end:
+        windows.append((start, min(start + window, end)))
+        start = windows[-1][1]
+    return windows
+
+
+@dataclass
+class Checkpoint:
+    """Progress of a download: the windows written to the output so far, and where the output ended after them."""
+
+    station: str
+    start: str
+    end: str
+    window_seconds: float
+    windows_done: int = 0
+    output_bytes: int = 0
+    datapoints: int = 0
+    last_fhora: Optional[str] = None  # Latest timestamp written. Earlier or repeated datapoints are dropped.
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Checkpoint"]:
+        if not path.exists():
+            return None
+        return cls(**json.loads(path.read_text()))
+
+    def save(self, path: Path) -> None:
+        # Written to a temporary file first, so that an interruption never leaves a truncated checkpoint behind.
+        temporary_file = path.with_suffix(path.suffix + ".tmp")
+        temporary_file.write_text(json.dumps(asdict(self)))
+        os.replace(temporary_file, path)
+
+
+@dataclass
+class DownloadResult:
+    station: str
+    output: Path
+    windows: int
+    windows_resumed: int  # Windows already written by an earlier, interrupted, download.
+    datapoints: int
+    bytes: int
+
+    def summary(self) -> str:
+        return (
+            f"{self.station}: {self.datapoints} datapoints ({self.bytes} bytes) from {self.windows} windows written to "
+            f"{self.output}, {self.windows_resumed} of them by an earlier run."
+        )
+
+
+class BulkDownloader:
+    """
+    Download the data of a station over an arbitrary date range, one API-sized window per query.
+
+    Windows are fetched concurrently, up to `concurrency` ahead of the last one written, and written in order as JSON
+    lines, one datapoint each, sorted by timestamp. After each window the output is flushed and a checkpoint saved
+    next to it. A download interrupted at any point resumes from the first window not covered by the checkpoint,
+    dropping whatever was written after it.
+    """
+
+    def __init__(
+        self,
+        fetch_window: Callable[[str, datetime, datetime], list[dict[str, Any]]],
+        window: timedelta = MAX_WINDOW,
+        concurrency: int = 4,
+    ):
+        """
+        Initialize the BulkDownloader.
+
+        Args:
+            fetch_window (Callable): Blocking function taking (station, start, end) in UTC that returns the
+                datapoints of the window, empty if there are none. It raises if the window cannot be downloaded (its
+                own retries and rate limit handling exhausted), which stops the download at the previous window.
+            window (timedelta): Length of each window queried.
+            concurrency (int): Maximum number of windows being fetched at any time.
+        """
+        self._fetch_window = fetch_window
+        self._window: timedelta = window
+        self._concurrency: int = max(concurrency, 1)
+
+    def download(self, station: str, start: datetime, end: datetime, output: Path) -> DownloadResult:
+        """
+        Download the data of the station from `start` to `end` (naive UTC) to the output file, resuming an earlier
+        download of the same range into that file if there is one.
+
+        Raises:
+            ValueError: If the output file has a checkpoint for a different download, or has data but no checkpoint.
+        """
+        windows = split_windows(start, end, self._window)
+        checkpoint_file = output.with_suffix(output.suffix + CHECKPOINT_SUFFIX)
+        fresh = Checkpoint(station, start.isoformat(), end.isoformat(), self._window.total_seconds())
+        has_data = output.exists() and output.stat().st_size > 0
+        checkpoint = Checkpoint.load(checkpoint_file) if output.exists() else None
+        if checkpoint is None and has_data:
+            # Resuming would truncate the output to nothing.
+            raise ValueError(f"{output} has no checkpoint to resume from. Remove it to start over.")
+        if checkpoint is None:
+            checkpoint = fresh
+        elif (checkpoint.station, checkpoint.start, checkpoint.end, checkpoint.window_seconds) != (
+            fresh.station, fresh.start, fresh.end, fresh.window_seconds
+        ):
+            raise ValueError(f"{output} holds a different download. Remove it and {checkpoint_file} to start over.")
+        resumed = checkpoint.windows_done
+        if resumed:
+            logger.info(f"Resuming the download of {station} at window {resumed + 1} of {len(windows)}.")
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        # Saved before anything is written, so that the output never has data without a checkpoint.
+        checkpoint.save(checkpoint_file)
+        with open(output, "ab") as file, ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            # Drop what an interrupted run wrote past its last checkpoint.
+            file.truncate(checkpoint.output_bytes)
+            pending: dict[int, Future] = {}
+            try:
+                for i in range(resumed, len(windows)):
+                    for j in range(i + len(pending), min(i + self._concurrency, len(windows))):
+                        pending[j] = executor.submit(self._fetch_window, station, *windows[j])
+                    datapoints = pending.pop(i).result()
+                    self._write(file, datapoints, checkpoint)
+                    checkpoint.windows_done = i + 1
+                    checkpoint.save(checkpoint_file)
+            finally:
+                for future in pending.values():
+                    future.cancel()
+
+        logger.info(f"Downloaded {checkpoint.datapoints} datapoints of {station} to {output}.")
+        return DownloadResult(
+            station, output, len(windows), resumed, checkpoint.datapoints, checkpoint.output_bytes
+        )
+
+    @staticmethod
+    def _write(file, datapoints: list[dict[str, Any]], checkpoint: Checkpoint) -> None:
+        last = parse_fhora(checkpoint.last_fhora) if checkpoint.last_fhora else None
+        for timestamp, datapoint in sorted(((parse_fhora(d["fhora"]), d) for d in datapoints), key=itemgetter(0)):
+            # Consecutive windows share their boundary, so its datapoint may be returned twice.
+            if last is not None and timestamp <= last:
+                continue
+            file.write(json.dumps(datapoint, ensure_ascii=False).encode() + b"\n")
+            checkpoint.datapoints += 1
+            checkpoint.last_fhora, last = datapoint["fhora"], timestamp
+        file.flush()
+        os.fsync(file.fileno())
+        checkpoint.output_bytes = file.tell()
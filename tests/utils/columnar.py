@@ -0,0 +1,124 @@
+from array import array
+from datetime import datetime, timezone
+import math
+import sys
+from typing import Any, Iterable
+
+TIME_FIELD = "fhora"
+MISSING = math.nan  # Numeric value used for missing or non numeric entries.
+
+
+class DatapointColumns:
+    """
+    Columnar representation of a `datos` payload, built in a single pass over the datapoints (a decoded list or a
+    stream, see `iter_datapoints`).
+
+    - Numeric fields are stored as `array("d")` columns. Missing and non numeric entries are NaN.
+    - String fields (e.g. `nombre`, `identificacion`) are dictionary-encoded: an `array("I")` of codes per column, and
+      the list of distinct values.
+    - `fhora` is stored as an `array("q")` of UTC epoch seconds. The UTC offsets it was written with are counted in
+      `offsets`, since the epochs alone do not tell `+0000` from the same instant written in another time zone.
+
+    Memory footprint: 8 bytes per numeric value, 4 bytes per string value and 8 bytes per timestamp, plus the distinct
+    strings once per column. For the 40 fields of the antartida endpoint that is roughly 310 bytes per datapoint,
+    against about 2 kB for the equivalent dictionary. See `nbytes`.
+    """
+
+    def __init__(self):
+        self.length: int = 0
+        self.numeric: dict[str, array] = {}
+        self.codes: dict[str, array] = {}
+        self.categories: dict[str, list[str]] = {}
+        self.fhora: array = array("q")
+        self.present: dict[str, int] = {}  # Number of datapoints holding each field.
+        self.invalid: dict[str, int] = {}  # Number of entries not matching the type of their column.
+        self.offsets: dict[str, int] = {}  # Number of timestamps written with each UTC offset (e.g. `+0000`).
+        self._category_codes: dict[str, dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    @classmethod
+    def from_datapoints(cls, datapoints: Iterable[dict[str, Any]]) -> "DatapointColumns":
+        columns = cls()
+        for datapoint in datapoints:
+            columns.append(datapoint)
+        return columns
+
+    @property
+    def fields(self) -> set[str]:
+        """Every field found on any datapoint."""
+        return set(self.present)
+
+    def append(self, datapoint: dict[str, Any]) -> None:
+        for field, value in datapoint.items():
+            if field not in self.present:
+                self._add_column(field, value)
+            self.present[field] += 1
+
+        for field, column in self.numeric.items():
+            value = datapoint.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                column.append(value)
+            else:
+                self._count_invalid(field, value)
+                column.append(MISSING)
+
+        for field, codes in self.codes.items():
+            value = datapoint.get(field)
+            if not isinstance(value, str):
+                self._count_invalid(field, value)
+                value = ""
+            category_codes = self._category_codes[field]
+            if value not in category_codes:
+                category_codes[value] = len(self.categories[field])
+                self.categories[field].append(value)
+            codes.append(category_codes[value])
+
+        fhora = datapoint.get(TIME_FIELD)
+        try:
+            timestamp = datetime.fromisoformat(fhora)
+            self.fhora.append(int(timestamp.timestamp()))
+            offset = timestamp.strftime("%z")
+            self.offsets[offset] = self.offsets.get(offset, 0) + 1
+        except (TypeError, ValueError):
+            self._count_invalid(TIME_FIELD, fhora)
+            self.fhora.append(0)  # Missing timestamps are stored as the epoch.
+
+        self.length += 1
+
+    def strings(self, field: str) -> list[str]:
+        """Decode a dictionary-encoded column."""
+        categories = self.categories[field]
+        return [categories[code] for code in self.codes[field]]
+
+    def times(self) -> list[datetime]:
+        """Decode the `fhora` column into naive UTC dates."""
+        return [datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None) for t in self.fhora]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the column data."""
+        size = self.fhora.itemsize * len(self.fhora)
+        size += sum(column.itemsize * len(column) for column in self.numeric.values())
+        size += sum(column.itemsize * len(column) for column in self.codes.values())
+        size += sum(sys.getsizeof(value) for values in self.categories.values() for value in values)
+        return size
+
+    def _add_column(self, field: str, value: Any) -> None:
+        # The column type is given by the first value found. Datapoints seen before did not hold this field.
+        self.present[field] = 0
+        self.invalid[field] = 0
+        if field == TIME_FIELD:
+            return
+        if isinstance(value, str):
+            self.codes[field] = array("I", [0] * self.length)
+            self.categories[field] = [""]
+            self._category_codes[field] = {"": 0}
+        else:
+            self.numeric[field] = array("d", [MISSING] * self.length)
+
+    def _count_invalid(self, field: str, value: Any) -> None:
+        # Missing entries (absent or null) are not type mismatches.
+        if value is not None:
+            self.invalid[field] = self.invalid.get(field, 0) + 1
@@ -0,0 +1,79 @@
+from typing import Any, Iterable
+
+NUMERIC_TYPES = frozenset({int, float})
+STRING_TYPES = frozenset({str})
+
+
+class DatapointValidator:
+    """
+    Schema validator for the datapoints of a `datos` payload, built once from the expected fields.
+
+    The expected key set is a frozenset, compared against each datapoint's keys in a single operation, and the allowed
+    value types are precomputed per field, so that checking a value is one dictionary lookup. This is cheap enough to
+    validate every datapoint of a payload rather than a sample.
+    """
+
+    def __init__(self, fields: set[str], string_fields: set[str], nullable: bool = True):
+        """
+        Initialize the DatapointValidator.
+
+        Args:
+            fields (set[str]): Fields every datapoint must hold, and no other.
+            string_fields (set[str]): Fields holding strings. Every other field holds numbers.
+            nullable (bool): Whether null values are accepted on any field.
+        """
+        self._fields: frozenset[str] = frozenset(fields)
+        null_types = frozenset({type(None)}) if nullable else frozenset()
+        self._type_table: tuple[tuple[str, frozenset[type]], ...] = tuple(
+            (field, (STRING_TYPES if field in string_fields else NUMERIC_TYPES) | null_types)
+            for field in sorted(fields)
+        )
+
+    def errors(self, datapoint: dict[str, Any]) -> list[str]:
+        """
+        Check a single datapoint.
+
+        Returns:
+            list[str]: Description of every problem found. Empty if the datapoint is valid.
+        """
+        if not isinstance(datapoint, dict):
+            return [f"not an object: {type(datapoint).__name__}"]
+
+        errors = []
+        if datapoint.keys() != self._fields:
+            keys = datapoint.keys()
+            missing = self._fields - keys
+            unexpected = keys - self._fields
+            if missing:
+                errors.append(f"missing fields {sorted(missing)}")
+            if unexpected:
+                errors.append(f"unexpected fields {sorted(unexpected)}")
+
+        for field, allowed_types in self._type_table:
+            value = datapoint.get(field)
+            if type(value) not in allowed_types and field in datapoint:
+                errors.append(f"{field}={value!r} is {type(value).__name__}")
+        return errors
+
+    def validate(self, datapoints: Iterable[dict[str, Any]]) -> dict[int, list[str]]:
+        """
+        Check every datapoint.
+
+        Returns:
+            dict[int, list[str]]: Problems found, by index of the offending datapoint. Empty if every one is valid.
+        """
+        offending = {}
+        for i, datapoint in enumerate(datapoints):
+            errors = self.errors(datapoint)
+            if errors:
+                offending[i] = errors
+        return offending
+
+
+def format_offending(offending: dict[int, list[str]], limit: int = 10) -> str:
+    """Summarize the output of `DatapointValidator.validate` for a failure message."""
+    lines = [f"{len(offending)} invalid datapoints."]
+    lines += [f"  [{i}] {'; '.join(errors)}" for i, errors in list(offending.items())[:limit]]
+    if len(offending) > limit:
+        lines.append(f"  ... and {len(offending) - limit} more. Offending indexes: {sorted(offending)}")
+    return "\n".join(lines)
@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import time
+from typing import Optional
+import zlib
+
+from tests.utils.file_lock import FileLock
+from tests.utils.recorder import RecordedResponse
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+INDEX_FILE_NAME = "index.json"
+
+
+class DatosCache:
+    """
+    Content-addressed on-disk cache for `datos` payloads, keyed by data source, station and UTC window.
+
+    Payloads are stored compressed, one file each. The index (sizes and last access times) is shared by every pytest
+    process through a file lock, and the least recently used payloads are evicted once the total size exceeds the cap.
+    Only windows older than `min_age` are cached, since recent data may still be updated by AEMET.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, min_age: timedelta = timedelta(days=365)):
+        """
+        Initialize the DatosCache.
+
+        Args:
+            root (Path): Folder holding the index and the compressed payloads.
+            max_bytes (int): Maximum total size of the compressed payloads.
+            min_age (timedelta): Minimum age of the end of a window for its payload to be cached.
+        """
+        self._root: Path = root
+        self._index_file: Path = root / INDEX_FILE_NAME
+        self._lock: FileLock = FileLock(self._index_file.with_suffix(".lock"))
+        self._max_bytes: int = max_bytes
+        self._min_age: timedelta = min_age
+        self.stats: dict[str, int] = {"hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+
+    def cacheable(self, end_date: datetime) -> bool:
+        return end_date < datetime.now(timezone.utc).replace(tzinfo=None) - self._min_age
+
+    def get(self, source: str, station: str, start: datetime, end: datetime) -> Optional[RecordedResponse]:
+        """
+        Get the cached payload of a window.
+
+        Args:
+            source (str): Host and port of the API the data comes from.
+            station (str): Station identifier.
+            start (datetime): Naive UTC start of the window.
+            end (datetime): Naive UTC end of the window.
+
+        Returns:
+            Optional[RecordedResponse]: The payload as a response, or None if not cached.
+        """
+        key = _cache_key(source, station, start, end)
+        compressed = None
+        # Read while holding the lock, so that another process cannot evict the payload in the meantime.
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if entry is not None:
+                try:
+                    compressed = (self._root / f"{key}.z").read_bytes()
+                except FileNotFoundError:
+                    pass  # Deleted from disk but still on the index: a miss.
+                else:
+                    entry["last_access"] = time.time()
+                    self._write_index(index)
+
+        if compressed is None:
+            self.stats["misses"] += 1
+            return None
+
+        content = zlib.decompress(compressed)
+        self.stats["hits"] += 1
+        self.stats["bytes_saved"] += len(content)
+        return RecordedResponse(
+            url=entry["url"], status_code=200, reason="OK", headers=entry["headers"], content=content
+        )
+
+    def put(self, source: str, station: str, start: datetime, end: datetime, response) -> None:
+        """
+        Store the payload of a window, evicting the least recently used ones if the size cap is exceeded.
+
+        Args:
+            source (str): Host and port of the API the data comes from.
+            station (str): Station identifier.
+            start (datetime): Naive UTC start of the window.
+            end (datetime): Naive UTC end of the window.
+            response: The `datos` response received.
+        """
+        self._store(_cache_key(source, station, start, end), zlib.compress(response.content, level=6), response)
+
+    def tee(self, source: str, station: str, start: datetime, end: datetime, response) -> "CachingResponse":
+        """
+        Wrap a streamed `datos` response so that its payload is stored once the body has been read completely.
+
+        Args:
+            source (str): Host and port of the API the data comes from.
+            station (str): Station identifier.
+            start (datetime): Naive UTC start of the window.
+            end (datetime): Naive UTC end of the window.
+            response: The `datos` response, requested with `stream=True`.
+
+        Returns:
+            CachingResponse: The wrapped response.
+        """
+        return CachingResponse(self, _cache_key(source, station, start, end), response)
+
+    def _store(self, key: str, compressed: bytes, response) -> None:
+        if len(compressed) > self._max_bytes:
+            return
+
+        self._root.mkdir(parents=True, exist_ok=True)
+        # Replace atomically, so that concurrent readers never see a partially written payload.
+        temporary_file = self._root / f"{key}.{os.getpid()}.{id(compressed)}.tmp"
+        temporary_file.write_bytes(compressed)
+        os.replace(temporary_file, self._root / f"{key}.z")
+        with self._lock:
+            index = self._load_index()
+            index[key] = {
+                "url": response.url,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() == "content-type"},
+                "size": len(compressed),
+                "last_access": time.time(),
+            }
+            self._evict(index)
+            self._write_index(index)
+
+    def _evict(self, index: dict[str, dict]) -> None:
+        total = sum(entry["size"] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]["last_access"]):
+            if total <= self._max_bytes:
+                break
+            total -= index.pop(key)["size"]
+            (self._root / f"{key}.z").unlink(missing_ok=True)
+            self.stats["evictions"] += 1
+
+    def _load_index(self) -> dict[str, dict]:
+        if not self._index_file.is_file():
+            return {}
+        try:
+            return json.loads(self._index_file.read_text())
+        except json.JSONDecodeError:
+            return {}  # If the file is corrupted, start over
+
+    def _write_index(self, index: dict[str, dict]) -> None:
+        self._index_file.write_text(json.dumps(index))
+
+
+class CachingResponse:
+    """
+    Streamed response whose chunks are compressed as they are read. The payload is stored in the cache only if the
+    body is read to the end.
+    """
+
+    def __init__(self, cache: DatosCache, key: str, response):
+        self._cache: DatosCache = cache
+        self._key: str = key
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, chunk_size: int = 2**16):
+        compressor = zlib.compressobj(level=6)
+        compressed = []
+        for chunk in self._response.iter_content(chunk_size):
+            compressed.append(compressor.compress(chunk))
+            yield chunk
+        compressed.append(compressor.flush())
+        self._cache._store(self._key, b"".join(compressed), self._response)
+
+
+def _cache_key(source: str, station: str, start: datetime, end: datetime) -> str:
+    return hashlib.sha256(f"{source}|{station}|{start.isoformat()}|{end.isoformat()}".encode()).hexdigest()
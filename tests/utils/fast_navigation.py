@@ -0,0 +1,75 @@
+import logging
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+
+# conftest.py reads the constants on every run, so Selenium is only imported by the functions driving a browser.
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+    from selenium.webdriver.remote.webelement import WebElement
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Seconds to wait for elements to show up. Same as the implicit wait used otherwise.
+ELEMENT_TIMEOUT = 10
+
+# URL patterns of each resource type that can be blocked. Chrome blocks by URL pattern, not by resource type, when
+# driven through webdriver, so types are matched by file extension.
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.svg*", "*.webp*", "*.ico*", "*.bmp*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.ogg*", "*.mp3*", "*.wav*"],
+    "stylesheet": ["*.css*"],
+    "script": ["*.js*"],
+}
+DEFAULT_BLOCKED_TYPES = "image,font,media"
+DEFAULT_BLOCKED_URLS = "*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,*hotjar.com*"
+
+
+def blocked_url_patterns(resource_types: Iterable[str], url_patterns: Iterable[str]) -> list[str]:
+    """
+    URL patterns to block for the given resource types and extra patterns (with `*` wildcards).
+
+    Raises:
+        ValueError: If a resource type is not one of `RESOURCE_TYPE_PATTERNS`.
+    """
+    patterns = []
+    for resource_type in resource_types:
+        if resource_type not in RESOURCE_TYPE_PATTERNS:
+            raise ValueError(f"Unknown resource type {resource_type!r}. Use one of {sorted(RESOURCE_TYPE_PATTERNS)}.")
+        patterns += RESOURCE_TYPE_PATTERNS[resource_type]
+    return list(dict.fromkeys(patterns + list(url_patterns)))
+
+
+def block_resources(driver: "WebDriver", patterns: list[str]) -> None:
+    """Make the browser fail every request to a URL matching one of the patterns, through the DevTools Protocol."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def wait_for_elements(
+    driver: "WebDriver",
+    by: str,
+    value: str,
+    predicate: Optional[Callable[["WebElement"], bool]] = None,
+    timeout: float = ELEMENT_TIMEOUT,
+) -> list["WebElement"]:
+    """
+    Wait until the page holds elements matching the locator (and the predicate, if given), polling the DOM.
+
+    Returns:
+        list[WebElement]: The matching elements, or an empty list if there were none before the timeout.
+    """
+    from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    def _matching(d):
+        try:
+            return [element for element in d.find_elements(by, value) if predicate is None or predicate(element)]
+        except StaleElementReferenceException:
+            return []  # The page changed while it was being read. Try again.
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(_matching)
+    except TimeoutException:
+        logger.warning(f"No element matching {by}={value!r} after {timeout} s.")
+        return []
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """
+    Inter-process exclusive lock backed by a lock file next to the resource it protects. Every pytest process (or
+    xdist worker) using the same lock file serializes on it. An instance may also be shared between threads (e.g. the
+    ones of `AsyncRequestEngine`).
+
+    Usage:
+        with FileLock(path.with_suffix(".lock")):
+            ...  # read-modify-write path
+    """
+
+    def __init__(self, lock_file: Path, poll_interval: float = 0.01):
+        """
+        Initialize the FileLock.
+
+        Args:
+            lock_file (Path): Path to the lock file. It is created if missing.
+            poll_interval (float): Seconds between attempts to acquire the lock on Windows.
+        """
+        self._lock_file: Path = Path(lock_file)
+        self._poll_interval: float = poll_interval
+        self._fd: int | None = None
+        self._thread_lock: threading.Lock = threading.Lock()
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        try:
+            self._lock_file.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT)
+        except OSError:
+            self._thread_lock.release()
+            raise
+        if sys.platform == "win32":
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(self._poll_interval)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if sys.platform == "win32":
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
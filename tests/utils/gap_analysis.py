@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Sequence
+
+
+@dataclass
+class GapReport:
+    """Completeness of a series of timestamps against the expected grid of slots. Times are UTC epoch seconds."""
+
+    start: int
+    end: int
+    resolution: int
+    n_points: int
+    expected_slots: int
+    missing_ranges: list[tuple[int, int]] = field(default_factory=list)  # (first missing slot, number of slots)
+    duplicates: list[tuple[int, int]] = field(default_factory=list)  # (timestamp, number of occurrences)
+    out_of_order: list[int] = field(default_factory=list)  # Indexes of datapoints older than the previous one.
+    off_grid: list[int] = field(default_factory=list)  # Timestamps not aligned to the grid, or outside the window.
+
+    @property
+    def missing_count(self) -> int:
+        return sum(n for _, n in self.missing_ranges)
+
+    @property
+    def complete(self) -> bool:
+        """Every slot is covered exactly once, in order, and there is nothing else."""
+        return not (self.missing_ranges or self.duplicates or self.out_of_order or self.off_grid)
+
+    def summary(self, limit: int = 20) -> str:
+        lines = [
+            f"{self.n_points} datapoints for {self.expected_slots} slots of {self.resolution // 60} minutes between "
+            f"{_format(self.start)} and {_format(self.end)} UTC.",
+            f"Missing slots: {self.missing_count} in {len(self.missing_ranges)} ranges.",
+        ]
+        lines += [
+            f"  {_format(first)} to {_format(first + (n - 1) * self.resolution)} ({n} slots)"
+            for first, n in self.missing_ranges[:limit]
+        ]
+        if len(self.missing_ranges) > limit:
+            lines.append(f"  ... and {len(self.missing_ranges) - limit} more ranges.")
+        lines.append(f"Duplicated timestamps: {len(self.duplicates)}.")
+        lines += [f"  {_format(t)} ({n} times)" for t, n in self.duplicates[:limit]]
+        lines.append(f"Out of order datapoints: {len(self.out_of_order)}. Indexes: {self.out_of_order[:limit]}")
+        lines.append(f"Off-grid timestamps: {len(self.off_grid)}.")
+        lines += [f"  {_format(t)}" for t in self.off_grid[:limit]]
+        return "\n".join(lines)
+
+
+def analyse_gaps(times: Sequence[int], start: int, end: int, resolution: int = 600) -> GapReport:
+    """
+    Analyse a series of timestamps (e.g. the `fhora` column of `DatapointColumns`) in a single pass over its sorted
+    index. Sorting is linear for series already in order, which is the usual case.
+
+    Args:
+        times (Sequence[int]): UTC epoch seconds of every datapoint, in the order received.
+        start (int): Start of the requested window, in UTC epoch seconds.
+        end (int): End of the requested window (included), in UTC epoch seconds.
+        resolution (int): Seconds between consecutive slots.
+
+    Returns:
+        GapReport: The analysis.
+    """
+    first_slot = -(-start // resolution) * resolution  # First slot on the grid at or after the start.
+    report = GapReport(
+        start=start,
+        end=end,
+        resolution=resolution,
+        n_points=len(times),
+        expected_slots=max((end - first_slot) // resolution + 1, 0),
+    )
+
+    report.out_of_order = [i for i in range(1, len(times)) if times[i] < times[i - 1]]
+
+    expected = first_slot
+    previous = None
+    repetitions = 1
+    for t in sorted(times):
+        if t == previous:
+            repetitions += 1
+            continue
+        if repetitions > 1:
+            report.duplicates.append((previous, repetitions))
+        previous, repetitions = t, 1
+
+        if t % resolution or not start <= t <= end:
+            report.off_grid.append(t)
+            continue
+        if t > expected:
+            report.missing_ranges.append((expected, (t - expected) // resolution))
+        expected = t + resolution
+
+    if repetitions > 1:
+        report.duplicates.append((previous, repetitions))
+    if expected <= end:
+        report.missing_ranges.append((expected, (end - expected) // resolution + 1))
+    return report
+
+
+def to_epoch(date: datetime) -> int:
+    """Convert a naive UTC date to epoch seconds."""
+    return int(date.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _format(t: int) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M")
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from tests.utils.request_metrics import ResponseTiming
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class PooledHttpClient:
+    """
+    Thin wrapper around a `requests.Session` that keeps TCP+TLS connections alive between requests. Every test
+    sharing one instance reuses a few warm connections per host instead of opening a new one per request.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 10):
+        """
+        Initialize the PooledHttpClient.
+
+        Args:
+            pool_connections (int): Number of per-host connection pools to keep.
+            pool_maxsize (int): Maximum number of connections kept alive in each host pool.
+        """
+        self._session: requests.Session = requests.Session()
+        self._adapter: HTTPAdapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._adapter.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+        self._requests_per_host: dict[str, int] = {}
+
+    def get(self, url: str, stream: bool = False, **kwargs) -> requests.Response:
+        """
+        Make a GET request. The timing of the request is attached to the response as `response.timing` (see
+        `ResponseTiming`). If streamed, the download time and size are updated as the body is read.
+        """
+        host = urlsplit(url).netloc
+        self._requests_per_host[host] = self._requests_per_host.get(host, 0) + 1
+
+        _connect_time.seconds = 0.0
+        start = time.perf_counter()
+        # The body is always requested as a stream, so that the download is timed apart from the headers.
+        response = self._session.get(url, stream=True, **kwargs)
+        timing = ResponseTiming(connect=_connect_time.seconds, ttfb=time.perf_counter() - start)
+        response.timing = timing
+        response.iter_content = _timed_iter_content(response.iter_content, timing)
+        if not stream:
+            response.content  # Read the body now, as requests does.
+        return response
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        Connection reuse counters per host.
+
+        Returns:
+            dict[str, dict[str, int]]: For each host, the requests issued, the connections opened and how many
+                requests were served on an already open connection.
+        """
+        connections_per_host = {}
+        pools = self._adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            connections_per_host[pool.host] = connections_per_host.get(pool.host, 0) + pool.num_connections
+
+        stats = {}
+        for host, n_requests in self._requests_per_host.items():
+            n_connections = connections_per_host.get(urlsplit(f"//{host}").hostname, 0)
+            stats[host] = {
+                "requests": n_requests,
+                "connections": n_connections,
+                "reused": max(n_requests - n_connections, 0),
+            }
+        return stats
+
+    def close(self) -> None:
+        self._session.close()
+
+
+# Seconds spent opening connections by the request in progress on each thread.
+_connect_time = threading.local()
+
+
+def _timed_connect(connect):
+    def _connect(self):
+        start = time.perf_counter()
+        try:
+            connect(self)
+        finally:
+            _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + time.perf_counter() - start
+
+    return _connect
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    connect = _timed_connect(HTTPConnection.connect)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    connect = _timed_connect(HTTPSConnection.connect)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+def _timed_iter_content(iter_content, timing: ResponseTiming):
+    # Only the time spent waiting for each chunk counts as download time, not the time spent processing it.
+    def _iter_content(chunk_size: int = 1, decode_unicode: bool = False):
+        chunks = iter_content(chunk_size, decode_unicode)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            timing.download += time.perf_counter() - start
+            if chunk is None:
+                return
+            timing.bytes += len(chunk)
+            yield chunk
+
+    return _iter_content
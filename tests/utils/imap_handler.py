@@ -1,30 +1,79 @@
-
-import email
+import base64
+from dataclasses import dataclass
 import imaplib
 import logging
+import quopri
+import re
+import select
+import ssl
 import time
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Untagged responses announcing new messages on the selected mailbox.
+NEW_MAIL_RESPONSE = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b", re.IGNORECASE)
+# Tokens of IMAP response data: parentheses, quoted strings and atoms. Literals are handed over by imaplib separately.
+IMAP_TOKEN = re.compile(rb'(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+)')
+IMAP_LITERAL = re.compile(rb"\{\d+\}$")
+
 class IMAP_handler:
 
     DEFAULT_INBOX = "inbox"
+    # Servers drop IDLE connections after about 30 minutes (Gmail after about 10), so IDLE is renewed well before.
+    IDLE_RENEW_INTERVAL = 5 * 60
+    # Idle time after which the connection is checked with a NOOP before being used.
+    KEEPALIVE_INTERVAL = 60
+    # Seconds between checks when the server does not support IDLE.
+    POLL_INTERVAL = 1
+    # Bytes of an email part fetched per request.
+    PARTIAL_FETCH_SIZE = 64 * 1024
 
-    def __init__(self, email_credentials, imap_url = 'imap.gmail.com'):
-        self._mail = imaplib.IMAP4_SSL(imap_url)
+    def __init__(self, email_credentials, imap_url = 'imap.gmail.com', port = None, use_ssl = True, use_idle = True):
+        """
+        Initialize the IMAP_handler and connect to the server.
+
+        Args:
+            email_credentials (dict[str, str]): Address and password of the account.
+            imap_url (str): Host of the IMAP server.
+            port (Optional[int]): Port of the IMAP server. Defaults to the standard IMAP(S) port.
+            use_ssl (bool): Whether to connect with SSL.
+            use_idle (bool): Whether to wait for new emails with IDLE when the server supports it, instead of polling.
+        """
+        self._imap_url = imap_url
+        self._port = port
+        self._use_ssl = use_ssl
+        self._use_idle = use_idle
+        self._idle_tags = 0
+        self._last_activity = time.monotonic()
+        self._mail = self._connect()
+        self._capabilities = self._mail.capabilities
+        self._uid_validity = None
+        self._uid_next = 0
+        # UIDs found and highest UID searched, by subject.
+        self._subject_uids: dict[str, tuple[list[int], int]] = {}
         self.credentials = email_credentials
 
     @property
     def mail(self):
         return self._mail
 
+    @property
+    def idle_supported(self) -> bool:
+        return self._use_idle and "IDLE" in self._capabilities
+
+    def _connect(self):
+        imap_class = imaplib.IMAP4_SSL if self._use_ssl else imaplib.IMAP4
+        if self._port is None:
+            return imap_class(self._imap_url)
+        return imap_class(self._imap_url, self._port)
+
     def check(self):
         try:
             self.mail.login(self.credentials["address"], self.credentials["pswd"])
         except Exception:
             return False
-        
+
         return True
 
     def start(self):
@@ -33,67 +82,303 @@ class IMAP_handler:
         except Exception as e:
             logger.error(f"Login failed: {str(e)}")
             raise
-        self.mail.select(self.DEFAULT_INBOX, readonly=True)  # Connect to the inbox.
+        self._refresh_inbox()  # Connect to the inbox.
+        # Servers may announce more capabilities once logged in.
+        status, data = self.mail.capability()
+        if status == 'OK':
+            self._capabilities = tuple(data[-1].decode().upper().split())
+        self._last_activity = time.monotonic()
 
     def close(self):
         self.mail.logout()
 
     def restart(self):
-        self.close()
-        time.sleep(1)
+        try:
+            self.close()
+        except (imaplib.IMAP4.error, OSError):
+            pass  # The connection is already gone.
+        self._mail = self._connect()
         self.start()
 
+    def keepalive(self):
+        """
+        Make sure the connection is alive before using it, reconnecting if the server dropped it. The check (a NOOP) is
+        only sent after `KEEPALIVE_INTERVAL` seconds without activity.
+        """
+        if time.monotonic() - self._last_activity < self.KEEPALIVE_INTERVAL:
+            return
+        try:
+            self.mail.noop()
+            self._last_activity = time.monotonic()
+        except (imaplib.IMAP4.abort, OSError) as e:
+            logger.warning(f"IMAP connection dropped ({str(e)}). Reconnecting.")
+            self.restart()
+
     def _refresh_inbox(self):
         self.mail.select(self.DEFAULT_INBOX, readonly=True)
+        _, uid_validity = self.mail.response("UIDVALIDITY")
+        _, uid_next = self.mail.response("UIDNEXT")
+        if uid_validity and uid_validity[-1] is not None and int(uid_validity[-1]) != self._uid_validity:
+            # UIDs of a previous validity do not identify the same messages any more.
+            self._uid_validity = int(uid_validity[-1])
+            self._subject_uids.clear()
+        self._uid_next = int(uid_next[-1]) if uid_next and uid_next[-1] is not None else 0
+
+    def _search_subject(self, subject: str) -> list[int]:
+        """
+        UIDs of the emails with the given subject, oldest first. Only the messages newer than the highest UID already
+        searched for that subject are searched again.
+        """
+        uids, last_uid = self._subject_uids.get(subject, ([], 0))
+        status, messages = self.mail.uid("SEARCH", None, f"UID {last_uid + 1}:*", f'SUBJECT "{subject}"')
+        self._last_activity = time.monotonic()
+        if status != 'OK':
+            raise Exception("Cannot retrieve emails.")
+        # With no message above the range start, n:* still matches the last message.
+        new_uids = sorted(uid for uid in map(int, (messages[0] or b"").split()) if uid > last_uid)
+        uids = uids + new_uids
+        # Every message below UIDNEXT existed when the inbox was selected, so it has been searched.
+        self._subject_uids[subject] = (uids, max([last_uid, self._uid_next - 1, *new_uids]))
+        return uids
 
     def count_emails_by_subject(self, subject: str) -> int:
+        self.keepalive()
         self._refresh_inbox()
-        status, messages = self.mail.search(None, f'SUBJECT "{subject}"')
-        if status == 'OK':
-            # Convert the message IDs to a list of email IDs
-            email_ids = messages[0].split()
-
-            if not email_ids:
-                return 0
-            else:
-                # Fetch the most recent email with the matching subject
-                return len(email_ids)
-        else:
-            raise Exception("Cannot retrieve emails.")
+        return len(self._search_subject(subject))
+
+    def wait_for_new_email(self, subject: str, count_before: int, timeout: float = 100) -> bool:
+        """
+        Wait until the inbox holds more than `count_before` emails with the given subject.
+
+        With IDLE, the server pushes new messages as they arrive and the inbox is only searched then. Otherwise, the
+        inbox is checked with a NOOP and searched every `POLL_INTERVAL` seconds. A dropped connection is reopened.
+
+        Returns:
+            bool: Whether the new email arrived before the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        count = self.count_emails_by_subject(subject)
+        while count <= count_before:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"No new email with subject {subject!r} after {timeout} s.")
+                return False
+            try:
+                if self.idle_supported:
+                    # Searched again after each renewal as well, in case a notification was missed.
+                    self._idle(min(remaining, self.IDLE_RENEW_INTERVAL))
+                else:
+                    time.sleep(min(remaining, self.POLL_INTERVAL))
+                    self.mail.noop()  # Lets the server report new messages on the selected inbox.
+                count = len(self._search_subject(subject))
+            except (imaplib.IMAP4.abort, OSError) as e:
+                logger.warning(f"IMAP connection dropped while waiting for new emails ({str(e)}). Reconnecting.")
+                self.restart()
+                count = len(self._search_subject(subject))
+            except imaplib.IMAP4.error as e:
+                logger.warning(f"IDLE failed ({str(e)}). Polling the inbox instead.")
+                self._use_idle = False
+        return True
+
+    def _idle(self, timeout: float) -> bool:
+        """
+        Wait in IDLE (RFC 2177) until the server reports new messages on the selected inbox, or for `timeout` seconds.
+
+        Returns:
+            bool: Whether new messages were reported.
+        """
+        self._idle_tags += 1
+        tag = f"IDLE{self._idle_tags}".encode()
+        self.mail.send(tag + b" IDLE\r\n")
+        line = self.mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+
+        new_mail = False
+        deadline = time.monotonic() + timeout
+        while not new_mail:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._readable(remaining):
+                break
+            line = self.mail.readline()
+            if not line or line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort("Connection closed by the server during IDLE.")
+            new_mail = bool(NEW_MAIL_RESPONSE.match(line))
+
+        self.mail.send(b"DONE\r\n")
+        while True:
+            line = self.mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed by the server while ending IDLE.")
+            if line.startswith(tag + b" "):
+                break
+            new_mail = new_mail or bool(NEW_MAIL_RESPONSE.match(line))
+        self._last_activity = time.monotonic()
+        return new_mail
+
+    def _readable(self, timeout: float) -> bool:
+        if self._buffered():
+            return True
+        readable, _, _ = select.select([self.mail.sock], [], [], timeout)
+        return bool(readable)
+
+    def _buffered(self) -> bool:
+        """
+        Whether a line is already available without waiting. imaplib reads through a buffered file, and data read
+        along with an earlier line (or decrypted by the SSL layer) does not show on the socket, so the file is peeked
+        at without blocking.
+        """
+        sock = self.mail.sock
+        previous_timeout = sock.gettimeout()
+        sock.settimeout(0)
+        try:
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(previous_timeout)
 
     def get_last_email_by_subject(self, subject: str) -> str:
+        """
+        Text of the most recent email with the given subject: every text part (plain and html alike), decoded and
+        joined in order.
+
+        The structure of the email is fetched first, and then only its text parts, in chunks of `PARTIAL_FETCH_SIZE`
+        bytes, so that attachments are never downloaded. The email is not marked as read.
+        """
+        self.keepalive()
         self._refresh_inbox()
-        status, messages = self.mail.search(None, f'SUBJECT "{subject}"')
-        if status == 'OK':
-            # Convert the message IDs to a list of email IDs
-            email_ids = messages[0].split()
-
-            if not email_ids:
-                return None
-            else:
-                # Fetch the most recent email with the matching subject
-                latest_email_id = email_ids[-1]
-                status, msg_data = self.mail.fetch(latest_email_id, '(RFC822)')
-
-                if status != 'OK':
-                    return None
-                else:
-                    # Parse the email content
-                    raw_email = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-
-                    # Extract the email body
-                    if not msg.is_multipart():
-                        body = msg.get_payload(decode=True).decode()
-                    else:
-                        body = ""
-                        for part in msg.walk():
-                            # Parts could be multi-part too. Will implement if blocking.
-                            try:
-                                body_part = part.get_payload(decode=True).decode()
-                                body += body_part
-                            except:
-                                pass
-                    return body
+        uids = self._search_subject(subject)
+        if not uids:
+            return None
+
+        # Fetch the most recent email with the matching subject
+        latest_uid = str(uids[-1])
+        status, data = self.mail.uid("FETCH", latest_uid, "(BODYSTRUCTURE)")
+        if status != 'OK' or not data or data[0] is None:
+            return None
+        parts = text_parts(fetch_item(data, "BODYSTRUCTURE"))
+        if not parts:
+            logger.warning(f"No text part found on email {latest_uid}.")
+            return None
+
+        body = "".join(part.decode(self._fetch_part(latest_uid, part)) for part in parts)
+        self._last_activity = time.monotonic()
+        return body
+
+    def _fetch_part(self, uid: str, part: "TextPart") -> bytes:
+        content = b""
+        while len(content) < part.size:
+            status, data = self.mail.uid(
+                "FETCH", uid, f"(BODY.PEEK[{part.section}]<{len(content)}.{self.PARTIAL_FETCH_SIZE}>)"
+            )
+            chunk = fetch_item(data, "BODY[") if status == 'OK' else None
+            if not chunk:
+                break
+            content += chunk
+        return content
+
+
+@dataclass
+class TextPart:
+    """Text part of an email, as described by its BODYSTRUCTURE."""
+
+    section: str  # Part number, e.g. "1.2".
+    subtype: str  # "html" or "plain".
+    charset: str
+    encoding: str  # Content-Transfer-Encoding.
+    size: int  # Bytes of the encoded part.
+
+    def decode(self, content: bytes) -> str:
+        if self.encoding == "base64":
+            content = base64.b64decode(content)
+        elif self.encoding == "quoted-printable":
+            content = quopri.decodestring(content)
+        try:
+            return content.decode(self.charset, errors="replace")
+        except LookupError:
+            return content.decode("utf-8", errors="replace")
+
+
+def parse_imap_data(data) -> list:
+    """
+    Parse the data of an IMAP response, as returned by imaplib, into nested lists of strings. Literals (the tuples
+    imaplib splits them into) are inlined as strings, and NIL is parsed as None.
+    """
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            prefix, literal = item
+            tokens += _tokenize(IMAP_LITERAL.sub(b"", prefix))
+            tokens.append(literal)
+        elif item is not None:
+            tokens += _tokenize(item)
+
+    root = []
+    stack = [root]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")" and len(stack) > 1:
+            nested = stack.pop()
+            stack[-1].append(nested)
         else:
-            raise Exception("Cannot retrieve emails.")
\ No newline at end of file
+            stack[-1].append(token)
+    return root
+
+
+def _tokenize(data: bytes) -> list:
+    tokens = []
+    for opening, closing, quoted, atom in IMAP_TOKEN.findall(data):
+        if opening or closing:
+            tokens.append((opening or closing).decode())
+        elif atom:
+            tokens.append(None if atom.upper() == b"NIL" else atom)
+        else:
+            tokens.append(re.sub(rb"\\(.)", rb"\1", quoted))
+    return tokens
+
+
+def fetch_item(data, name: str):
+    """
+    Value of an item of a FETCH response (e.g. BODYSTRUCTURE), or of the first item whose name starts with `name` (e.g.
+    BODY[ for a body section). Strings are returned as bytes. None if missing.
+    """
+    for message in parse_imap_data(data):
+        if not isinstance(message, list):
+            continue
+        for key, value in zip(message[::2], message[1::2]):
+            if isinstance(key, bytes) and key.decode().upper().startswith(name):
+                return value
+    return None
+
+
+def text_parts(structure: list) -> list[TextPart]:
+    """Text parts of a BODYSTRUCTURE, in the order they appear on the email. Empty if there are none."""
+    return _text_parts(structure, "")
+
+
+def _text_parts(structure: list, section: str) -> list[TextPart]:
+    if not isinstance(structure, list) or not structure:
+        return []
+    if isinstance(structure[0], list):
+        # Multipart: the parts come first, then the subtype and the extension data.
+        parts = []
+        for i, child in enumerate(structure):
+            if not isinstance(child, list):
+                break
+            parts += _text_parts(child, f"{section}.{i + 1}" if section else str(i + 1))
+        return parts
+
+    content_type, subtype, params, _, _, encoding, size = (structure + [None] * 7)[:7]
+    if (content_type or b"").lower() != b"text":
+        return []
+    params = dict(zip(params[::2], params[1::2])) if isinstance(params, list) else {}
+    params = {key.decode().lower(): value.decode() for key, value in params.items() if key and value}
+    return [TextPart(
+        section=section or "1",
+        subtype=subtype.decode().lower(),
+        charset=params.get("charset", "utf-8"),
+        encoding=(encoding or b"7bit").decode().lower(),
+        size=int(size or 0),
+    )]
@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+import json
+import logging
+from pathlib import Path
+import re
+import subprocess
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+ROOT = Path(__file__).parents[2]
+# Line of `python -X importtime`: "import time: <self us> | <cumulative us> | <indentation><module>".
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+@dataclass
+class ImportProfile:
+    """Time to import each module, in seconds, and every module loaded once they are imported."""
+
+    times: dict[str, float]
+    loaded: set[str]
+
+    @property
+    def total(self) -> float:
+        return sum(self.times.values())
+
+
+def parse_import_times(stderr: str) -> dict[str, float]:
+    """Cumulative import time in seconds of the modules imported at the top level, from `python -X importtime`."""
+    times = {}
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match and not match.group(3):
+            times[match.group(4)] = int(match.group(2)) / 1e6
+    return times
+
+
+def profile_imports(modules: list[str], preload: list[str], runs: int = 3) -> ImportProfile:
+    """
+    Import the modules in a fresh interpreter, `runs` times, and keep the fastest time of each.
+
+    Args:
+        modules (list[str]): Modules to time, imported in order. Modules they share are charged to the first.
+        preload (list[str]): Modules imported before, and not timed (e.g. pytest, which is loaded anyway).
+        runs (int): Interpreters started. Taking the fastest of several runs filters out the noise of the machine.
+    """
+    imports = [f"import {module}" for module in preload + modules]
+    code = "; ".join(imports + ["import json, sys", "print(json.dumps(list(sys.modules)))"])
+    times, loaded = {}, set()
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        run_times = parse_import_times(process.stderr)
+        for module in modules:
+            times[module] = min(times.get(module, float("inf")), run_times.get(module, 0.0))
+        loaded = set(json.loads(process.stdout))
+    return ImportProfile(times, loaded)
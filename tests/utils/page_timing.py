@@ -0,0 +1,141 @@
+from dataclasses import dataclass, fields
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from tests.utils.request_metrics import PERCENTILES, percentile
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Percentile the budgets apply to.
+BUDGET_PERCENTILE = 95
+DEFAULT_PAGE_BUDGETS = "ttfb=1500,dom_content_loaded=4000,load=8000,lcp=4000"
+
+# Collects the Navigation Timing, Paint Timing, Largest Contentful Paint and Resource Timing entries of the page.
+# LCP entries are only available to observers, which get the entries recorded so far with `buffered`.
+PAGE_TIMING_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const nav = performance.getEntriesByType("navigation")[0];
+const paints = Object.fromEntries(performance.getEntriesByType("paint").map(p => [p.name, p.startTime]));
+const resources = performance.getEntriesByType("resource");
+let lcp = null;
+let observer = null;
+try {
+    observer = new PerformanceObserver(list => {
+        const entries = list.getEntries();
+        if (entries.length) lcp = entries[entries.length - 1].startTime;
+    });
+    observer.observe({type: "largest-contentful-paint", buffered: true});
+} catch (e) {}
+setTimeout(() => {
+    if (observer) {
+        const entries = observer.takeRecords();
+        if (entries.length) lcp = entries[entries.length - 1].startTime;
+        observer.disconnect();
+    }
+    done({
+        ttfb: nav.responseStart - nav.startTime,
+        dom_content_loaded: nav.domContentLoadedEventEnd - nav.startTime,
+        load: nav.loadEventEnd - nav.startTime,
+        fcp: paints["first-contentful-paint"] ?? null,
+        lcp: lcp,
+        transfer_size: nav.transferSize,
+        resources: resources.length,
+        resource_transfer_size: resources.reduce((total, r) => total + r.transferSize, 0),
+    });
+}, 50);
+"""
+
+
+@dataclass
+class PageTiming:
+    """Timing of a page load. Times in milliseconds from the start of the navigation, sizes in bytes."""
+
+    ttfb: float  # Time to first byte of the document.
+    dom_content_loaded: float
+    load: float
+    fcp: Optional[float]  # First contentful paint.
+    lcp: Optional[float]  # Largest contentful paint.
+    transfer_size: int  # Document, headers included. 0 if served from the cache.
+    resources: int  # Subresources loaded.
+    resource_transfer_size: int  # Subresources. Cross-origin resources without Timing-Allow-Origin count as 0.
+
+
+def measure_page(driver: "WebDriver", url: str, loads: int = 5, timeout: float = 30) -> list[PageTiming]:
+    """
+    Load a page `loads` times with the browser cache disabled, and collect the timing of each load.
+
+    Args:
+        driver (WebDriver): Chrome webdriver.
+        url (str): Page to load.
+        loads (int): Number of loads.
+        timeout (float): Seconds to wait for the load event of each load.
+    """
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    timings = []
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+    try:
+        for _ in range(loads):
+            driver.get(url)
+            # With the eager page load strategy, the load event may not have fired yet.
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script(
+                    "const nav = performance.getEntriesByType('navigation')[0]; return nav && nav.loadEventEnd > 0;"
+                )
+            )
+            timings.append(PageTiming(**driver.execute_async_script(PAGE_TIMING_SCRIPT)))
+    finally:
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": False})
+    return timings
+
+
+def summarize_timings(timings: list[PageTiming]) -> dict[str, dict[str, Optional[float]]]:
+    """Percentiles of every metric over the loads. Metrics missing on a load (e.g. no LCP) are left out of it."""
+    summary = {}
+    for field in fields(PageTiming):
+        values = [getattr(timing, field.name) for timing in timings if getattr(timing, field.name) is not None]
+        summary[field.name] = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+    return summary
+
+
+def parse_budgets(budgets: str) -> dict[str, float]:
+    """
+    Parse budgets given as comma separated `metric=milliseconds` pairs.
+
+    Raises:
+        ValueError: If a pair is malformed or the metric is not a `PageTiming` field.
+    """
+    names = {field.name for field in fields(PageTiming)}
+    parsed = {}
+    for pair in filter(None, (pair.strip() for pair in budgets.split(","))):
+        metric, _, value = pair.partition("=")
+        if metric not in names or not value:
+            raise ValueError(f"Invalid page budget {pair!r}. Use <metric>=<value> with a metric of {sorted(names)}.")
+        parsed[metric] = float(value)
+    return parsed
+
+
+def budget_violations(summary: dict[str, dict[str, Optional[float]]], budgets: dict[str, float]) -> list[str]:
+    """Description of every metric whose `BUDGET_PERCENTILE` exceeds its budget. Empty if within budget."""
+    violations = []
+    for metric, budget in budgets.items():
+        value = summary[metric][f"p{BUDGET_PERCENTILE}"]
+        if value is not None and value > budget:
+            violations.append(f"{metric} p{BUDGET_PERCENTILE} {value:.0f} > {budget:.0f}")
+    return violations
+
+
+def format_timings(url: str, timings: list[PageTiming]) -> str:
+    """Table of the percentiles of every metric, for the test report."""
+    summary = summarize_timings(timings)
+    lines = [f"{url}: {len(timings)} loads, cache disabled. Times in ms, sizes in bytes."]
+    lines.append(f"{'metric':>24} " + " ".join(f"{f'p{q}':>10}" for q in PERCENTILES))
+    for metric, values in summary.items():
+        cells = [f"{value:>10.0f}" if value is not None else f"{'-':>10}" for value in values.values()]
+        lines.append(f"{metric:>24} " + " ".join(cells))
+    return "\n".join(lines)
@@ -0,0 +1,181 @@
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+import logging
+from pathlib import Path
+import sqlite3
+import statistics
+import subprocess
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Metrics compared against the baseline, and the smallest increase of each that counts as a regression. Durations of
+# quick tests are dominated by noise.
+BASELINE_METRICS = {"duration": 0.1, "requests": 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    recorded TEXT NOT NULL,
+    commit_id TEXT NOT NULL,
+    nodeid TEXT NOT NULL,
+    station TEXT,
+    starting_date TEXT,
+    interval TEXT,
+    outcome TEXT NOT NULL,
+    duration REAL NOT NULL,
+    requests INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    wait REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS test_runs_nodeid ON test_runs (nodeid, id);
+"""
+
+
+@dataclass
+class TestRun:
+    """Performance of a test in a run, as stored."""
+
+    __test__ = False  # Not a test class, despite the name.
+
+    nodeid: str  # Without the pytest-xdist group tag.
+    station: Optional[str]
+    starting_date: Optional[str]
+    interval: Optional[str]
+    outcome: str
+    duration: float  # Seconds of the call phase.
+    requests: int  # HTTP requests made, retries not included.
+    bytes: int  # Bytes of body downloaded.
+    wait: float  # Seconds waited for the request budget or after 429s.
+
+
+@dataclass
+class Comparison:
+    """A metric of a test against its rolling baseline."""
+
+    metric: str
+    value: float
+    samples: int  # Baseline runs available.
+    mean: Optional[float] = None
+    stdev: Optional[float] = None
+    limit: Optional[float] = None  # Values above this are regressions.
+
+    @property
+    def regressed(self) -> bool:
+        return self.limit is not None and self.value > self.limit
+
+
+def current_commit(root: Path) -> str:
+    """Commit checked out in `root`, with a `+dirty` suffix if there are uncommitted changes. `unknown` without git."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}+dirty" if dirty else commit
+
+
+class PerfBaselineStore:
+    """
+    Local SQLite store of the performance of every test of every run, keyed by commit, test node id and parameters.
+
+    Every run appends its results once it finishes, in a single transaction, so that the processes of concurrent runs
+    do not interleave. The baseline of a test is the last `window` passing runs of the same node id.
+    """
+
+    def __init__(self, path: Path, window: int = 20):
+        """
+        Initialize the PerfBaselineStore.
+
+        Args:
+            path (Path): SQLite database file. Created if missing.
+            window (int): Number of past runs the baseline is computed from.
+        """
+        self._path: Path = path
+        self._window: int = window
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=30)
+
+    def append(self, run_id: str, commit: str, runs: list[TestRun]) -> None:
+        recorded = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        rows = [{"run_id": run_id, "recorded": recorded, "commit_id": commit, **asdict(run)} for run in runs]
+        if not rows:
+            return
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f"INSERT INTO test_runs ({', '.join(rows[0])}) VALUES ({', '.join(f':{key}' for key in rows[0])})",
+                rows,
+            )
+        logger.info(f"Stored the performance of {len(rows)} tests in {self._path}.")
+
+    def history(self, nodeid: str) -> list[dict[str, Any]]:
+        """Last `window` passing runs of a test, most recent first."""
+        with closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                "SELECT * FROM test_runs WHERE nodeid = ? AND outcome = 'passed' ORDER BY id DESC LIMIT ?",
+                (nodeid, self._window),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def compare(
+    run: TestRun,
+    history: list[dict[str, Any]],
+    sigmas: float = 3.0,
+    tolerance: float = 0.2,
+    min_samples: int = 5,
+) -> list[Comparison]:
+    """
+    Compare the duration and request count of a test against its baseline.
+
+    A value regresses if it exceeds the baseline mean by more than `sigmas` standard deviations, by more than
+    `tolerance` of the mean and by more than the minimum increase of the metric. The relative tolerance keeps steady
+    metrics (such as request counts, which usually have no variance at all) from being flagged on negligible changes.
+
+    Args:
+        run (TestRun): Current run of the test.
+        history (list[dict[str, Any]]): Past runs, as returned by `PerfBaselineStore.history`.
+        sigmas (float): Standard deviations above the mean a value may be.
+        tolerance (float): Fraction of the mean a value must exceed it by to regress.
+        min_samples (int): Past runs needed to compare. With fewer, no limit is set.
+
+    Returns:
+        list[Comparison]: One comparison per metric of `BASELINE_METRICS`.
+    """
+    comparisons = []
+    for metric, min_increase in BASELINE_METRICS.items():
+        values = [row[metric] for row in history]
+        comparison = Comparison(metric=metric, value=getattr(run, metric), samples=len(values))
+        if len(values) >= min_samples:
+            comparison.mean = statistics.fmean(values)
+            comparison.stdev = statistics.stdev(values)
+            margin = max(sigmas * comparison.stdev, tolerance * comparison.mean, min_increase)
+            comparison.limit = comparison.mean + margin
+        comparisons.append(comparison)
+    return comparisons
+
+
+def format_comparisons(comparisons: list[Comparison]) -> str:
+    """Fixed-width table of the comparisons of a test, for the test report."""
+    lines = [f"{'metric':>10} {'value':>10} {'mean':>10} {'stdev':>10} {'limit':>10} {'samples':>8}  verdict"]
+    for c in comparisons:
+        values = (c.value, c.mean, c.stdev, c.limit)
+        cells = [f"{value:>10.3f}" if value is not None else f"{'-':>10}" for value in values]
+        if c.limit is None:
+            verdict = "no baseline"
+        else:
+            verdict = "REGRESSION" if c.regressed else "ok"
+        lines.append(f"{c.metric:>10} {' '.join(cells)} {c.samples:>8}  {verdict}")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import json
+import logging
+from typing import Any, Callable, Iterable, Optional
+
+from tests.utils.aemet_response import NO_DATA_BODY, AemetResponse
+from tests.utils.gap_analysis import to_epoch
+from tests.utils.recorder import RecordedResponse
+from tests.utils.requests_functions import iter_datapoints
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Longest window fetched at once. The API rejects windows longer than about a month.
+MAX_COVER_SPAN = timedelta(days=31)
+
+# (station, start, end), in UTC.
+Window = tuple[str, datetime, datetime]
+
+
+@dataclass
+class Cover:
+    """Window fetched with a single request, covering one or more requested windows of a station."""
+
+    start: datetime
+    end: datetime
+    pending: int = 0  # Requested windows not served yet. The data is released when it reaches 0.
+    loaded: bool = False
+    query_response: Any = None
+    data_response: Any = None
+    times: array = field(default_factory=lambda: array("q"))  # Epoch seconds of each datapoint, in order.
+    datapoints: list[bytes] = field(default_factory=list)  # Each datapoint, encoded as JSON.
+
+
+class RangeCoalescer:
+    """
+    Serve the windows requested for a station from one request per covering window.
+
+    The windows known in advance are merged per station into covers: sorted by start, each window joins the previous
+    cover if it overlaps it and the cover does not exceed `max_span`. The first window requested from a cover fetches
+    the whole of it, and every window is then served as the exact slice of the cover's datapoints. A window with no
+    datapoints gets the same "no data" answer as the API. Windows not known in advance are fetched on their own.
+
+    Windows may also be given by group, e.g. by pytest-xdist worker group. The windows of a group are only planned
+    once one of them is requested, so that a worker only plans, and holds the data of, the groups it runs.
+    """
+
+    def __init__(
+        self,
+        fetch_window: Callable[[str, datetime, datetime], tuple[Any, Optional[Any]]],
+        windows: Iterable[Window] = (),
+        max_span: timedelta = MAX_COVER_SPAN,
+        groups: Optional[dict[str, list[Window]]] = None,
+    ):
+        """
+        Initialize the RangeCoalescer.
+
+        Args:
+            fetch_window (Callable): Blocking function taking (station, start, end) in UTC that returns the query
+                response and the data response, or None if the query did not point to any data.
+            windows (Iterable[Window]): Windows that will be requested, as (station, start, end) tuples in UTC.
+            max_span (timedelta): Longest cover.
+            groups (Optional[dict[str, list[Window]]]): More windows that may be requested, by group. Covers do not
+                span groups.
+        """
+        self._fetch_window = fetch_window
+        self._max_span: timedelta = max_span
+        self._covers: dict[Window, Cover] = {}
+        self._groups: dict[str, list[Window]] = dict(groups or {})
+        self.stats: dict[str, int] = {"windows": 0, "requests": 0}
+        self._plan(windows)
+
+    def __len__(self) -> int:
+        """Number of distinct covers."""
+        return len({id(cover) for cover in self._covers.values()})
+
+    def fetch(
+        self, station: str, start: datetime, end: datetime, group: Optional[str] = None
+    ) -> tuple[Any, Optional[Any]]:
+        """
+        Get the data for a window, planning the windows of its group first if they are not yet.
+
+        Returns:
+            tuple[Any, Optional[Any]]: The query response and the data response, or None if there is no data.
+        """
+        self.stats["windows"] += 1
+        if group in self._groups:
+            self._plan(self._groups.pop(group))
+        cover = self._covers.get((station, start, end))
+        if cover is None:
+            self.stats["requests"] += 1
+            return self._fetch_window(station, start, end)
+
+        if not cover.loaded:
+            self._load(station, cover)
+        try:
+            return self._slice(cover, start, end)
+        finally:
+            cover.pending -= 1
+            if cover.pending <= 0:
+                # Served every window. Should a window be requested again, the cover is fetched again.
+                cover.loaded, cover.data_response, cover.times, cover.datapoints = False, None, array("q"), []
+
+    def _plan(self, windows: Iterable[Window]) -> None:
+        by_station: dict[str, set[tuple[datetime, datetime]]] = {}
+        for station, start, end in windows:
+            if start <= end and (station, start, end) not in self._covers:
+                by_station.setdefault(station, set()).add((start, end))
+        for station, station_windows in by_station.items():
+            self._index_station(station, sorted(station_windows))
+
+    def _index_station(self, station: str, windows: list[tuple[datetime, datetime]]) -> None:
+        cover = None
+        for start, end in windows:
+            if cover is None or start > cover.end or max(end, cover.end) - cover.start > self._max_span:
+                cover = Cover(start, end)
+            cover.end = max(cover.end, end)
+            cover.pending += 1
+            self._covers[(station, start, end)] = cover
+
+    def _load(self, station: str, cover: Cover) -> None:
+        logger.info(f"Fetching {station=} from {cover.start} to {cover.end} for {cover.pending} windows.")
+        self.stats["requests"] += 1
+        cover.query_response, cover.data_response = self._fetch_window(station, cover.start, cover.end)
+        cover.loaded = True
+        if cover.data_response is None or not cover.data_response.ok:
+            return
+
+        for datapoint in iter_datapoints(cover.data_response):
+            cover.times.append(int(datetime.fromisoformat(datapoint["fhora"]).timestamp()))
+            cover.datapoints.append(json.dumps(datapoint, ensure_ascii=False).encode())
+        if any(cover.times[i] < cover.times[i - 1] for i in range(1, len(cover.times))):
+            order = sorted(range(len(cover.times)), key=cover.times.__getitem__)
+            cover.times = array("q", (cover.times[i] for i in order))
+            cover.datapoints = [cover.datapoints[i] for i in order]
+
+    def _slice(self, cover: Cover, start: datetime, end: datetime) -> tuple[Any, Optional[Any]]:
+        if cover.data_response is None or not cover.data_response.ok:
+            # The cover had no data, or its download failed. Every window gets the same answer.
+            return cover.query_response, cover.data_response
+
+        first = bisect_left(cover.times, to_epoch(start))
+        last = bisect_right(cover.times, to_epoch(end))
+        url = cover.query_response.url
+        if first == last:
+            return _json_response(url, json.dumps(NO_DATA_BODY).encode()), None
+        content = b"[" + b",".join(cover.datapoints[first:last]) + b"]"
+        return cover.query_response, _json_response(url, content)
+
+
+def _json_response(url: str, content: bytes) -> AemetResponse:
+    headers = {"Content-Type": "application/json;charset=utf-8"}
+    return AemetResponse(RecordedResponse(url=url, status_code=200, reason="OK", headers=headers, content=content))
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+import time
+
+from tests.utils.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class TokenBucketRateLimiter:
+    """
+    Proactive rate limiter for the per-key request cap of the AEMET API.
+
+    Each API key owns a token bucket. A request may only go out once a token is available, so requests are sent at
+    the highest rate the cap allows instead of hitting it. The buckets live in a JSON file protected by a file lock, so
+    every pytest process (or xdist worker) sharing the file shares the same budget. Keys are stored hashed.
+
+    The refill rate starts at the configured value and is lowered whenever the API reports that the cap was reached:
+    the rate observed since the previous 429, over at most the last `window` seconds, becomes the new estimate of the
+    real cap. Every `RECOVERY_STREAK` successful requests without a 429, the rate is raised back toward the configured
+    value. The learnt rate is kept across runs. Buckets unused for longer than the window, e.g. left over by an earlier
+    run, start full, since the cap of the API has reset by then.
+    """
+
+    SAFETY_MARGIN = 0.9  # Fraction of the observed rate used as new refill rate after a 429.
+    RECOVERY_STREAK = 20  # Successful requests in a row after which the refill rate is raised.
+    RECOVERY_FACTOR = 1.25  # Increase of the refill rate after each streak, up to the configured rate.
+
+    def __init__(
+        self,
+        state_file: Path,
+        capacity: float,
+        refill_rate: float,
+        min_refill_rate: float = 1 / 60,
+        window: float = 60,
+    ):
+        """
+        Initialize the TokenBucketRateLimiter.
+
+        Args:
+            state_file (Path): JSON file where the buckets are stored.
+            capacity (float): Maximum number of tokens per bucket, i.e. the largest burst allowed.
+            refill_rate (float): Initial number of tokens added per second.
+            min_refill_rate (float): Lower bound for the learnt refill rate.
+            window (float): Seconds over which the API counts the requests of a key against the cap.
+        """
+        self._state_file: Path = state_file
+        self._lock: FileLock = FileLock(state_file.with_suffix(".lock"))
+        self._capacity: float = capacity
+        self._refill_rate: float = refill_rate
+        self._min_refill_rate: float = min_refill_rate
+        self._window: float = window
+
+    def acquire(self, key: str) -> float:
+        """
+        Block until a token is available for the given key and consume it.
+
+        Args:
+            key (str): API key the request will be made with.
+
+        Returns:
+            float: Seconds spent waiting for the token.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                state = self._read_state()
+                bucket = self._refill(state, key)
+                if bucket["tokens"] >= 1:
+                    bucket["tokens"] -= 1
+                    bucket["window_count"] += 1
+                    self._write_state(state)
+                    return waited
+                wait = (1 - bucket["tokens"]) / bucket["refill_rate"]
+                self._write_state(state)
+            time.sleep(wait)
+            waited += wait
+
+    def report_limit_reached(self, key: str) -> None:
+        """
+        Empty the bucket of the given key and learn the refill rate from the requests granted since the last 429.
+
+        Args:
+            key (str): API key whose request was rejected with a 429.
+        """
+        with self._lock:
+            state = self._read_state()
+            bucket = self._refill(state, key)
+            now = time.time()
+            elapsed = now - bucket["window_start"]
+            if elapsed > 0 and bucket["window_count"] > 0:
+                observed_rate = bucket["window_count"] / elapsed
+                bucket["refill_rate"] = max(
+                    min(bucket["refill_rate"], observed_rate) * self.SAFETY_MARGIN, self._min_refill_rate
+                )
+                logger.info(f"Request cap reached. Refill rate set to {bucket['refill_rate'] * 60:.1f} requests/min.")
+            bucket["tokens"] = 0.0
+            bucket["window_start"] = now
+            bucket["window_count"] = 0
+            bucket["successes"] = 0
+            self._write_state(state)
+
+    def report_success(self, key: str) -> None:
+        """
+        Count a request of the given key that was not rejected, raising its refill rate after a streak of them.
+
+        Args:
+            key (str): API key of the successful request.
+        """
+        with self._lock:
+            state = self._read_state()
+            bucket = self._refill(state, key)
+            bucket["successes"] += 1
+            if bucket["successes"] >= self.RECOVERY_STREAK and bucket["refill_rate"] < self._refill_rate:
+                bucket["refill_rate"] = min(self._refill_rate, bucket["refill_rate"] * self.RECOVERY_FACTOR)
+                bucket["successes"] = 0
+                logger.info(f"Refill rate raised to {bucket['refill_rate'] * 60:.1f} requests/min.")
+            self._write_state(state)
+
+    def refill_rate(self, key: str) -> float:
+        """
+        Get the current refill rate estimate for the given key.
+
+        Returns:
+            float: Tokens added per second.
+        """
+        with self._lock:
+            return self._read_state().get(_key_id(key), {}).get("refill_rate", self._refill_rate)
+
+    def _refill(self, state: dict, key: str) -> dict:
+        now = time.time()
+        bucket = state.get(_key_id(key))
+        if bucket is None:
+            bucket = state[_key_id(key)] = {
+                "tokens": self._capacity,
+                "updated": now,
+                "refill_rate": self._refill_rate,
+                "window_start": now,
+                "window_count": 0,
+                "successes": 0,
+            }
+        elif now - bucket["updated"] > self._window:
+            # Unused for a whole window (e.g. since an earlier run): the cap has reset, but the learnt rate still holds.
+            bucket.update(tokens=self._capacity, updated=now, window_start=now, window_count=0)
+        elif now - bucket["window_start"] > self._window:
+            # The observed rate is only measured over the last window, so idle time does not dilute it.
+            bucket["window_start"], bucket["window_count"] = now, 0
+        bucket.setdefault("successes", 0)
+        bucket["tokens"] = min(self._capacity, bucket["tokens"] + (now - bucket["updated"]) * bucket["refill_rate"])
+        bucket["updated"] = now
+        return bucket
+
+    def _read_state(self) -> dict:
+        if not self._state_file.is_file():
+            return {}
+        try:
+            return json.loads(self._state_file.read_text())
+        except json.JSONDecodeError:
+            return {}  # If the file is corrupted, start over
+
+    def _write_state(self, state: dict) -> None:
+        self._state_file.write_text(json.dumps(state))
+
+
+def _key_id(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
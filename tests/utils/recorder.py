@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+from tests.utils.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+INDEX_FILE_NAME = "index.json"
+STRIPPED_PARAMS = {"api_key"}  # Never stored, and ignored when matching requests.
+
+
+def request_key(url: str, params: Optional[dict] = None) -> str:
+    """
+    Identify a request by its normalized url and parameters. Credentials are left out, so recordings made with one key
+    are served to any other.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + list((params or {}).items())
+    query = sorted((k, str(v)) for k, v in query if k not in STRIPPED_PARAMS)
+    normalized = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}?{urlencode(query)}"
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class RecordedResponse:
+    """
+    Stand-in for `requests.Response` served from local storage. A body stored on file is only read when accessed.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        status_code: int,
+        reason: str,
+        headers: dict,
+        body_file: Optional[Path] = None,
+        content: Optional[bytes] = None,
+    ):
+        self.url: str = url
+        self.status_code: int = status_code
+        self.reason: str = reason
+        self.headers: dict = headers
+        self._body_file: Optional[Path] = body_file
+        self._content: Optional[bytes] = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = self._body_file.read_bytes()
+        return self._content
+
+    def iter_content(self, chunk_size: int = 2**16):
+        if self._content is None:
+            # Stream from the file without loading the whole body.
+            with open(self._body_file, "rb") as file:
+                while chunk := file.read(chunk_size):
+                    yield chunk
+            return
+        for i in range(0, len(self._content), chunk_size):
+            yield self._content[i:i + chunk_size]
+
+    @property
+    def encoding(self) -> str:
+        content_type = self.headers.get("Content-Type", "")
+        if "charset=" in content_type:
+            return content_type.split("charset=")[-1].split(";")[0].strip()
+        return "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+
+class ResponseStore:
+    """
+    Local store of recorded responses. The index is loaded once, so lookups are a dictionary access, and each body is
+    kept in its own file to be loaded lazily.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Initialize the ResponseStore.
+
+        Args:
+            root (Path): Folder holding the index and the recorded bodies.
+        """
+        self._root: Path = root
+        self._index_file: Path = root / INDEX_FILE_NAME
+        self._lock: FileLock = FileLock(self._index_file.with_suffix(".lock"))
+        self._index: dict[str, dict] = self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, url: str, params: Optional[dict] = None) -> Optional[RecordedResponse]:
+        """
+        Get the recorded response to a request.
+
+        Returns:
+            Optional[RecordedResponse]: The response, or None if the request was not recorded.
+        """
+        key = request_key(url, params)
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        return RecordedResponse(
+            url=entry["url"],
+            status_code=entry["status_code"],
+            reason=entry["reason"],
+            headers=entry["headers"],
+            body_file=self._root / entry["body"],
+        )
+
+    def save(self, url: str, params: Optional[dict], response) -> None:
+        """
+        Record the response to a request, replacing any previous recording.
+
+        Args:
+            url (str): Requested url.
+            params (Optional[dict]): Query parameters of the request.
+            response: The `requests.Response` received.
+        """
+        key = request_key(url, params)
+        entry = {
+            "url": url,
+            "status_code": response.status_code,
+            "reason": response.reason,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() == "content-type"},
+            "body": f"{key}.body",
+        }
+        self._root.mkdir(parents=True, exist_ok=True)
+        (self._root / entry["body"]).write_bytes(response.content)
+        with self._lock:
+            # Merge with recordings made by other processes since the index was loaded.
+            self._index = {**self._load_index(), key: entry}
+            self._index_file.write_text(json.dumps(self._index, indent=1))
+
+    def _load_index(self) -> dict[str, dict]:
+        if not self._index_file.is_file():
+            return {}
+        try:
+            return json.loads(self._index_file.read_text())
+        except json.JSONDecodeError:
+            logger.error(f"Recordings index {self._index_file.as_posix()} is corrupted. Ignoring it.")
+            return {}
+
+
+class RecordingClient:
+    """HTTP client that records every response received through the wrapped client."""
+
+    def __init__(self, client, store: ResponseStore):
+        self._client = client
+        self._store: ResponseStore = store
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs):
+        response = self._client.get(url, params=params, **kwargs)
+        self._store.save(url, params, response)
+        return response
+
+    def stats(self) -> dict:
+        return self._client.stats()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class ReplayMissError(Exception):
+    pass
+
+
+class ReplayClient:
+    """HTTP client serving recorded responses only. Never touches the network."""
+
+    def __init__(self, store: ResponseStore):
+        self._store: ResponseStore = store
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> RecordedResponse:
+        response = self._store.get(url, params)
+        if response is None:
+            raise ReplayMissError(f"No recorded response for {url=} and {params=}.")
+        return response
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self) -> None:
+        pass
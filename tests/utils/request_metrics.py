@@ -0,0 +1,191 @@
+from contextlib import contextmanager
+import csv
+from dataclasses import asdict, dataclass
+import json
+import math
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any, Iterator, Optional
+from urllib.parse import urlsplit
+
+from tests.utils.retry_policy import RATE_LIMITED
+
+QUERY_ENDPOINT = "query"
+DATOS_ENDPOINT = "datos"
+OTHER_ENDPOINT = "other"
+STATION_IN_URL = re.compile(r"/estacion/([^/?]+)")
+PERCENTILES = (50, 95, 99)
+TIMING_FIELDS = ("connect", "ttfb", "download", "elapsed")
+TABLE_COLUMNS = (
+    "endpoint", "station", "status", "retries", "rate_limit_wait", "connect", "ttfb", "download", "bytes", "elapsed"
+)
+
+
+@dataclass
+class ResponseTiming:
+    """Timing of a single HTTP attempt, attached to the response as `response.timing` by `PooledHttpClient`."""
+
+    connect: float = 0.0  # Seconds opening the connection (TCP and TLS). 0 if an open connection was reused.
+    ttfb: float = 0.0  # Seconds until the response headers were received, connection included.
+    download: float = 0.0  # Seconds reading the body. For streamed bodies, only the time spent waiting for chunks.
+    bytes: int = 0  # Bytes of body read.
+
+
+@dataclass
+class RequestRecord:
+    """Metrics of a request, retries included."""
+
+    test: str
+    endpoint: str
+    station: Optional[str]
+    url: str
+    status: Optional[int] = None
+    retries: int = 0
+    rate_limit_wait: float = 0.0  # Seconds waiting for the rate limiter or after 429s.
+    elapsed: float = 0.0  # Seconds from the first attempt to the last response, waits included.
+    timing: Optional[ResponseTiming] = None  # Last attempt. None for responses served locally.
+
+    def add_retry(self, error_class: str, delay: float) -> None:
+        """Callback for `RetryPolicy.run`."""
+        self.retries += 1
+        if error_class == RATE_LIMITED:
+            self.rate_limit_wait += delay
+
+    def set_response(self, response: Any) -> None:
+        self.status = getattr(response, "status_code", None)
+        self.timing = getattr(response, "timing", None)
+
+    def as_row(self) -> dict[str, Any]:
+        # Streamed bodies are read after the request is recorded, so the timing is only read here.
+        row = {k: v for k, v in asdict(self).items() if k != "timing"}
+        timing = asdict(self.timing) if self.timing is not None else dict.fromkeys(asdict(ResponseTiming()))
+        return {**row, **timing}
+
+
+def describe_url(url: str) -> tuple[str, Optional[str]]:
+    """
+    Endpoint type and station of an AEMET url.
+
+    Returns:
+        tuple[str, Optional[str]]: The endpoint type (query, datos or other), and the station if it is on the url.
+    """
+    path = urlsplit(url).path
+    station = STATION_IN_URL.search(path)
+    if "/opendata/api/" in path:
+        endpoint = QUERY_ENDPOINT
+    elif "/opendata/sh/" in path:
+        endpoint = DATOS_ENDPOINT
+    else:
+        endpoint = OTHER_ENDPOINT
+    return endpoint, station.group(1) if station else None
+
+
+class RequestMetrics:
+    """
+    Collector of the metrics of every request of the session. Thread safe, since batches of requests are made from
+    worker threads (see `AsyncRequestEngine`).
+    """
+
+    def __init__(self):
+        self.current_test: str = ""
+        self._records: list[RequestRecord] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @contextmanager
+    def measure(self, url: str, station: Optional[str] = None) -> Iterator[RequestRecord]:
+        """
+        Record the metrics of the request made within the context. Call `set_response` on the record with the final
+        response.
+
+        Args:
+            url (str): Url requested, without credentials.
+            station (Optional[str]): Station the request is about, if not on the url.
+        """
+        endpoint, url_station = describe_url(url)
+        record = RequestRecord(test=self.current_test, endpoint=endpoint, station=station or url_station, url=url)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.elapsed = time.perf_counter() - start
+            with self._lock:
+                self._records.append(record)
+
+    def for_test(self, test: str) -> list[RequestRecord]:
+        with self._lock:
+            return [record for record in self._records if record.test == test]
+
+    def rows(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [record.as_row() for record in self._records]
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile. None if there are no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def summarize(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Percentiles of the request timings, overall and split by endpoint type and by station.
+
+    Args:
+        rows (list[dict[str, Any]]): Records, as returned by `RequestMetrics.rows`.
+    """
+    def _group(group_rows):
+        summary = {
+            "requests": len(group_rows),
+            "retries": sum(row["retries"] for row in group_rows),
+            "rate_limit_wait": sum(row["rate_limit_wait"] for row in group_rows),
+            "bytes": sum(row["bytes"] or 0 for row in group_rows),
+        }
+        for field in TIMING_FIELDS:
+            values = [row[field] for row in group_rows if row[field] is not None]
+            summary[field] = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+        return summary
+
+    by_endpoint, by_station = {}, {}
+    for row in rows:
+        by_endpoint.setdefault(row["endpoint"], []).append(row)
+        if row["station"] is not None:
+            by_station.setdefault(row["station"], []).append(row)
+    return {
+        "all": _group(rows),
+        "by_endpoint": {endpoint: _group(group) for endpoint, group in sorted(by_endpoint.items())},
+        "by_station": {station: _group(group) for station, group in sorted(by_station.items())},
+    }
+
+
+def write_metrics(path: Path, rows: list[dict[str, Any]]) -> None:
+    """Write the summary and every record to `path` as JSON, and every record to the same path with .csv suffix."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"summary": summarize(rows), "requests": rows}, indent=2))
+    with open(path.with_suffix(".csv"), "w", newline="") as file:
+        fieldnames = list(rows[0] if rows else RequestRecord(test="", endpoint="", station=None, url="").as_row())
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def format_table(records: list[RequestRecord]) -> str:
+    """Fixed-width table of the requests of a test, for the test report. Times in seconds."""
+    lines = [" ".join(f"{column:>15}" for column in TABLE_COLUMNS)]
+    for row in (record.as_row() for record in records):
+        cells = []
+        for column in TABLE_COLUMNS:
+            value = row[column]
+            if value is None:
+                value = "-"
+            elif isinstance(value, float):
+                value = f"{value:.3f}"
+            cells.append(f"{value:>15}")
+        lines.append(" ".join(cells))
+    return "\n".join(lines)
@@ -2,35 +2,67 @@
 import logging
 
 import requests
-import pytest
+
+from tests.utils.aemet_response import UNAUTHORIZED, as_aemet_response
+from tests.utils.retry_policy import MALFORMED_JSON, RATE_LIMITED, SERVER_ERROR, RetryPolicy
+from tests.utils.streaming_json import iter_json_array
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-def request_get_with_exception_handling(url, **kwargs):
+def request_get_with_exception_handling(url, client=None, retry_policy=None, metrics=None, **kwargs):
     """
-    Retry the GET requests a few times before failing. Log every exception raised in the process. Note that the status
-    code is not checked at this point, only that not exception is raised when attempting to make the connection.
+    Retry the GET requests that raise a connection or read error, with the backoff of the retry policy, before
+    failing. Log every exception raised in the process. Note that the status code is not checked at this point, only
+    that not exception is raised when attempting to make the connection.
+
+    If a client (e.g. the session-scoped `PooledHttpClient`) is given, the request goes through it so that open
+    connections are reused. Otherwise, a bare `requests.get` is issued. If a `RequestMetrics` collector is given, the
+    metrics of the request are recorded.
     """
-    n = 0
-    N = 5
-    while n<N:
-        try:
-            return requests.get(url, **kwargs)
-        except Exception as e:                
-            n+=1
-            logger.error(f"Request to {url=} failed with exception: {str(e)}")
-            
-    pytest.fail(f"Failed to complete the request. Inspect logged ERRORs for more information.")
+    get = client.get if client is not None else requests.get
+    retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+    if metrics is None:
+        return retry_policy.run(lambda: get(url, **kwargs))
+
+    with metrics.measure(url) as record:
+        response = retry_policy.run(lambda: get(url, **kwargs), on_retry=record.add_retry)
+        record.set_response(response)
+    return response
 
 def request_limit_reached(response):
     """
     There are two different types of requests being made for the tests: requests to the API endpoint to query for
-    specific data, and requests to retrieve the json after successful data requests. Their structure differs.
+    specific data, and requests to retrieve the json after successful data requests. Their structure differs: the
+    former report the limit on the `estado` of the body, the latter on a plain text error page.
+    """
+    return as_aemet_response(response).kind == RATE_LIMITED
+
+
+def classify_response(response, check_json=False):
+    """
+    Error class of a response that should be retried (see `RetryPolicy`), or None if it is final. Bodies are only
+    inspected on failed responses, or if `check_json`, so that streamed downloads are not consumed.
+    """
+    if response.status_code == 429:
+        return RATE_LIMITED
+    if not (check_json or not response.ok):
+        return SERVER_ERROR if response.status_code >= 500 else None
+    kind = as_aemet_response(response).kind
+    if kind in (RATE_LIMITED, SERVER_ERROR) or (kind == MALFORMED_JSON and check_json and response.ok):
+        return kind
+    return None
+
+
+def api_key_invalid(response):
+    """The API rejects unknown keys with a 401 status on the response body."""
+    return as_aemet_response(response).kind == UNAUTHORIZED
+
+
+def iter_datapoints(response, chunk_size=2**16):
+    """
+    Decode the datapoints of a `datos` response one by one while the body is downloaded. The request must have been
+    made with `stream=True` for the body not to be loaded in memory beforehand.
     """
-    try:
-        return response.json()["estado"] == 429
-    except:
-        return "429 Too Many Requests" in response.text
-    
\ No newline at end of file
+    return iter_json_array(response.iter_content(chunk_size), response.encoding or "utf-8")
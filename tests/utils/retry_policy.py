@@ -0,0 +1,237 @@
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import pytest
+import requests
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Error classes.
+CONNECT = "connect"
+READ = "read"
+RATE_LIMITED = "429"
+SERVER_ERROR = "5xx"
+MALFORMED_JSON = "malformed json"
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """Exponential backoff with jitter for one error class."""
+
+    base: float  # Seconds before the first retry.
+    cap: float  # Upper bound of the delay between two attempts.
+    max_attempts: int  # Retries allowed per request. 0 for no limit other than `max_wait` and the deadlines.
+    max_wait: float = math.inf  # Seconds that may be spent waiting on this class per request.
+
+    def delay(self, attempt: int, rng: random.Random) -> float:
+        """Delay before retry number `attempt` (from 0): uniform between the base and the exponential bound."""
+        return rng.uniform(self.base, max(self.base, min(self.cap, self.base * 2**attempt)))
+
+
+DEFAULT_BACKOFFS = {
+    CONNECT: Backoff(base=1, cap=30, max_attempts=5),
+    READ: Backoff(base=2, cap=60, max_attempts=3),
+    RATE_LIMITED: Backoff(base=5, cap=60, max_attempts=0, max_wait=300),
+    SERVER_ERROR: Backoff(base=1, cap=30, max_attempts=5),
+    MALFORMED_JSON: Backoff(base=1, cap=10, max_attempts=3),
+}
+
+
+# Request errors raised before anything is sent, which no retry can fix.
+INVALID_REQUEST_ERRORS = (
+    requests.exceptions.URLRequired,
+    requests.exceptions.MissingSchema,
+    requests.exceptions.InvalidSchema,
+    requests.exceptions.InvalidURL,
+    requests.exceptions.InvalidHeader,
+)
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """
+    Error class of an exception raised while making a request. Every network error (any `requests` exception other
+    than an invalid request, or a socket error) is transient. Other exceptions are bugs and are not retried.
+
+    Returns:
+        Optional[str]: The error class, or None if the exception is not a transient network error.
+    """
+    if isinstance(error, (requests.ReadTimeout, requests.exceptions.ChunkedEncodingError)):
+        return READ
+    if isinstance(error, INVALID_REQUEST_ERRORS):
+        return None
+    if isinstance(error, (requests.RequestException, OSError)):
+        return CONNECT
+    return None
+
+
+def retry_after(response: Any) -> Optional[float]:
+    """
+    Seconds to wait given by the `Retry-After` header of a response, as a number of seconds or an HTTP date.
+
+    Returns:
+        Optional[float]: The seconds to wait, or None if the header is missing or not valid.
+    """
+    value = (getattr(response, "headers", None) or {}).get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Deadline:
+    """Wall-clock deadline. A non positive timeout means no deadline."""
+
+    def __init__(self, timeout: float):
+        self._end: float = time.monotonic() + timeout if timeout > 0 else math.inf
+
+    def remaining(self) -> float:
+        return max(self._end - time.monotonic(), 0.0)
+
+
+class RetryPolicy:
+    """
+    Retry requests that failed for a transient reason.
+
+    Failures are sorted into error classes (connection, read, request cap reached, server error and malformed JSON),
+    each with its own `Backoff`. Exceptions other than network errors (see `classify_error`) are raised at once, with
+    their traceback, instead of being retried. The `Retry-After` header is honored when present. No retry is attempted
+    if the wait would go past the deadline of the running test or the deadline of the session, so that a single
+    unlucky request cannot hold the whole run. Thread safe.
+    """
+
+    def __init__(
+        self,
+        backoffs: Optional[dict[str, Backoff]] = None,
+        test_timeout: float = 0,
+        session_timeout: float = 0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Initialize the RetryPolicy.
+
+        Args:
+            backoffs (Optional[dict[str, Backoff]]): Backoff by error class. Classes not listed are not retried.
+                Defaults to `DEFAULT_BACKOFFS`.
+            test_timeout (float): Seconds each test may spend, counted from `start_test`. 0 for no deadline.
+            session_timeout (float): Seconds the session may spend, counted from now. 0 for no deadline.
+            seed (Optional[int]): Seed of the jitter.
+        """
+        self._backoffs: dict[str, Backoff] = DEFAULT_BACKOFFS if backoffs is None else backoffs
+        self._test_timeout: float = test_timeout
+        self._test_deadline: Deadline = Deadline(test_timeout)
+        self._session_deadline: Deadline = Deadline(session_timeout)
+        self._random: random.Random = random.Random(seed)
+        self.stats: Counter = Counter()  # Retries by error class, and requests given up on.
+        # Requests are retried from the worker threads of `AsyncRequestEngine` as well.
+        self._lock: threading.Lock = threading.Lock()
+
+    def start_test(self) -> None:
+        """Start the deadline of a new test."""
+        self._test_deadline = Deadline(self._test_timeout)
+
+    def remaining(self) -> float:
+        """Seconds until the closest deadline."""
+        return min(self._test_deadline.remaining(), self._session_deadline.remaining())
+
+    def run(
+        self,
+        send: Callable[[], Any],
+        classify: Optional[Callable[[Any], Optional[str]]] = None,
+        wait_hint: Optional[Callable[[], float]] = None,
+        on_retry: Optional[Callable[[str, float], None]] = None,
+    ) -> Any:
+        """
+        Make a request, retrying it while it fails for a transient reason.
+
+        Args:
+            send (Callable): Function making a single attempt and returning its response.
+            classify (Optional[Callable]): Function returning the error class of a response, or None if the response
+                is final. If not given, only exceptions are retried.
+            wait_hint (Optional[Callable]): Function returning the seconds until a request may be accepted again
+                after reaching the request cap (e.g. until another API key is usable). Shortens the backoff.
+            on_retry (Optional[Callable]): Function called with the error class and the delay before each retry.
+
+        Returns:
+            Any: The last response. Not necessarily successful if the retries ran out.
+
+        Raises:
+            Exception: Whatever `send` raised, if it is not a network error.
+        """
+        attempts: Counter = Counter()
+        waited: Counter = Counter()
+        while True:
+            response, error = None, None
+            try:
+                response = send()
+            except Exception as e:
+                error = e
+                error_class = classify_error(e)
+                if error_class is None:
+                    raise  # A bug, not a network failure: keep its traceback.
+                logger.error(f"Request failed with exception: {str(e)}")
+            else:
+                error_class = classify(response) if classify is not None else None
+                if error_class is None:
+                    return response
+
+            delay = self._delay(error_class, attempts[error_class], waited[error_class], response, wait_hint)
+            if delay is None:
+                with self._lock:
+                    self.stats["given up"] += 1
+                if error is not None:
+                    pytest.fail(f"Failed to complete the request: {str(error)}. Inspect logged ERRORs for details.")
+                return response
+
+            attempts[error_class] += 1
+            waited[error_class] += delay
+            with self._lock:
+                self.stats[error_class] += 1
+            if on_retry is not None:
+                on_retry(error_class, delay)
+            time.sleep(delay)
+
+    def _delay(
+        self,
+        error_class: Optional[str],
+        attempt: int,
+        waited: float,
+        response: Any,
+        wait_hint: Optional[Callable[[], float]],
+    ) -> Optional[float]:
+        # Delay before the next attempt, or None if the request should not be retried.
+        backoff = self._backoffs.get(error_class)
+        if backoff is None:
+            return None
+        if backoff.max_attempts and attempt >= backoff.max_attempts:
+            logger.warning(f"Not retrying: {attempt} retries after {error_class} errors already.")
+            return None
+
+        delay = retry_after(response)
+        if delay is None:
+            with self._lock:
+                delay = backoff.delay(attempt, self._random)
+            if error_class == RATE_LIMITED and wait_hint is not None:
+                delay = min(delay, wait_hint())
+        if waited + delay > backoff.max_wait:
+            logger.warning(f"Not retrying: {error_class} wait would exceed {backoff.max_wait} s.")
+            return None
+        remaining = self.remaining()
+        if remaining <= 0 or delay > remaining:
+            logger.warning(f"Not retrying: waiting {delay:.1f} s for {error_class} would exceed the deadline.")
+            return None
+        return delay
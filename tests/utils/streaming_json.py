@@ -0,0 +1,60 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[Any]:
+    """
+    Decode a JSON array incrementally, yielding each element as soon as it is complete. Only the current element and
+    the last chunk are held in memory, so memory use does not depend on the length of the array.
+
+    Args:
+        chunks (Iterable[bytes]): Body of the response, in chunks (e.g. `response.iter_content(chunk_size)`).
+        encoding (str): Encoding of the body.
+
+    Raises:
+        ValueError: If the body is not a JSON array, or it is truncated.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    started = False
+    chunks = iter(chunks)
+    final = False
+    while not final:
+        chunk = next(chunks, None)
+        final = chunk is None
+        buffer += text_decoder.decode(chunk or b"", final=final)
+        position = 0
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Response body is not a JSON array.")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ",":
+                position += 1
+                continue
+            if buffer[position] == "]":
+                for _ in chunks:
+                    pass  # Read the body to the end, so that the response is complete.
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise ValueError("Response body is not a valid JSON array.")
+                break  # Element not complete yet.
+            if end == len(buffer) and not final:
+                break  # A number or literal at the end of the buffer may continue on the next chunk.
+            yield element
+            position = end
+        buffer = buffer[position:]
+    raise ValueError("Response body is a truncated JSON array.")
@@ -0,0 +1,154 @@
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+from typing import TYPE_CHECKING, Callable
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+BLANK_PAGE = "about:blank"
+
+
+class WebDriverPool:
+    """
+    Pool of browsers reused across tests, separately for headless and headful browsers.
+
+    Browsers are launched in the background ahead of use (see `prewarm`), and a browser handed back is reset (extra
+    tabs closed, cookies and cache cleared, storage of the site it was on cleared, blank page loaded) rather than
+    quit. Browsers failing the health check or the reset, and browsers used `max_uses` times, are quit and replaced
+    in the background.
+    """
+
+    def __init__(self, launch: Callable[[bool], "WebDriver"], size: int = 1, max_uses: int = 20):
+        """
+        Initialize the WebDriverPool.
+
+        Args:
+            launch (Callable): Function taking whether the browser is headless and returning a new webdriver.
+            size (int): Idle browsers kept per mode.
+            max_uses (int): Tests a browser is used for before it is replaced.
+        """
+        self._launch = launch
+        self._size: int = size
+        self._max_uses: int = max_uses
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="webdriver-pool")
+        self._lock: threading.Lock = threading.Lock()
+        # Idle browsers by mode (headless or not), as futures of browsers launched or still launching.
+        self._idle: dict[bool, deque[Future]] = {True: deque(), False: deque()}
+        self._leases: dict[int, tuple[bool, int]] = {}  # Mode and uses of each browser handed out, by id.
+        self._closed: bool = False
+        self.stats: Counter = Counter()  # Browsers launched, reused, recycled and found unhealthy.
+
+    def prewarm(self, headless: bool) -> None:
+        """Launch browsers in the background until `size` are idle or launching for the mode."""
+        with self._lock:
+            if self._closed:
+                return
+            while len(self._idle[headless]) < self._size:
+                self._idle[headless].append(self._executor.submit(self._launch_counted, headless))
+
+    def acquire(self, headless: bool = True) -> "WebDriver":
+        """Get an idle healthy browser of the mode, waiting for one being launched, or launch one."""
+        while True:
+            with self._lock:
+                future = self._idle[headless].popleft() if self._idle[headless] else None
+            if future is None:
+                driver, uses = self._launch_counted(headless), 0
+                break
+            try:
+                driver = future.result()
+            except Exception as e:
+                logger.warning(f"Discarding a browser that failed to launch in the background: {str(e)}")
+                continue
+            uses = self._leases.pop(id(driver), (headless, 0))[1]
+            if self._healthy(driver):
+                self.stats["reused" if uses else "prewarmed"] += 1
+                break
+            self.stats["unhealthy"] += 1
+            self._quit(driver)
+
+        with self._lock:
+            self._leases[id(driver)] = (headless, uses + 1)
+        return driver
+
+    def release(self, driver: "WebDriver") -> None:
+        """Hand a browser back. It is reset and kept for reuse, or quit and replaced in the background."""
+        with self._lock:
+            headless, uses = self._leases.get(id(driver), (True, self._max_uses))
+            keep = not self._closed and uses < self._max_uses and len(self._idle[headless]) < self._size
+        if keep and self._reset(driver):
+            future = Future()
+            future.set_result(driver)
+            with self._lock:
+                self._idle[headless].append(future)
+            return
+
+        self.stats["recycled"] += 1
+        with self._lock:
+            self._leases.pop(id(driver), None)
+        self._quit(driver)
+        self.prewarm(headless)
+
+    def close(self) -> None:
+        """Quit every idle browser, including those still launching."""
+        with self._lock:
+            self._closed = True
+            futures = [future for idle in self._idle.values() for future in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for future in futures:
+            try:
+                self._quit(future.result())
+            except Exception:
+                pass  # Failed to launch: nothing to quit.
+        self._executor.shutdown(wait=True)
+        logger.info(f"Webdriver pool: {dict(self.stats)}.")
+
+    def _launch_counted(self, headless: bool) -> "WebDriver":
+        driver = self._launch(headless)
+        self.stats["launched"] += 1
+        return driver
+
+    @staticmethod
+    def _healthy(driver: "WebDriver") -> bool:
+        try:
+            return bool(driver.window_handles) and driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(driver: "WebDriver") -> bool:
+        from selenium.common.exceptions import WebDriverException
+
+        # Leave the browser as if newly launched: a single blank tab, no cookies, no storage and no cache.
+        try:
+            handles = driver.window_handles
+            if not handles:
+                return False  # Every window was closed.
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            url = urlsplit(driver.current_url)
+            if url.scheme in ("http", "https"):
+                origin = f"{url.scheme}://{url.netloc}"
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+            driver.get(BLANK_PAGE)
+            return True
+        except WebDriverException as e:
+            logger.warning(f"Could not reset the browser: {e.msg}")
+            return False
+
+    @staticmethod
+    def _quit(driver: "WebDriver") -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
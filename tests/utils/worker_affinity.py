@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Any, Optional
+
+XDIST_GROUP_MARKER = "xdist_group"
+
+
+def affinity_group(params: dict[str, Any]) -> Optional[str]:
+    """
+    Worker group of a parametrized data test: its station and starting date. The tests of a group share query windows
+    (see `RangeCoalescer`) and cached payloads, so they are best run on the same worker.
+
+    Args:
+        params (dict[str, Any]): Parameters of the test, e.g. `item.callspec.params`.
+
+    Returns:
+        Optional[str]: The group name, or None if the test is not parametrized by station and starting date.
+    """
+    station, starting_date = params.get("station"), params.get("starting_date")
+    if station is None or not isinstance(starting_date, datetime):
+        return None
+    return f"{station}_{starting_date:%Y%m%dT%H%M}"
+
+
+def worker_group(item) -> Optional[str]:
+    """Worker group of a test: the name given by its `xdist_group` marker, else its affinity group."""
+    marker = item.get_closest_marker(XDIST_GROUP_MARKER)
+    if marker is not None:
+        return str(marker.args[0] if marker.args else marker.kwargs.get("name", "default"))
+    callspec = getattr(item, "callspec", None)
+    return affinity_group(callspec.params) if callspec is not None else None